@@ -4,6 +4,7 @@ from utils.nav import page_config, sidebar
 from utils.supabase_client import get_supabase
 from utils.state import ensure_bootstrap
 from utils.ledger import get_current_week, compute_totals
+from utils.loader import load_parallel
 
 page_config("Silver Council | Dashboard", "🏛️")
 sidebar("🏛 Dashboard")
@@ -27,20 +28,47 @@ def _safe_float(x, default: float = 0.0) -> float:
     except Exception:
         return default
 
-eco_latest = (
-    sb.table("economy_week_summary")
-    .select("week,population,survival_ratio,player_payout,tax_income,gross_value,grain_needed,grain_produced,water_needed,water_produced")
-    .order("week", desc=True)
-    .limit(1)
-    .execute()
-    .data
-    or []
+def _get_pop(w: int):
+    try:
+        r = sb.table("population_state").select("population").eq("week", w).limit(1).execute().data or []
+        if r:
+            return _safe_int(r[0].get("population"))
+    except Exception:
+        pass
+    return None
+
+# Independent queries, loaded concurrently. The latest economy row is almost
+# always last week's, so its totals are fetched alongside and only re-read
+# when the summary says otherwise.
+prev_week = max(1, current_week - 1)
+data = load_parallel(
+    {
+        "eco_latest": lambda: (
+            sb.table("economy_week_summary")
+            .select("week,population,survival_ratio,player_payout,tax_income,gross_value,grain_needed,grain_produced,water_needed,water_produced")
+            .order("week", desc=True)
+            .limit(1)
+            .execute()
+            .data
+            or []
+        ),
+        "tot_now": lambda: compute_totals(sb, week=current_week),
+        "tot_prev": lambda: compute_totals(sb, week=prev_week),
+        "pop_now": lambda: _get_pop(current_week),
+        "pop_prev": lambda: _get_pop(current_week - 1) if current_week > 1 else None,
+    }
 )
+eco_latest = data["eco_latest"]
 
-eco_week = _safe_int(eco_latest[0]["week"], max(1, current_week - 1)) if eco_latest else max(1, current_week - 1)
+eco_week = _safe_int(eco_latest[0]["week"], prev_week) if eco_latest else prev_week
 
-tot_now = compute_totals(sb, week=current_week)
-tot_eco = compute_totals(sb, week=eco_week)
+tot_now = data["tot_now"]
+if eco_week == prev_week:
+    tot_eco = data["tot_prev"]
+elif eco_week == current_week:
+    tot_eco = tot_now
+else:
+    tot_eco = compute_totals(sb, week=eco_week)
 
 c1, c2, c3, c4 = st.columns(4)
 with c1:
@@ -54,17 +82,8 @@ with c4:
 
 st.divider()
 
-def _get_pop(w: int):
-    try:
-        r = sb.table("population_state").select("population").eq("week", w).limit(1).execute().data or []
-        if r:
-            return _safe_int(r[0].get("population"))
-    except Exception:
-        pass
-    return None
-
-pop_now = _get_pop(current_week)
-pop_prev = _get_pop(current_week - 1) if current_week > 1 else None
+pop_now = data["pop_now"]
+pop_prev = data["pop_prev"]
 
 st.subheader("Population & Survival")
 
@@ -5,8 +5,10 @@ from utils.nav import page_config, sidebar
 from utils.supabase_client import get_supabase
 from utils.state import ensure_bootstrap
 from utils.ledger import get_current_week, compute_totals, add_ledger_entry
+from utils.schema import get_schema
 from utils.undo import log_action, get_last_action, pop_last_action
 from utils import infrastructure_effects
+from utils.infrastructure_graph import apply_plan, get_prereq_graph, plan_chain
 
 UNDO_CATEGORY = "infrastructure"
 
@@ -39,53 +41,39 @@ with st.popover("↩️ Undo (Infrastructure)"):
             name = payload.get("name") or "Infrastructure"
             if infra_id:
                 sb.table("infrastructure_owned").upsert({"infrastructure_id": infra_id, "owned": False}).execute()
+            chain_items = payload.get("items") or []
+            if chain_items:
+                sb.table("infrastructure_owned").upsert(
+                    [{"infrastructure_id": it["infrastructure_id"], "owned": False} for it in chain_items]
+                ).execute()
             if cost:
                 add_ledger_entry(sb, week=week, direction="in", amount=cost, category="undo_refund", note=f"Undo: {name}")
             pop_last_action(sb, action_id=last["id"])
+            infrastructure_effects.clear_effects_snapshot()
             st.success("Undone.")
             st.rerun()
 
 st.divider()
 
-# Fetch infra + ownership (schema-flexible)
-try:
-    infra = (
-        sb.table("infrastructure")
-        .select("id,name,category,cost,tier,upkeep,description,prereq")
-        .order("category")
-        .order("tier")
-        .order("name")
-        .execute()
-        .data
-        or []
-    )
-except Exception:
-    # Older schema may not have tier/upkeep/prereq
-    infra = (
-        sb.table("infrastructure")
-        .select("id,name,category,cost,description")
-        .order("category")
-        .order("name")
-        .execute()
-        .data
-        or []
-    )
-owned_rows = sb.table("infrastructure_owned").select("infrastructure_id,owned").execute().data
-owned_map = {r["infrastructure_id"]: bool(r["owned"]) for r in owned_rows}
+# Fetch infra + ownership (schema-flexible: older schema may not have tier/upkeep/prereq)
+SCHEMA = get_schema(sb)
+infra_q = sb.table("infrastructure").select(
+    SCHEMA.select_list("infrastructure", ("id", "name", "category", "cost", "tier", "upkeep", "description", "prereq"))
+).order("category")
+if SCHEMA.has("infrastructure", "tier"):
+    infra_q = infra_q.order("tier")
+infra = infra_q.order("name").execute().data or []
+# Ownership from the shared effects snapshot (cleared after every purchase/undo)
+effects = infrastructure_effects.get_effects_snapshot(sb)
+owned_map = {infra_id: True for infra_id in effects.owned_ids}
 
-# Helper: resolve prereq name -> owned status
-name_to_id = {row.get("name"): row.get("id") for row in (infra or []) if row.get("name") and row.get("id")}
+# Prerequisite graph (shop prereq column + canon chains), cached per catalog
+prereq_graph = get_prereq_graph(sb)
+owned_names = {row.get("name") for row in (infra or []) if owned_map.get(row.get("id"), False)}
 
 
-def prereq_met(prereq_name: str) -> bool:
-    prereq_name = (prereq_name or "").strip()
-    if not prereq_name:
-        return True
-    pid = name_to_id.get(prereq_name)
-    if not pid:
-        # If the prereq name doesn't resolve, fail closed (can't buy) so tier chains stay safe.
-        return False
-    return bool(owned_map.get(pid, False))
+def prereq_met(name: str) -> bool:
+    return prereq_graph.prereqs_met(name, owned_names)
 
 if not infra:
     st.warning("No infrastructure seeded yet. Seed `infrastructure` table (from Excel or manually).")
@@ -96,6 +84,22 @@ by_cat: dict[str, list[dict]] = {}
 for row in infra:
     by_cat.setdefault(row["category"], []).append(row)
 
+# Buy up to X: plan the whole unowned prerequisite chain and buy it in one go
+with st.expander("🧭 Buy up to…", expanded=False):
+    targets = [n for n in prereq_graph.order if n not in owned_names and n not in prereq_graph.blocked]
+    if not targets:
+        st.caption("Nothing left to plan.")
+    else:
+        target = st.selectbox("Target", targets, key="chain_target")
+        plan = plan_chain(prereq_graph, target, owned_names)
+        st.write(" → ".join(r["name"] for r in plan.steps))
+        st.write(f"**Total cost:** {plan.total_cost:,.0f} ({len(plan.steps)} purchases)")
+        if st.button("Buy chain", key="buy_chain", disabled=tot.gold < plan.total_cost or not plan.steps):
+            apply_plan(sb, plan, week=week, undo_category=UNDO_CATEGORY)
+            infrastructure_effects.clear_effects_snapshot()
+            st.success("Purchased.")
+            st.rerun()
+
 cats = list(by_cat.keys())
 selected_cat = st.selectbox("Category", cats, index=0)
 
@@ -111,7 +115,7 @@ for row in by_cat[selected_cat]:
             "Tier": int(row.get("tier") or 0),
             "Upkeep": float(row.get("upkeep") or 0),
             "Owned": "Yes" if is_owned else "No",
-            "Prereq": row.get("prereq") or "",
+            "Prereq": ", ".join(prereq_graph.parents.get(row["name"], ())) or (row.get("prereq") or ""),
             "Description": row.get("description") or "",
             "Effect": eff_txt,
         }
@@ -133,9 +137,9 @@ for _, r in df.iterrows():
         with right:
             owned = r["Owned"] == "Yes"
             st.write(f"**Owned:** {'✅' if owned else '❌'}")
-            prereq_ok = prereq_met(r["Prereq"])
+            prereq_ok = prereq_met(r["Name"])
             can_buy = (not owned) and prereq_ok and (tot.gold >= float(r["Cost"]))
-            if (not prereq_ok) and r["Prereq"]:
+            if not prereq_ok:
                 st.caption("🔒 Locked until prerequisite is owned.")
             if st.button("Purchase", key=f"buy_{r['id']}", disabled=not can_buy):
                 # Mark owned + deduct gold via ledger
@@ -155,6 +159,7 @@ for _, r in df.iterrows():
                     action="purchase_infrastructure",
                     payload={"infrastructure_id": r["id"], "cost": float(r["Cost"]), "name": r["Name"]},
                 )
+                infrastructure_effects.clear_effects_snapshot()
                 st.success("Purchased.")
                 st.rerun()
 
@@ -6,6 +6,9 @@ from utils.supabase_client import get_supabase
 from utils.state import ensure_bootstrap
 from utils.dm import dm_gate
 from utils.ledger import get_current_week
+from utils.schema import get_schema
+from utils.reputation import get_reputation_history
+from utils.visibility import get_visibility
 
 sidebar("📜 Reputation")
 
@@ -38,40 +41,18 @@ def dc_bonus_from_score(score: int) -> tuple[int, int]:
 
 
 # Load factions (the list of all reputations)
-try:
-    factions = (
-        sb.table("factions")
-        .select("id,name,type,is_hidden")
-        .order("type")
-        .order("name")
-        .execute()
-        .data
-        or []
-    )
-except Exception:
-    factions = (
-        sb.table("factions")
-        .select("id,name,type")
-        .order("type")
-        .order("name")
-        .execute()
-        .data
-        or []
-    )
+factions = (
+    sb.table("factions")
+    .select(get_schema(sb).select_list("factions", ("id", "name", "type", "is_hidden")))
+    .order("type")
+    .order("name")
+    .execute()
+    .data
+    or []
+)
 
-# Some earlier versions stored the hidden reputation list in app_state (array column)
-# instead of factions.is_hidden. Support both so players always respect DM settings.
-hidden_ids: set[str] = set()
-try:
-    state_rows = sb.table("app_state").select("id,ui_hidden_factions,ui_hidden_reputations").eq("id", 1).limit(1).execute().data or []
-    if state_rows:
-        row0 = state_rows[0] or {}
-        for key in ("ui_hidden_factions", "ui_hidden_reputations"):
-            v = row0.get(key)
-            if isinstance(v, list):
-                hidden_ids.update([str(x) for x in v if x])
-except Exception:
-    pass
+# Hidden factions: factions.is_hidden plus the older app_state arrays (cached).
+visibility = get_visibility(sb)
 
 if filter_view == "Regions":
     factions = [f for f in factions if str(f.get("type")) == "region"]
@@ -82,7 +63,7 @@ if not show_hidden:
     factions = [
         f
         for f in factions
-        if (not bool(f.get("is_hidden", False))) and (str(f.get("id")) not in hidden_ids)
+        if (not bool(f.get("is_hidden", False))) and not visibility.faction_hidden(f.get("id"))
     ]
 
 # Load current-week reputation rows
@@ -134,30 +115,55 @@ edited = st.data_editor(
     key="rep_editor",
 )
 
+with st.expander("📈 Trends", expanded=False):
+    history = get_reputation_history(sb, [f["id"] for f in factions], current_week=week)
+    names = {f["id"]: f.get("name") for f in factions}
+    trend_rows = [
+        {"Week": w, "Faction": names.get(fid), "Score": score}
+        for fid, points in history.items()
+        for w, score in points
+    ]
+    if trend_rows:
+        trend = pd.DataFrame(trend_rows).pivot_table(index="Week", columns="Faction", values="Score")
+        st.line_chart(trend)
+    else:
+        st.caption("No reputation history yet.")
+
+
+def changed_reputation_rows(loaded: pd.DataFrame, edited: pd.DataFrame) -> list[dict]:
+    """Upsert payloads for rows whose score or note differ from the loaded table."""
+    rows: list[dict] = []
+    for i, row in edited.iterrows():
+        before = loaded.iloc[i]
+        score = int(row["Score"])
+        note = str(row.get("Notes") or "").strip()
+        if score == int(before["Score"]) and note == str(before["Notes"] or "").strip():
+            continue
+        dc, bonus = dc_bonus_from_score(score)
+        rows.append(
+            {
+                "week": week,
+                "faction_id": before["_faction_id"],
+                "score": score,
+                "dc": dc,
+                "bonus": bonus,
+                "note": note,
+            }
+        )
+    return rows
+
+
 if dm_gate("DM password required to save reputation changes", key="rep_save"):
     if st.button("💾 Save changes", type="primary"):
-        try:
-            for i, row in edited.iterrows():
-                fid = df.iloc[i]["_faction_id"]
-                score = int(row["Score"])
-                note = str(row.get("Notes") or "").strip()
-                dc, bonus = dc_bonus_from_score(score)
-
-                sb.table("reputation").upsert(
-                    {
-                        "week": week,
-                        "faction_id": fid,
-                        "score": score,
-                        "dc": dc,
-                        "bonus": bonus,
-                        "note": note,
-                    },
-                    on_conflict="week,faction_id",
-                ).execute()
-
-            st.success("Saved.")
-            st.rerun()
-        except Exception as e:
-            st.error(f"Failed to save: {e}")
+        changed = changed_reputation_rows(df, edited)
+        if not changed:
+            st.info("No changes to save.")
+        else:
+            try:
+                sb.table("reputation").upsert(changed, on_conflict="week,faction_id").execute()
+                st.success(f"Saved {len(changed)} change(s).")
+                st.rerun()
+            except Exception as e:
+                st.error(f"Failed to save: {e}")
 else:
     st.info("View-only (DM locked).")
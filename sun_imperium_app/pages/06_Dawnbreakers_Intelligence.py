@@ -12,8 +12,16 @@ from utils.equipment import (
     add_equipment,
     compute_equipment_bonus_pct,
 )
-from utils.missions import list_missions, create_mission, resolve_mission
+from utils.missions import (
+    MAX_SUCCESS_PCT,
+    list_missions,
+    list_active_missions,
+    create_mission,
+    resolve_mission,
+)
 from utils.activity import log_activity
+from utils.loader import load_parallel
+from utils.mission_ui import equipment_assignment_inputs, render_equipment_planner, render_mission_history
 
 
 page_config("Dawnbreakers | Intelligence", "🕵️")
@@ -22,29 +30,38 @@ sidebar("🕵 Intelligence")
 sb = get_supabase()
 ensure_bootstrap(sb)
 week = get_current_week(sb)
-tot = compute_totals(sb, week=week)
-
-st.title("🕵️ Dawnbreakers: Intelligence")
-st.caption(f"Week {week} · Moonvault: {tot.gold:,.0f} gold")
-
-
-# ---------- Data ----------
-units = (
-    sb.table("dawnbreakers_units")
-    .select("id,name,tier,purchase_cost,upkeep,success,description")
-    .order("tier")
-    .order("name")
-    .execute()
-    .data
-    or []
+# ---------- Data (independent queries, loaded concurrently) ----------
+data = load_parallel(
+    {
+        "tot": lambda: compute_totals(sb, week=week),
+        "units": lambda: (
+            sb.table("dawnbreakers_units")
+            .select("id,name,tier,purchase_cost,upkeep,success,description")
+            .order("tier")
+            .order("name")
+            .execute()
+            .data
+            or []
+        ),
+        "roster": lambda: sb.table("dawnbreakers_roster").select("id,unit_id,quantity").execute().data or [],
+        "equip_items": lambda: get_equipment_items(sb, "intelligence"),
+        "equip_inv": lambda: get_equipment_inventory(sb, "intelligence"),
+        "missions": lambda: list_missions(sb, "intelligence_missions", week),
+        "active_missions": lambda: list_active_missions(sb, "intelligence_missions"),
+    }
 )
-roster_rows = sb.table("dawnbreakers_roster").select("id,unit_id,quantity").execute().data or []
+tot = data["tot"]
+units = data["units"]
+roster_rows = data["roster"]
 roster_map = {r["unit_id"]: r for r in roster_rows}
+equip_items = data["equip_items"]
+equip_inv = data["equip_inv"]
+missions = data["missions"]
+# Unresolved missions of any week: their units and equipment are still out.
+active_missions = data["active_missions"]
 
-equip_items = get_equipment_items(sb, "intelligence")
-equip_inv = get_equipment_inventory(sb, "intelligence")
-
-missions = list_missions(sb, "intelligence_missions", week)
+st.title("🕵️ Dawnbreakers: Intelligence")
+st.caption(f"Week {week} · Moonvault: {tot.gold:,.0f} gold")
 
 
 def unit_kind(name: str) -> str:
@@ -58,20 +75,18 @@ def unit_kind(name: str) -> str:
     return "Other"
 
 
-def missions_qty_by_unit(active_only: bool = True):
+def missions_qty_by_unit(rows: list[dict]) -> dict:
     m = {}
-    for row in missions:
-        if active_only and str(row.get("status")) != "active":
-            continue
+    for row in rows:
         uid = row.get("unit_id")
         m[uid] = int(m.get(uid, 0)) + int(row.get("quantity") or 0)
     return m
 
 
-active_assigned = missions_qty_by_unit(True)
+active_assigned = missions_qty_by_unit(active_missions)
 
 
-tab_recruit, tab_equip, tab_missions = st.tabs(["Recruit", "Equipment", "Missions"])
+tab_recruit, tab_equip, tab_missions, tab_history = st.tabs(["Recruit", "Equipment", "Missions", "History"])
 
 
 # ---------- Recruit ----------
@@ -175,6 +190,18 @@ with tab_missions:
     st.subheader("Intelligence Missions")
     st.caption("Players can dispatch operatives; the DM resolves the outcome.")
 
+    render_equipment_planner(
+        units=units,
+        available_by_unit={
+            u["id"]: max(0, int(roster_map.get(u["id"], {}).get("quantity", 0)) - int(active_assigned.get(u["id"], 0)))
+            for u in units
+        },
+        equip_items=equip_items,
+        equip_inv=equip_inv,
+        active_missions=active_missions,
+        key_prefix="intel_",
+    )
+
     unit_options = {u["name"]: u for u in units}
     with st.expander("➕ Create mission", expanded=True):
         u_name = st.selectbox("Unit type", list(unit_options.keys()))
@@ -194,27 +221,17 @@ with tab_missions:
         objective = st.text_area("Objective", value="")
         eta_week = st.number_input("Suggested return week (DM can change)", min_value=week, value=week, step=1)
 
-        assignment: dict[str, int] = {}
-        if equip_items:
-            st.markdown("**Assign equipment (optional)**")
-            cols = st.columns(2)
-            for i, e in enumerate(equip_items):
-                owned = int(equip_inv.get(e["id"], 0))
-                with cols[i % 2]:
-                    q = st.number_input(
-                        f"{e['name']} (owned: {owned})",
-                        min_value=0,
-                        max_value=max(0, owned),
-                        value=0,
-                        step=1,
-                        key=f"intel_assign_{e['id']}",
-                    )
-                    if q:
-                        assignment[e["id"]] = int(q)
+        assignment = equipment_assignment_inputs(
+            equip_items=equip_items,
+            equip_inv=equip_inv,
+            active_missions=active_missions,
+            base_success=float(u.get("success") or 0.0),
+            key_prefix="intel_",
+        )
 
         base_success = float(u.get("success") or 0.0)
         bonus_success = compute_equipment_bonus_pct(equip_items, assignment)
-        total_success = max(0.0, min(95.0, base_success + bonus_success))
+        total_success = max(0.0, min(MAX_SUCCESS_PCT, base_success + bonus_success))
         st.info(f"Calculated success chance: **{total_success:.0f}%** (base {base_success:.0f}% + equipment {bonus_success:.0f}%)")
 
         can_dispatch = available > 0 and target.strip() and objective.strip()
@@ -243,7 +260,7 @@ with tab_missions:
 
     st.divider()
 
-    missions = list_missions(sb, "intelligence_missions", week)
+    # Loaded with the page data; dispatching reruns the page, so this is current.
     if not missions:
         st.info("No missions this week.")
     else:
@@ -292,4 +309,9 @@ with tab_missions:
                     st.rerun()
 
 
+# ---------- History ----------
+with tab_history:
+    render_mission_history(sb, "intelligence_missions", units, key_prefix="intel")
+
+
 st.info("Upkeep is applied during the weekly tick (Advance Week).")
@@ -6,7 +6,11 @@ from utils.nav import page_config, sidebar
 from utils.supabase_client import get_supabase
 from utils.state import ensure_bootstrap
 from utils.ledger import get_current_week, compute_totals, add_ledger_entry
+from utils.schema import get_schema
 from utils.undo import log_action, get_last_action, pop_last_action
+from utils.power_index import get_power_index
+from utils.squads import fetch_members_for_squads
+from utils.loader import load_parallel
 
 UNDO_CATEGORY = "moonblade"
 
@@ -17,7 +21,40 @@ sb = get_supabase()
 ensure_bootstrap(sb)
 week = get_current_week(sb)
 
-tot = compute_totals(sb, week=week)
+SCHEMA = get_schema(sb)
+
+
+def _load_friendly_squads():
+    squads_q = sb.table("squads").select(
+        SCHEMA.select_list(
+            "squads", ("id", "name", "region", "destination", "mission", "status", "deployed_week", "is_enemy")
+        )
+    )
+    if SCHEMA.has("squads", "is_enemy"):
+        squads_q = squads_q.eq("is_enemy", False)
+    return squads_q.order("name").execute().data or []
+
+
+# Independent page queries, loaded concurrently
+data = load_parallel(
+    {
+        "tot": lambda: compute_totals(sb, week=week),
+        "last_action": lambda: get_last_action(sb, category=UNDO_CATEGORY),
+        "units": lambda: (
+            sb.table("moonblade_units")
+            .select("id,name,unit_type,power,cost,upkeep,description")
+            .order("unit_type")
+            .order("name")
+            .execute()
+            .data
+            or []
+        ),
+        "roster": lambda: sb.table("moonblade_roster").select("unit_id,quantity").execute().data or [],
+        "squads": _load_friendly_squads,
+        "power_index": lambda: get_power_index(sb),
+    }
+)
+tot = data["tot"]
 
 st.title("⚔️ Moonblade Guild")
 st.caption(f"Military · Week {week} · Moonvault: {tot.gold:,.0f} gold")
@@ -26,7 +63,7 @@ st.caption(f"Military · Week {week} · Moonvault: {tot.gold:,.0f} gold")
 # Undo
 # -------------------------
 with st.popover("↩️ Undo (Moonblade)"):
-    last = get_last_action(sb, category=UNDO_CATEGORY)
+    last = data["last_action"]
     if not last:
         st.write("No actions to undo.")
     else:
@@ -70,19 +107,10 @@ with st.popover("↩️ Undo (Moonblade)"):
 st.divider()
 
 # -------------------------
-# Load units + roster once
+# Units + roster (loaded above)
 # -------------------------
-units = (
-    sb.table("moonblade_units")
-    .select("id,name,unit_type,power,cost,upkeep,description")
-    .order("unit_type")
-    .order("name")
-    .execute()
-    .data
-    or []
-)
-
-roster_rows = sb.table("moonblade_roster").select("unit_id,quantity").execute().data or []
+units = data["units"]
+roster_rows = data["roster"]
 roster_map = {r["unit_id"]: int(r.get("quantity") or 0) for r in roster_rows}
 unit_by_id = {u["id"]: u for u in units}
 
@@ -172,21 +200,13 @@ with tab_units:
 # =========================
 with tab_squads:
     st.subheader("Squads")
-    st.caption("Create squads and assign owned units. Squad power is computed from unit power × quantity.")
+    st.caption(
+        "Create squads and assign owned units. Squad power is effective unit power "
+        "(catalog power + infrastructure bonuses) × quantity."
+    )
 
     # Friendly squads only
-    try:
-        squads = (
-            sb.table("squads")
-            .select("id,name,region,destination,mission,status,deployed_week,is_enemy")
-            .eq("is_enemy", False)
-            .order("name")
-            .execute()
-            .data
-            or []
-        )
-    except Exception:
-        squads = sb.table("squads").select("id,name,region").order("name").execute().data or []
+    squads = data["squads"]
 
     with st.form("create_squad", clear_on_submit=True):
         c1, c2, c3 = st.columns(3)
@@ -233,7 +253,8 @@ with tab_squads:
                     "is_enemy": False,
                 }
 
-                payload = dict(base_payload)
+                # Only columns this schema has; the loop below still fills unexpected NOT NULLs.
+                payload = SCHEMA.pick("squads", base_payload)
                 last_err: Exception | None = None
                 for _ in range(6):
                     try:
@@ -265,52 +286,38 @@ with tab_squads:
         st.info("No squads yet. Create one above.")
         st.stop()
 
-    squad_options = {s["name"]: s for s in squads}
-    label = st.selectbox("Select squad", list(squad_options.keys()), key="squad_select")
-    squad = squad_options[label]
+    # Members for every friendly squad in one query (schema-tolerant, unit_type
+    # backfilled from the unit catalog so the UI + war sim stay consistent).
+    unit_type_by_id = {u["id"]: (u.get("unit_type") or "Other") for u in units}
+    members_by_squad = fetch_members_for_squads(sb, [s["id"] for s in squads], unit_type_by_id=unit_type_by_id)
+    power_index = data["power_index"]
 
-    # Load members (be defensive: older schemas may not have unit_type yet)
-    try:
-        members = (
-            sb.table("squad_members")
-            .select("id,unit_id,unit_type,quantity")
-            .eq("squad_id", squad["id"])
-            .execute()
-            .data
-            or []
-        )
-    except Exception:
-        # Fallback: only unit_id/quantity exist.
-        members = (
-            sb.table("squad_members")
-            .select("id,unit_id,quantity")
-            .eq("squad_id", squad["id"])
-            .execute()
-            .data
-            or []
+    with st.expander("📊 All squads", expanded=False):
+        st.dataframe(
+            pd.DataFrame(
+                [
+                    {
+                        "Squad": s.get("name"),
+                        "Region": s.get("region") or "",
+                        "Status": s.get("status") or "",
+                        "Units": sum(int(m.get("quantity") or 0) for m in members_by_squad.get(s["id"], [])),
+                        "Power": round(power_index.squad_power(members_by_squad.get(s["id"], [])), 1),
+                    }
+                    for s in squads
+                ]
+            ),
+            use_container_width=True,
+            hide_index=True,
         )
-        # Backfill unit_type from unit catalog so the UI + war sim stay consistent.
-        for m in members:
-            uid = m.get("unit_id")
-            u = unit_by_id.get(uid) if uid else None
-            m["unit_type"] = (u.get("unit_type") if u else None) or "Other"
 
-    def compute_squad_power(ms: list[dict]) -> float:
-        power_total = 0.0
-        for m in ms:
-            qty = int(m.get("quantity") or 0)
-            uid = m.get("unit_id")
-            if uid and uid in unit_by_id:
-                p = float(unit_by_id[uid].get("power") or 0)
-            else:
-                # fallback: unknown unit_id, approximate
-                p = 1.0
-            power_total += p * qty
-        return power_total
+    squad_options = {s["name"]: s for s in squads}
+    label = st.selectbox("Select squad", list(squad_options.keys()), key="squad_select")
+    squad = squad_options[label]
+    members = members_by_squad.get(squad["id"], [])
 
     st.markdown(
         f"**{squad.get('name')}** · Region: {squad.get('region') or '—'} · "
-        f"Power: **{compute_squad_power(members):,.1f}**"
+        f"Power: **{power_index.squad_power(members):,.1f}**"
     )
 
     # Mission / status editor
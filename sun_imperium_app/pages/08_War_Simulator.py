@@ -4,27 +4,12 @@ from utils.nav import page_config, sidebar
 from utils.supabase_client import get_supabase
 from utils.state import ensure_bootstrap
 from utils.ledger import get_current_week
+from utils.schema import get_schema
 from utils.dm import dm_gate
-from utils.undo import log_action
-from utils.war import Force, simulate_battle
-from utils.squads import detect_member_caps, fetch_members, upsert_member_quantity
-
-
-def bucket_key(unit_type_raw: str) -> str:
-    """Normalize unit_type strings into sim buckets.
-
-    Accepts pluralization/casing and common prefixes. Unknown types become "others".
-    """
-    t = (unit_type_raw or "").strip().lower()
-    if t.startswith("guard"):
-        return "guardian"
-    if t.startswith("arch"):
-        return "archer"
-    if t.startswith("mage"):
-        return "mage"
-    if t.startswith("cler"):
-        return "cleric"
-    return "others"
+from utils.war import Force, bucket_key, redistribute_remaining, simulate_battle
+from utils.squads import apply_battle_results, detect_member_caps, fetch_members_for_squads
+from utils.power_index import get_power_index
+from utils.loader import load_parallel
 
 
 def force_to_dict(f: Force) -> dict:
@@ -66,28 +51,49 @@ sb = get_supabase()
 ensure_bootstrap(sb)
 week = get_current_week(sb)
 
-# Cache unit catalog so we can infer unit_type AND power when squad_members only stores unit_id
-try:
-    _units = sb.table("moonblade_units").select("id,name,unit_type,power").execute().data or []
-except Exception:
-    _units = []
-UNIT_TYPE_BY_ID = {u.get("id"): (u.get("unit_type") or "Other") for u in _units}
-UNIT_POWER_BY_ID = {u.get("id"): float(u.get("power") or 0) for u in _units}
-UNIT_NAME_BY_ID = {u.get("id"): (u.get("name") or "") for u in _units}
 
+def _load_squads() -> list[dict]:
+    if get_schema(sb).has("squads", "is_enemy"):
+        return (
+            sb.table("squads")
+            .select("id,name,region,is_enemy")
+            .order("is_enemy", desc=False)
+            .order("name")
+            .execute()
+            .data
+            or []
+        )
+    # Backward compatibility: squads table without is_enemy
+    rows = sb.table("squads").select("id,name,region").order("name").execute().data or []
+    for s in rows:
+        s["is_enemy"] = False
+    return rows
+
+
+# Independent page queries, loaded concurrently
+data = load_parallel(
+    {
+        "units": lambda: sb.table("moonblade_units").select("id,name,unit_type").execute().data or [],
+        "power": lambda: get_power_index(sb),
+        "squads": _load_squads,
+        "member_caps": lambda: detect_member_caps(sb),
+    },
+    defaults={"units": []},
+)
 
-def fetch_squad_member_rows(squad_id) -> tuple[list[dict], object]:
-    """Fetch squad member rows (schema-tolerant).
+# Unit catalog so we can infer unit_type when squad_members only stores unit_id
+_units = data["units"]
+UNIT_TYPE_BY_ID = {u.get("id"): (u.get("unit_type") or "Other") for u in _units}
+UNIT_NAME_BY_ID = {u.get("id"): (u.get("name") or "") for u in _units}
 
-    Returns (rows, caps)
-    """
-    caps = detect_member_caps(sb)
-    rows, _ = fetch_members(sb, squad_id, unit_type_by_id=UNIT_TYPE_BY_ID, _caps=caps)
-    return rows, caps
+# Effective power per unit (catalog power + owned infrastructure bonuses), cached.
+POWER = data["power"]
+# Enemies don't benefit from the player's infrastructure: same catalog, no bonuses.
+ENEMY_POWER = POWER.without_bonuses()
 
 
-def squad_power_breakdown(rows: list[dict]) -> list[dict]:
-    """Rows for a nice table: unit name/type, qty, unit power, total power."""
+def squad_power_breakdown(rows: list[dict], power=POWER) -> list[dict]:
+    """Rows for a nice table: unit name/type, qty, effective unit power, total power."""
     out = {}
     for r in rows or []:
         qty = int(r.get("quantity") or 0)
@@ -96,7 +102,7 @@ def squad_power_breakdown(rows: list[dict]) -> list[dict]:
         uid = r.get("unit_id")
         ut = (r.get("unit_type") or "Other")
         name = UNIT_NAME_BY_ID.get(uid) or ut
-        unit_power = float(UNIT_POWER_BY_ID.get(uid) or 0)
+        unit_power = power.unit_power(uid, ut)
         key = (name, ut, unit_power)
         out.setdefault(key, 0)
         out[key] += qty
@@ -128,23 +134,24 @@ st.caption(
 )
 
 # -------------------------
-# Load squads
+# Squads (loaded above)
 # -------------------------
-try:
-    squads = (
-        sb.table("squads")
-        .select("id,name,region,is_enemy")
-        .order("is_enemy", desc=False)
-        .order("name")
-        .execute()
-        .data
-        or []
-    )
-except Exception:
-    # Backward compatibility: squads table without is_enemy
-    squads = sb.table("squads").select("id,name,region").order("name").execute().data or []
-    for s in squads:
-        s["is_enemy"] = False
+squads = data["squads"]
+
+# Members for every squad in one query (rows normalized, unit_type filled from the catalog)
+MEMBER_CAPS = data["member_caps"]
+MEMBERS_BY_SQUAD = fetch_members_for_squads(
+    sb, [s["id"] for s in squads], unit_type_by_id=UNIT_TYPE_BY_ID, _caps=MEMBER_CAPS
+)
+
+
+def fetch_squad_member_rows(squad_id) -> tuple[list[dict], object]:
+    """Member rows for a squad from the bulk load.
+
+    Returns (rows, caps)
+    """
+    return MEMBERS_BY_SQUAD.get(squad_id, []), MEMBER_CAPS
+
 
 friendly_squads = [s for s in squads if not bool(s.get("is_enemy"))]
 enemy_squads = [s for s in squads if bool(s.get("is_enemy"))]
@@ -200,7 +207,7 @@ if use_enemy_squad and enemy_squads:
     c4.metric("Clerics", enemy.clerics)
     c5.metric("Others", enemy.others)
 
-    bd2 = squad_power_breakdown(enemy_rows)
+    bd2 = squad_power_breakdown(enemy_rows, ENEMY_POWER)
     if bd2:
         st.dataframe(bd2, use_container_width=True, hide_index=True)
 else:
@@ -226,7 +233,16 @@ else:
     )
 
 if st.button("Resolve battle", type="primary"):
-    st.session_state["war_result"] = simulate_battle(ally, enemy)
+    st.session_state["war_result"] = simulate_battle(
+        ally,
+        enemy,
+        ally_weights=POWER.bucket_weights(ally_rows),
+        enemy_weights=(
+            ENEMY_POWER.bucket_weights(enemy_rows)
+            if enemy_squad_choice is not None
+            else ENEMY_POWER.catalog_weights()
+        ),
+    )
 
 result = st.session_state.get("war_result")
 if not result:
@@ -271,72 +287,17 @@ apply_enemy = bool(enemy_squad_choice)
 st.caption("Applies remaining counts to squad(s). If an enemy squad is selected, it will be updated too.")
 
 if st.button("Apply to squads", type="secondary"):
-    def apply_remaining_to_rows(squad_id, rows: list[dict], remaining_by_bucket: dict, caps):
-        """Apply remaining counts to detailed (unit_id-based) squad rows.
-
-        We reduce each unit_type bucket proportionally across the underlying unit rows.
-        This avoids requiring a unit_type-only schema and keeps recruitment-by-unit intact.
-        """
-        # Group current rows by sim bucket (guardian/archer/mage/cleric/others)
-        by_bucket: dict[str, list[dict]] = {}
-        for r in rows:
-            b = bucket_key(r.get("unit_type") or "")
-            by_bucket.setdefault(b, []).append(r)
-
-        for b, rlist in by_bucket.items():
-            cur_total = sum(int(x.get("quantity") or 0) for x in rlist)
-            target = int(remaining_by_bucket.get(b, 0))
-            if cur_total <= 0:
-                continue
-            if target < 0:
-                target = 0
-
-            # Scale quantities
-            ratio = target / cur_total
-            new_q = []
-            for x in rlist:
-                q = int(x.get("quantity") or 0)
-                nq = int(q * ratio)
-                new_q.append(nq)
-
-            # Distribute leftover to reach exact target (deterministic order)
-            leftover = target - sum(new_q)
-            if leftover > 0:
-                # Give +1 to the first N rows
-                for i in range(min(leftover, len(new_q))):
-                    new_q[i] += 1
-            elif leftover < 0:
-                # Remove 1 from rows that still have >0
-                to_remove = -leftover
-                for i in range(len(new_q)):
-                    if to_remove <= 0:
-                        break
-                    if new_q[i] > 0:
-                        new_q[i] -= 1
-                        to_remove -= 1
-
-            # Persist
-            for x, nq in zip(rlist, new_q):
-                # Set by safe keys
-                upsert_member_quantity(
-                    sb,
-                    squad_id,
-                    int(nq),
-                    caps,
-                    unit_id=x.get("unit_id"),
-                    unit_type=x.get("unit_type"),
-                )
-
     # Friendly squad update
     remaining_ally = force_to_dict(result.ally_remaining)
-    apply_remaining_to_rows(squad_choice["id"], ally_rows, remaining_ally, ally_caps)
+    squad_updates = [(squad_choice["id"], redistribute_remaining(ally_rows, remaining_ally))]
+    caps_by_squad = {squad_choice["id"]: ally_caps}
 
     # Enemy squad update (if used)
     if apply_enemy and enemy_squad_choice is not None:
         remaining_enemy = force_to_dict(result.enemy_remaining)
-        apply_remaining_to_rows(enemy_squad_choice["id"], enemy_rows, remaining_enemy, enemy_caps)
+        squad_updates.append((enemy_squad_choice["id"], redistribute_remaining(enemy_rows, remaining_enemy)))
+        caps_by_squad[enemy_squad_choice["id"]] = enemy_caps
 
-    # War log (best-effort across schema variants)
     war_row = {
         "week": week,
         "squad_id": squad_choice["id"],
@@ -352,29 +313,31 @@ if st.button("Apply to squads", type="secondary"):
             "enemy_squad_id": enemy_squad_choice["id"] if enemy_squad_choice else None,
         },
     }
+
+    # Casualties + war log + undo entry in one call (one transaction when the
+    # apply_war_result SQL function is installed).
     try:
-        sb.table("wars").insert(war_row).execute()
-    except Exception:
-        # older schema used enemy_force
-        try:
-            war_row2 = dict(war_row)
-            war_row2["enemy_force"] = war_row2.pop("enemy")
-            sb.table("wars").insert(war_row2).execute()
-        except Exception:
-            pass
-
-    log_action(
-        sb,
-        category=UNDO_CATEGORY,
-        action="apply_war",
-        payload={
-            "week": week,
-            "friendly_squad_id": squad_choice["id"],
-            "enemy_squad_id": enemy_squad_choice["id"] if enemy_squad_choice else None,
-            "before_friendly": force_to_dict(ally),
-            "after_friendly": remaining_ally,
-        },
-    )
+        apply_battle_results(
+            sb,
+            squad_updates=squad_updates,
+            caps_by_squad=caps_by_squad,
+            war_row=war_row,
+            undo={
+                "category": UNDO_CATEGORY,
+                "action": "apply_war",
+                "payload": {
+                    "week": week,
+                    "friendly_squad_id": squad_choice["id"],
+                    "enemy_squad_id": enemy_squad_choice["id"] if enemy_squad_choice else None,
+                    "before_friendly": force_to_dict(ally),
+                    "after_friendly": remaining_ally,
+                },
+            },
+        )
+    except Exception as e:
+        # Not retried automatically: the results may already have been written.
+        st.error(f"Could not apply the battle results: {e}. Check the war log before applying again.")
+        st.stop()
 
     st.success("Applied.")
     st.rerun()
@@ -1,14 +1,17 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timezone
 import re
 
 from utils.nav import page_config, sidebar
 from utils.supabase_client import get_supabase
 from utils.state import ensure_bootstrap
 from utils.dm import dm_gate
-from utils.ledger import get_current_week, set_current_week, add_ledger_entry
-from utils import economy
+from utils.ledger import get_current_week
+from utils import activity, crafting, executor, missions, query_cache, rollover, snapshots
+from utils.activity import log_activity
+from utils.power_index import get_power_index
+from utils.squads import fetch_members_for_squads
+from utils.visibility import clear_visibility
 
 page_config("DM Console", "🔮")
 sidebar("🔮 DM Console")
@@ -27,27 +30,84 @@ unlocked = dm_gate("DM password required", key="dm_console")
 # -------------------------
 st.divider()
 st.subheader("Admin Event Log")
-st.caption("Last 50 logged actions (best-effort).")
+st.caption("Newest first. Filters run on the server; “Load more” continues from the last row shown.")
+
 try:
-    logs = (
-        sb.table("activity_log")
-        .select("created_at,kind,message")
-        .order("created_at", desc=True)
-        .limit(50)
-        .execute()
-        .data
-        or []
+    _players = crafting.list_players(sb)
+except Exception:
+    _players = []
+_player_names = {p["id"]: p.get("name") or p["id"] for p in _players}
+
+f1, f2, f3 = st.columns([2, 2, 1])
+with f1:
+    log_kinds_raw = st.text_input("Kinds (comma-separated)", key="log_kinds", placeholder="diplomacy, missions")
+with f2:
+    log_player = st.selectbox(
+        "Player",
+        [None] + list(_player_names),
+        format_func=lambda pid: "All players" if pid is None else _player_names[pid],
+        key="log_player",
     )
+with f3:
+    log_page_size = st.selectbox("Page size", [25, 50, 100], index=1, key="log_page_size")
+
+log_kinds = [k.strip() for k in (log_kinds_raw or "").split(",") if k.strip()]
+log_filters = (tuple(log_kinds), log_player, log_page_size)
+
+# Loaded pages live in session state until the filters change.
+log_state = st.session_state.get("admin_log")
+if not log_state or log_state["filters"] != log_filters:
+    log_state = {"filters": log_filters, "rows": [], "cursor": None, "loaded": False}
+    st.session_state["admin_log"] = log_state
+
+try:
+    if not log_state["loaded"]:
+        page = activity.list_activity(sb, kinds=log_kinds, player_id=log_player, limit=log_page_size)
+        log_state.update(rows=page.rows, cursor=page.next_cursor, loaded=True)
+
+    logs = log_state["rows"]
     if logs:
         df_logs = pd.DataFrame(
-            [{"Time": l.get("created_at"), "Kind": l.get("kind"), "Message": l.get("message")} for l in logs]
+            [
+                {
+                    "Time": l.get("created_at"),
+                    "Kind": l.get("kind"),
+                    "Player": _player_names.get(l.get("player_id"), ""),
+                    "Message": l.get("message"),
+                }
+                for l in logs
+            ]
         )
         st.dataframe(df_logs, use_container_width=True, hide_index=True)
     else:
         st.info("No events logged yet.")
+
+    c1, c2 = st.columns(2)
+    with c1:
+        if log_state["cursor"] and st.button("Load more", key="log_more"):
+            page = activity.list_activity(
+                sb, kinds=log_kinds, player_id=log_player, limit=log_page_size, cursor=log_state["cursor"]
+            )
+            log_state.update(rows=log_state["rows"] + page.rows, cursor=page.next_cursor)
+            st.rerun()
+    with c2:
+        if st.button("🔄 Refresh", key="log_refresh"):
+            log_state["loaded"] = False
+            st.rerun()
 except Exception:
     st.info("activity_log table not present in this schema.")
 
+with st.expander("📈 Query metrics (this server process)", expanded=False):
+    st.caption(f"Circuit breaker: {executor.breaker.state}. Latency percentiles are histogram bucket upper bounds.")
+    metrics = executor.metrics_snapshot()
+    if metrics:
+        st.dataframe(pd.DataFrame(metrics), use_container_width=True, hide_index=True)
+    else:
+        st.caption("No queries recorded yet.")
+    if st.button("Reset metrics", key="metrics_reset"):
+        executor.reset_metrics()
+        st.rerun()
+
 # -------------------------
 # Visibility + Enemy tools
 # -------------------------
@@ -126,9 +186,13 @@ with vis_tab:
                     for i, row in edited.iterrows()
                     if bool(row["Hidden from players"])
                 ]
-                sb.table("app_state").upsert({"id": 1, "ui_hidden_pages": new_hidden}).execute()
-                st.success("Saved.")
-                st.rerun()
+                if set(new_hidden) == set(hidden_pages):
+                    st.info("No changes to save.")
+                else:
+                    sb.table("app_state").upsert({"id": 1, "ui_hidden_pages": new_hidden}).execute()
+                    clear_visibility()
+                    st.success("Saved.")
+                    st.rerun()
             except Exception as e:
                 st.error(f"Could not save: {e}")
 
@@ -176,14 +240,27 @@ with reps_tab:
         )
 
         if st.button("Save reputation visibility", type="primary"):
-            try:
-                for i, row in edited_f.iterrows():
-                    fid = df_f.iloc[i]["_id"]
-                    sb.table("factions").update({"is_hidden": bool(row["Hidden from players"]) }).eq("id", fid).execute()
-                st.success("Saved.")
-                st.rerun()
-            except Exception as e:
-                st.error(f"Could not save: {e}")
+            # Only rows whose checkbox changed; name/type ride along so the upsert's insert half is valid.
+            changed = [
+                {
+                    "id": df_f.iloc[i]["_id"],
+                    "name": df_f.iloc[i]["Name"],
+                    "type": df_f.iloc[i]["Type"],
+                    "is_hidden": bool(row["Hidden from players"]),
+                }
+                for i, row in edited_f.iterrows()
+                if bool(row["Hidden from players"]) != bool(df_f.iloc[i]["Hidden from players"])
+            ]
+            if not changed:
+                st.info("No changes to save.")
+            else:
+                try:
+                    sb.table("factions").upsert(changed, on_conflict="id").execute()
+                    clear_visibility()
+                    st.success(f"Saved {len(changed)} change(s).")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Could not save: {e}")
     else:
         st.info("No factions found.")
 
@@ -297,20 +374,36 @@ with enemy_tab:
         if not enemy_squads:
             st.info("No enemy squads yet. Create one above.")
         else:
+            # All enemy squads' members in one query
+            members_by_squad = fetch_members_for_squads(
+                sb,
+                [s["id"] for s in enemy_squads],
+                unit_type_by_id={u["id"]: (u.get("unit_type") or "Other") for u in units},
+            )
+            power_index = get_power_index(sb)
+            st.dataframe(
+                pd.DataFrame(
+                    [
+                        {
+                            "Enemy squad": s.get("name"),
+                            "Region": s.get("region") or "",
+                            "Units": sum(int(m.get("quantity") or 0) for m in members_by_squad.get(s["id"], [])),
+                            "Power": round(power_index.squad_power(members_by_squad.get(s["id"], [])), 1),
+                        }
+                        for s in enemy_squads
+                    ]
+                ),
+                use_container_width=True,
+                hide_index=True,
+            )
+
             squad = st.selectbox(
                 "Select enemy squad",
                 options=enemy_squads,
                 format_func=lambda r: r.get("name") or "(unnamed)",
             )
 
-            members = (
-                sb.table("squad_members")
-                .select("id,unit_id,unit_type,quantity")
-                .eq("squad_id", squad["id"])
-                .execute()
-                .data
-                or []
-            )
+            members = members_by_squad.get(squad["id"], [])
 
             unit_by_id = {u["id"]: u for u in units}
             rows = []
@@ -362,76 +455,127 @@ with enemy_tab:
 
 # --- Advance week ---
 with week_tab:
-    st.caption("Computes economy, posts payout to the ledger, closes the week, opens next week.")
+    st.caption("Computes economy, posts payout and upkeep to the ledger, closes the week, opens next week.")
 
     manual_income = st.number_input("Manual income adjustment (optional)", value=0.0, step=10.0)
+    resolve_missions = st.checkbox(
+        "Resolve due diplomacy/intelligence missions",
+        value=True,
+        help="Rolls every active mission whose ETA week has arrived.",
+    )
 
-    if st.button("✅ Advance Week", type="primary"):
-        # Compute economy
-        summary, per_item = economy.compute_week_economy(sb, week)
-        economy.write_week_economy(sb, summary, per_item)
+    if st.button("🎲 Resolve due missions now"):
+        resolved = missions.resolve_due_missions(sb, week=week)
+        n = sum(len(v) for v in resolved.values())
+        log_activity(sb, kind="missions", message=f"Resolved {n} due missions (week {week})", meta={"week": week})
+        st.success(f"Resolved {n} missions.")
+        st.rerun()
 
-        payout = float(summary.player_payout) + float(manual_income or 0)
-        if payout:
-            add_ledger_entry(
-                sb,
-                week=week,
-                direction="in",
-                amount=payout,
-                category="player_payout",
-                note="Player share of taxes",
-                metadata={
-                    "gross_value": summary.gross_value,
-                    "tax_income": summary.tax_income,
-                    "player_payout": summary.player_payout,
-                    "manual_adjustment": float(manual_income or 0),
-                },
-            )
+    def _stage_table(run: rollover.RolloverRun) -> pd.DataFrame:
+        return pd.DataFrame(
+            [
+                {
+                    "Stage": stage.label,
+                    "Status": run.stage_status(stage.name),
+                    "Time (ms)": (run.stages.get(stage.name) or {}).get("duration_ms"),
+                    "Error": (run.stages.get(stage.name) or {}).get("error") or "",
+                }
+                for stage in rollover.STAGES
+            ]
+        )
 
-        # Close current week
-        try:
-            sb.table("weeks").update({"closed_at": datetime.now(timezone.utc).isoformat()}).eq("week", week).execute()
-        except Exception:
-            pass
+    current_run = rollover.load_rollover(sb, week)
+    running = rollover.is_active(current_run)
 
-        next_week = week + 1
+    if current_run is not None and not running and not current_run.is_complete():
+        st.warning(
+            f"Week {week} rollover stopped partway ({current_run.status}). "
+            "Advance Week resumes it from the first unfinished stage, with its original options."
+        )
+        st.dataframe(_stage_table(current_run), use_container_width=True, hide_index=True)
+
+    if st.button("✅ Advance Week", type="primary", disabled=running):
+        started = rollover.start_rollover_in_background(
+            sb,
+            week,
+            manual_income=float(manual_income or 0),
+            resolve_missions=resolve_missions,
+        )
+        if not started:
+            # Shown after the rerun (see below); worded by what blocked the claim.
+            blocked = rollover.load_rollover(sb, week)
+            if blocked is not None and blocked.is_complete():
+                notice = f"Week {week} has already been advanced."
+            elif blocked is not None and rollover.is_active(blocked):
+                notice = f"A rollover for week {week} is already in progress."
+            else:
+                notice = f"Week {week} is held by another rollover ({blocked.status if blocked else 'unknown'}); try again shortly."
+            st.session_state["rollover_notice"] = notice
+        st.rerun()
 
-        # Ensure next week exists
-        try:
-            wk = sb.table("weeks").select("week").eq("week", next_week).execute().data
-            if not wk:
-                sb.table("weeks").insert({"week": next_week, "opened_at": datetime.now(timezone.utc).isoformat()}).execute()
-        except Exception:
-            pass
+    notice = st.session_state.pop("rollover_notice", None)
+    if notice:
+        st.info(notice)
 
-        set_current_week(sb, next_week)
+    if running:
 
-        # Carry forward population (survival can reduce it)
-        try:
-            pop_now = int(getattr(summary, "population", 450_000) or 450_000)
-            surv = float(getattr(summary, "survival_ratio", 1.0) or 1.0)
-            pop_next = max(0, int(round(pop_now * surv)))
-            sb.table("population_state").upsert({"week": next_week, "population": pop_next}, on_conflict="week").execute()
-        except Exception:
-            pass
+        @st.fragment(run_every="2s")
+        def _rollover_progress():
+            query_cache.start_run()
+            run = rollover.load_rollover(sb, week)
+            if not rollover.is_active(run):
+                # Finished or failed: rerun the page to pick up the new week / error state.
+                st.rerun()
+            finished = sum(1 for stage in rollover.STAGES if run.stage_status(stage.name) in ("done", "skipped"))
+            st.progress(
+                finished / len(rollover.STAGES),
+                text=f"Advancing week {week} → {week + 1} in the background ({finished}/{len(rollover.STAGES)} stages)",
+            )
+            st.dataframe(_stage_table(run), use_container_width=True, hide_index=True)
 
-        # Carry forward reputation
-        try:
-            reps = sb.table("reputation").select("faction_id,score,dc,bonus,note").eq("week", week).execute().data or []
-            for r in reps:
-                sb.table("reputation").upsert(
-                    {
-                        "week": next_week,
-                        "faction_id": r["faction_id"],
-                        "score": int(r.get("score") or 0),
-                        "dc": r.get("dc"),
-                        "bonus": r.get("bonus"),
-                        "note": r.get("note") or "carried",
-                    },
-                    on_conflict="week,faction_id",
-                ).execute()
-        except Exception:
-            pass
+        _rollover_progress()
 
-        st.success(f"Advanced to Week {next_week}.")
-        st.rerun()
+    last_run = rollover.load_rollover(sb, week - 1) if week > 1 else None
+    if last_run is not None and last_run.is_complete():
+        unpriced = (last_run.context.get("upkeep") or {}).get("unpriced") or {}
+        if unpriced:
+            st.warning(
+                "Squad members with no catalog upkeep were not charged last week: "
+                + ", ".join(f"{qty}× {unit_type}" for unit_type, qty in sorted(unpriced.items()))
+            )
+        with st.expander(f"Last rollover (week {last_run.week} → {last_run.next_week})", expanded=False):
+            st.dataframe(_stage_table(last_run), use_container_width=True, hide_index=True)
+
+    with st.expander("⏪ Restore a week snapshot", expanded=False):
+        snaps = [r for r in snapshots.list_week_snapshots(sb) if int(r["week"]) <= week]
+        if not snaps:
+            st.caption("No snapshots yet. One is taken at the start of every Advance Week.")
+        else:
+            st.dataframe(
+                pd.DataFrame(
+                    [
+                        {"Week": r["week"], "Size (KB)": round(int(r.get("size_bytes") or 0) / 1024, 1), "Taken": r.get("created_at")}
+                        for r in snaps
+                    ]
+                ),
+                use_container_width=True,
+                hide_index=True,
+            )
+            restore_to = st.selectbox("Restore to the start of week", [int(r["week"]) for r in snaps])
+            confirm = st.checkbox(
+                f"I understand everything Advance Week recorded after week {restore_to} began rolling over will be removed",
+                key="snapshot_restore_confirm",
+            )
+            if st.button("⏪ Restore", disabled=not confirm or running):
+                try:
+                    restored = snapshots.restore_week_snapshot(sb, restore_to)
+                    log_activity(
+                        sb,
+                        kind="snapshot_restore",
+                        message=f"Restored campaign to week {restore_to}",
+                        meta={"week": restore_to, "rows": restored},
+                    )
+                    st.success(f"Restored to week {restore_to}.")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Restore failed: {e}")
@@ -176,3 +176,184 @@ create table if not exists wars (
   result jsonb not null default '{}'::jsonb,
   note text
 );
+
+-- One row per (squad, unit) so member quantities can be bulk-upserted.
+create unique index if not exists idx_squad_members_squad_unit on squad_members(squad_id, unit_id);
+-- Members kept by unit_type only (unit_id null) upsert on (squad_id, unit_type, unit_id);
+-- NULLS NOT DISTINCT lets the null unit_id match (Postgres 15+).
+create unique index if not exists idx_squad_members_squad_type on squad_members(squad_id, unit_type, unit_id) nulls not distinct;
+
+-- Apply War Simulator results atomically: casualties, war log and undo entry
+-- in one round trip. p_members: [{squad_id, unit_id?, unit_type?, quantity}].
+create or replace function apply_war_result(p_members jsonb, p_war jsonb, p_undo jsonb)
+returns uuid
+language plpgsql
+as $$
+declare
+  v_war_id uuid;
+begin
+  update squad_members sm
+     set quantity = greatest(0, x.quantity)
+    from jsonb_to_recordset(coalesce(p_members, '[]'::jsonb))
+         as x(squad_id uuid, unit_id uuid, unit_type text, quantity int)
+   where sm.squad_id = x.squad_id
+     and ((x.unit_id is not null and sm.unit_id = x.unit_id)
+       or (x.unit_id is null and sm.unit_type = x.unit_type));
+
+  if p_war is not null then
+    insert into wars (week, squad_id, enemy, result)
+    values (
+      (p_war->>'week')::int,
+      (p_war->>'squad_id')::uuid,
+      coalesce(p_war->'enemy', '{}'::jsonb),
+      coalesce(p_war->'result', '{}'::jsonb)
+    )
+    returning id into v_war_id;
+  end if;
+
+  if p_undo is not null then
+    insert into action_logs (category, action, payload)
+    values (p_undo->>'category', p_undo->>'action', coalesce(p_undo->'payload', '{}'::jsonb));
+  end if;
+
+  return v_war_id;
+end;
+$$;
+
+-- ===== Missions (diplomacy / intelligence) =====
+
+create table if not exists diplomacy_missions (
+  id uuid primary key default gen_random_uuid(),
+  created_at timestamptz not null default now(),
+  week int not null,
+  unit_id uuid references diplomacy_units(id) on delete set null,
+  quantity int not null default 1,
+  target text,
+  objective text,
+  status text not null default 'active',
+  eta_week int,
+  base_success numeric not null default 0,
+  bonus_success numeric not null default 0,
+  total_success numeric not null default 0,
+  roll int,
+  success boolean,
+  resolution_note text,
+  equipment_assignment jsonb not null default '{}'::jsonb
+);
+
+create table if not exists intelligence_missions (
+  id uuid primary key default gen_random_uuid(),
+  created_at timestamptz not null default now(),
+  week int not null,
+  unit_id uuid references dawnbreakers_units(id) on delete set null,
+  quantity int not null default 1,
+  target text,
+  objective text,
+  status text not null default 'active',
+  eta_week int,
+  base_success numeric not null default 0,
+  bonus_success numeric not null default 0,
+  total_success numeric not null default 0,
+  roll int,
+  success boolean,
+  resolution_note text,
+  equipment_assignment jsonb not null default '{}'::jsonb
+);
+
+-- Keyset pagination (created_at desc, id desc), filters, and the due-mission scan.
+create index if not exists idx_diplomacy_missions_keyset on diplomacy_missions(created_at desc, id desc);
+create index if not exists idx_diplomacy_missions_status_eta on diplomacy_missions(status, eta_week);
+create index if not exists idx_diplomacy_missions_unit on diplomacy_missions(unit_id, created_at desc);
+create index if not exists idx_intelligence_missions_keyset on intelligence_missions(created_at desc, id desc);
+create index if not exists idx_intelligence_missions_status_eta on intelligence_missions(status, eta_week);
+create index if not exists idx_intelligence_missions_unit on intelligence_missions(unit_id, created_at desc);
+
+-- Success rates per unit or target, aggregated server-side.
+-- p_table: diplomacy_missions | intelligence_missions; p_group: unit_id | target
+create or replace function mission_success_rates(p_table text, p_group text default 'unit_id')
+returns table (group_key text, missions bigint, resolved bigint, successes bigint, avg_chance numeric)
+language plpgsql
+stable
+as $$
+begin
+  if p_table not in ('diplomacy_missions', 'intelligence_missions') then
+    raise exception 'unknown mission table %', p_table;
+  end if;
+  if p_group not in ('unit_id', 'target') then
+    raise exception 'unknown mission grouping %', p_group;
+  end if;
+  return query execute format(
+    'select %1$I::text, count(*), count(*) filter (where status = ''resolved''),
+            count(*) filter (where success), avg(total_success)
+       from %2$I group by %1$I',
+    p_group, p_table
+  );
+end;
+$$;
+
+-- Week rollover: copy all reputation rows to the next week in one statement.
+create or replace function carry_forward_reputation(p_from int, p_to int)
+returns int
+language sql
+as $$
+  with copied as (
+    insert into reputation (week, faction_id, score, dc, bonus, note)
+    select p_to, faction_id, score, dc, bonus, coalesce(nullif(note, ''), 'carried')
+      from reputation
+     where week = p_from
+    on conflict (week, faction_id) do update
+      set score = excluded.score,
+          dc = excluded.dc,
+          bonus = excluded.bonus,
+          note = excluded.note,
+          updated_at = now()
+    returning 1
+  )
+  select count(*)::int from copied;
+$$;
+
+-- Advance Week pipeline: one record per week being closed (see utils/rollover.py).
+create table if not exists week_rollovers (
+  week int primary key,
+  status text not null default 'pending', -- pending|running|done|failed
+  stages jsonb not null default '{}'::jsonb, -- {stage: {status, started_at, duration_ms, error}}
+  context jsonb not null default '{}'::jsonb, -- options + intermediate results (summary, upkeep, ...)
+  started_at timestamptz,
+  finished_at timestamptz,
+  updated_at timestamptz not null default now()
+);
+-- Token of the run that holds the week; claimed with a conditional insert/update
+-- so only one rollover per week runs at a time.
+alter table week_rollovers add column if not exists claim_token text;
+
+-- Ledger rows posted by the rollover carry a key (e.g. upkeep:<week>:<category>)
+-- so a retried or concurrent stage can't post them twice.
+alter table ledger_entries add column if not exists idempotency_key text;
+create unique index if not exists idx_ledger_idempotency_key on ledger_entries(idempotency_key);
+
+-- Week snapshots: state captured at the start of each rollover (see utils/snapshots.py).
+create table if not exists week_snapshots (
+  week int primary key,
+  format text not null,
+  size_bytes int not null default 0,
+  blob text not null, -- base64(zlib(json))
+  created_at timestamptz not null default now()
+);
+
+-- Activity / admin event log (written best-effort by utils/activity.py and utils/crafting.py).
+create table if not exists activity_log (
+  id uuid primary key default gen_random_uuid(),
+  created_at timestamptz not null default now(),
+  player_id uuid,
+  kind text,
+  message text,
+  meta jsonb not null default '{}'::jsonb
+);
+-- Keyset pagination (created_at desc, id desc), optionally filtered by kind or player.
+create index if not exists idx_activity_log_keyset on activity_log(created_at desc, id desc);
+create index if not exists idx_activity_log_kind on activity_log(kind, created_at desc, id desc);
+create index if not exists idx_activity_log_player on activity_log(player_id, created_at desc, id desc);
+
+-- Weekly upkeep total (utils/upkeep.py) stored with the week's economy summary.
+-- economy_week_summary is not created by this file (deployments add it alongside the economy tables), hence "if exists".
+alter table if exists economy_week_summary add column if not exists upkeep_total numeric not null default 0;
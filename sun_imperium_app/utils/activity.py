@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+LOG_COLUMNS = "id,created_at,kind,message,meta,player_id"
 
 
 def log_activity(
@@ -29,3 +32,41 @@ def log_activity(
         sb.table("activity_log").insert(payload).execute()
     except Exception:
         return
+
+
+@dataclass(frozen=True)
+class ActivityPage:
+    rows: List[Dict[str, Any]]
+    # (created_at, id) of the last row; pass back as `cursor` for the next page.
+    next_cursor: Optional[Tuple[str, str]]
+
+
+def list_activity(
+    sb,
+    *,
+    kinds: Optional[Sequence[str]] = None,
+    player_id: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[Tuple[str, str]] = None,
+    columns: str = LOG_COLUMNS,
+) -> ActivityPage:
+    """activity_log rows, newest first, filtered server-side and keyset-paginated.
+
+    Ordered by (created_at desc, id desc); backed by idx_activity_log_* so
+    deep pages cost the same as the first one.
+    """
+    limit = max(1, int(limit))
+    q = sb.table("activity_log").select(columns)
+    if kinds:
+        q = q.in_("kind", list(kinds))
+    if player_id:
+        q = q.eq("player_id", player_id)
+    if cursor:
+        ts, last_id = cursor
+        q = q.or_(f'created_at.lt."{ts}",and(created_at.eq."{ts}",id.lt.{last_id})')
+    rows = q.order("created_at", desc=True).order("id", desc=True).limit(limit + 1).execute().data or []
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (rows[-1]["created_at"], rows[-1]["id"]) if more and rows else None
+    return ActivityPage(rows=rows, next_cursor=next_cursor)
@@ -2,10 +2,11 @@
 import json
 import random
 import re
-import time
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Optional, Tuple
 
+from utils import activity, executor, schema, state
+
 TIER_RE = re.compile(r"\(T(\d+)\)")
 
 
@@ -14,39 +15,9 @@ TIER_RE = re.compile(r"\(T(\d+)\)")
 # ---------------------------
 
 
-def _sb_execute(req, *, retries: int = 3, base_sleep: float = 0.25):
-    """Execute a PostgREST request with small retries.
-
-    Streamlit Cloud occasionally throws transient httpx.ReadError / transport
-    errors. Retrying a couple times makes the UX far less brittle.
-    """
-
-    last_err: Exception | None = None
-    for attempt in range(retries):
-        try:
-            return req.execute()
-        except Exception as e:  # noqa: BLE001
-            last_err = e
-            msg = f"{type(e).__name__}: {e}"
-            is_transient = any(
-                k in msg
-                for k in (
-                    "ReadError",
-                    "ConnectError",
-                    "RemoteProtocolError",
-                    "Server disconnected",
-                    "timed out",
-                    "Timeout",
-                    "502",
-                    "503",
-                    "504",
-                )
-            )
-            if (attempt + 1) >= retries or not is_transient:
-                raise
-            time.sleep(base_sleep * (2**attempt))
-    # should never reach
-    raise last_err  # type: ignore[misc]
+def _sb_execute(req, *, retries: int = 3):
+    """Execute a PostgREST request through the shared executor (retries, breaker, metrics)."""
+    return executor.execute(req, tries=retries)
 
 
 # ---------------------------
@@ -88,11 +59,9 @@ def _safe_json(v):
 # ---------------------------
 
 def get_current_week(sb) -> int:
-    # Try app_state(id=1) -> current_week, else app_settings.current_week, else 1
+    # Try app_state(id=1) -> current_week (cached), else app_settings.current_week, else 1
     try:
-        r = _sb_execute(sb.table("app_state").select("current_week").eq("id", 1).single())
-        if r.data and "current_week" in r.data:
-            return int(r.data["current_week"])
+        return state.get_current_week(sb)
     except Exception:
         pass
 
@@ -124,16 +93,21 @@ def log(sb, player_id: str, kind: str, message: str, meta: Optional[Dict[str, An
         pass
 
 
-def get_activity_log(sb, player_id: str, limit: int = 25) -> List[Dict[str, Any]]:
+def get_activity_log(
+    sb,
+    player_id: str,
+    limit: int = 25,
+    cursor: Optional[Tuple[str, str]] = None,
+) -> List[Dict[str, Any]]:
+    """Newest activity for a player; pass the last row's (created_at, id) as `cursor` for older rows."""
     try:
-        r = _sb_execute(
-            sb.table("activity_log")
-            .select("created_at,message,kind,meta")
-            .eq("player_id", player_id)
-            .order("created_at", desc=True)
-            .limit(limit)
-        )
-        return r.data or []
+        return activity.list_activity(
+            sb,
+            player_id=player_id,
+            limit=limit,
+            cursor=cursor,
+            columns="id,created_at,message,kind,meta",
+        ).rows
     except Exception:
         return []
 
@@ -208,35 +182,19 @@ def ensure_player_progress(sb, player_id: str) -> Dict[str, Any]:
       - known_recipes (jsonb array) optional
       - discovered_recipes (jsonb array) optional
     """
-    try:
-        r = sb.table("player_progress").select("player_id,skills,known_recipes,discovered_recipes").eq("player_id", player_id).execute()
-        if r.data:
-            row = r.data[0]
-            row["skills"] = row.get("skills") or {}
-            row["known_recipes"] = row.get("known_recipes") or []
-            row["discovered_recipes"] = row.get("discovered_recipes") or row["known_recipes"]
-            return row
-    except Exception:
-        pass
-
-    # fallback schema without discovered_recipes
-    try:
-        r = sb.table("player_progress").select("player_id,skills,known_recipes").eq("player_id", player_id).execute()
-        if r.data:
-            row = r.data[0]
-            row["skills"] = row.get("skills") or {}
-            row["known_recipes"] = row.get("known_recipes") or []
-            row["discovered_recipes"] = row["known_recipes"]
-            return row
-    except Exception:
-        pass
+    reg = schema.get_schema(sb)
+    cols = reg.select_list("player_progress", ("player_id", "skills", "known_recipes", "discovered_recipes"))
+    r = sb.table("player_progress").select(cols).eq("player_id", player_id).execute()
+    if r.data:
+        row = r.data[0]
+        row["skills"] = row.get("skills") or {}
+        row["known_recipes"] = row.get("known_recipes") or []
+        row["discovered_recipes"] = row.get("discovered_recipes") or row["known_recipes"]
+        return row
 
     # create new
     base = {"player_id": player_id, "skills": {}, "known_recipes": [], "discovered_recipes": []}
-    try:
-        sb.table("player_progress").insert(base).execute()
-    except Exception:
-        sb.table("player_progress").insert({"player_id": player_id, "skills": {}, "known_recipes": []}).execute()
+    sb.table("player_progress").insert(reg.pick("player_progress", base)).execute()
     return base
 
 
@@ -616,36 +574,41 @@ def start_craft_job(sb, player_id: str, preview: Dict[str, Any]) -> None:
         "done": False,
     }
 
-    # Try insert with extended columns too (if available) but tolerate older caches
-    try:
-        sb.table("crafting_jobs").insert({
-            **base_insert,
-            "status": "active",
-            "kind": "craft",
-            "recipe_name": preview.get("recipe_name"),
-            "duration_seconds": dur,
-            "started_at": _now_utc().isoformat(),
-            "completes_at": ends.isoformat(),
-            "detail": {"tier": tier, "profession": preview.get("profession")},
-            "result": {"output_qty": preview.get("output_qty", 1)},
-        }).execute()
-    except Exception:
-        sb.table("crafting_jobs").insert(base_insert).execute()
+    # Extended columns are only sent when the table has them
+    sb.table("crafting_jobs").insert(
+        schema.get_schema(sb).pick(
+            "crafting_jobs",
+            {
+                **base_insert,
+                "status": "active",
+                "kind": "craft",
+                "recipe_name": preview.get("recipe_name"),
+                "duration_seconds": dur,
+                "started_at": _now_utc().isoformat(),
+                "completes_at": ends.isoformat(),
+                "detail": {"tier": tier, "profession": preview.get("profession")},
+                "result": {"output_qty": preview.get("output_qty", 1)},
+            },
+        )
+    ).execute()
 
     log(sb, player_id, "craft", f"Started crafting: {preview.get('recipe_name')}", {"tier": tier, "ends_at": ends.isoformat()})
 
 
 def list_active_jobs(sb, player_id: str) -> List[Dict[str, Any]]:
     # active = not done; also support status='active' if used
+    reg = schema.get_schema(sb)
+    q = sb.table("crafting_jobs").select("*").eq("player_id", player_id)
+    if reg.has("crafting_jobs", "done"):
+        q = q.eq("done", False)
+    elif reg.has("crafting_jobs", "status"):
+        q = q.eq("status", "active")
+    else:
+        return []
     try:
-        r = sb.table("crafting_jobs").select("*").eq("player_id", player_id).eq("done", False).order("created_at", desc=True).execute()
-        return r.data or []
+        return q.order("created_at", desc=True).execute().data or []
     except Exception:
-        try:
-            r = sb.table("crafting_jobs").select("*").eq("player_id", player_id).eq("status", "active").order("created_at", desc=True).execute()
-            return r.data or []
-        except Exception:
-            return []
+        return []
 
 
 def claim_job_rewards(sb, player_id: str, job_id: str) -> None:
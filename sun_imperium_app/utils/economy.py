@@ -5,6 +5,8 @@ from typing import Any, Dict, List, Tuple
 
 import re
 
+from utils import reputation
+
 # --- Canonical Week-1 constants (from DM) ---
 GRAIN_PER_CAPITA = 0.006  # 2700 / 450_000
 WATER_PER_CAPITA = 0.004  # 1800 / 450_000
@@ -255,9 +257,8 @@ def _load_reputation_scores(sb, week: int) -> tuple[dict[str, float], dict[str,
     try:
         fac = sb.table("factions").select("id,name,type").execute().data or []
         fac_by_id = {f["id"]: f for f in fac if f.get("id")}
-        reps = sb.table("reputation").select("faction_id,score").eq("week", week).execute().data or []
-        for r in reps:
-            fid = r.get("faction_id")
+        scores = reputation.get_week_scores(sb, week)
+        for fid, score in scores.items():
             f = fac_by_id.get(fid)
             if not f:
                 continue
@@ -265,7 +266,7 @@ def _load_reputation_scores(sb, week: int) -> tuple[dict[str, float], dict[str,
             tp = (f.get("type") or "").strip().lower()
             if not nm:
                 continue
-            sc = float(r.get("score") or 0)
+            sc = float(score)
             if tp == "region":
                 region_scores[nm] = sc
             elif tp == "family":
@@ -710,6 +711,7 @@ def write_week_economy(sb, summary: WeekEconomyResult, per_item_rows: List[Dict[
                 "tax_income": summary.tax_income,
                 "player_share": summary.player_share,
                 "player_payout": summary.player_payout,
+                "upkeep_total": summary.upkeep_total,
             },
             on_conflict="week",
         ).execute()
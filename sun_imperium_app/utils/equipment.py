@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
+
+from utils.missions import MAX_SUCCESS_PCT
 
 
 def get_equipment_items(sb, category: str) -> List[Dict[str, Any]]:
@@ -76,3 +78,85 @@ def compute_equipment_bonus_pct(
         bonus = float(item.get("success_bonus_pct") or 0.0)
         total += bonus * int(qty)
     return total
+
+
+def equipment_in_use(missions: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Sum equipment_assignment over active missions (equipment_id -> qty)."""
+    used: Dict[str, int] = {}
+    for m in missions or []:
+        if str(m.get("status")) != "active":
+            continue
+        for eid, qty in (m.get("equipment_assignment") or {}).items():
+            used[eid] = used.get(eid, 0) + int(qty or 0)
+    return used
+
+
+def optimize_equipment_assignment(
+    missions: List[Dict[str, Any]],
+    equipment_rows: List[Dict[str, Any]],
+    inventory: Dict[str, int],
+    *,
+    objective: str = "total",
+    cap: float = MAX_SUCCESS_PCT,
+    reserved: Optional[Dict[str, int]] = None,
+) -> List[Dict[str, int]]:
+    """Split owned equipment across planned missions.
+
+    missions: [{base_success: float, ...}] (one dict per planned mission)
+    inventory: equipment_id -> quantity owned
+    reserved: equipment_id -> quantity already committed elsewhere
+    objective: 'total' maximizes the sum of capped success chances,
+               'min' raises the weakest mission first.
+
+    Greedy on marginal gain: each step hands out one item where it adds the
+    most capped success, preferring the smaller bonus on ties so nothing is
+    wasted over the cap. Pure in-memory, cheap enough to run on every rerun.
+    Returns one assignment (equipment_id -> qty) per mission, in order.
+    """
+    bonus_by_id = {
+        e["id"]: float(e.get("success_bonus_pct") or 0.0)
+        for e in equipment_rows
+        if float(e.get("success_bonus_pct") or 0.0) > 0
+    }
+    left = {
+        eid: max(0, int(inventory.get(eid, 0)) - int((reserved or {}).get(eid, 0)))
+        for eid in bonus_by_id
+    }
+    totals = [max(0.0, min(cap, float(m.get("base_success") or 0.0))) for m in missions]
+    out: List[Dict[str, int]] = [{} for _ in missions]
+
+    def best_item(headroom: float) -> Optional[str]:
+        best: Optional[str] = None
+        best_key = (0.0, 0.0)
+        for eid, n in left.items():
+            if n <= 0:
+                continue
+            gain = min(bonus_by_id[eid], headroom)
+            key = (gain, -bonus_by_id[eid])
+            if gain > 0 and (best is None or key > best_key):
+                best, best_key = eid, key
+        return best
+
+    while True:
+        if objective == "min":
+            open_idx = [i for i, t in enumerate(totals) if t < cap]
+            if not open_idx:
+                break
+            i = min(open_idx, key=lambda k: (totals[k], k))
+            eid = best_item(cap - totals[i])
+        else:
+            i, eid, best_gain = -1, None, 0.0
+            for k, t in enumerate(totals):
+                cand = best_item(cap - t)
+                if cand is None:
+                    continue
+                gain = min(bonus_by_id[cand], cap - t)
+                if gain > best_gain:
+                    i, eid, best_gain = k, cand, gain
+        if eid is None or i < 0:
+            break
+        left[eid] -= 1
+        out[i][eid] = out[i].get(eid, 0) + 1
+        totals[i] = min(cap, totals[i] + bonus_by_id[eid])
+
+    return out
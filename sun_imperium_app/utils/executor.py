@@ -0,0 +1,300 @@
+"""One executor for every PostgREST `.execute()`.
+
+- Retries transient failures with full-jitter exponential backoff, bounded
+  by a per-request deadline that is also passed to the HTTP call as its
+  timeout. Failures are classified by exception type (httpx transport
+  errors) and HTTP status, never by message text. Reads retry on any
+  transient error. Writes only retry when the request can't have reached
+  the database (connect failures, 503 from the gateway), so an insert is
+  never applied twice.
+- A process-wide circuit breaker fails fast with `BackendUnavailable` after
+  repeated transient failures, then lets one trial request through after a
+  cooldown.
+- Counters and latency histograms are kept per (table, operation); see
+  `metrics_snapshot()` (shown in the DM Console).
+
+The client from `get_supabase()` routes every query through `execute`, so
+callers normally don't use this module directly.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_DEADLINE_SECONDS = 10.0
+DEFAULT_TRIES = 4
+BASE_SLEEP_SECONDS = 0.25
+MAX_SLEEP_SECONDS = 2.0
+
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN_SECONDS = 30.0
+
+# Histogram bucket upper bounds in milliseconds (last bucket is open-ended).
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+try:
+    import httpx
+
+    _TRANSIENT_TYPES: tuple = (
+        httpx.TimeoutException,
+        httpx.NetworkError,
+        httpx.RemoteProtocolError,
+        ConnectionError,
+        TimeoutError,
+    )
+    # Failures where the request never reached the server: safe to retry writes.
+    _NOT_SENT_TYPES: tuple = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, ConnectionRefusedError)
+except ImportError:  # pragma: no cover - httpx ships with supabase
+    httpx = None
+    _TRANSIENT_TYPES = (ConnectionError, TimeoutError)
+    _NOT_SENT_TYPES = (ConnectionRefusedError,)
+
+# HTTP statuses from the API gateway. postgrest's APIError carries the status
+# as `code` when the body isn't a PostgREST error (e.g. an HTML 502 page).
+_TRANSIENT_STATUSES = frozenset({"502", "503", "504"})
+_NOT_SENT_STATUSES = frozenset({"503"})
+
+READ_OPS = frozenset({"select", "rpc_read"})
+
+
+class BackendUnavailable(RuntimeError):
+    """Raised while the circuit breaker is open."""
+
+
+def error_code(e: BaseException) -> str:
+    """PostgREST / SQLSTATE / HTTP status code of an API error ("" if none)."""
+    code = getattr(e, "code", None)
+    return "" if code is None else str(code)
+
+
+def is_transient(e: BaseException) -> bool:
+    return isinstance(e, _TRANSIENT_TYPES) or error_code(e) in _TRANSIENT_STATUSES
+
+
+def _retry_safe(e: BaseException, op: str) -> bool:
+    if not is_transient(e):
+        return False
+    if op in READ_OPS:
+        return True
+    return isinstance(e, _NOT_SENT_TYPES) or error_code(e) in _NOT_SENT_STATUSES
+
+
+class _TimeoutSession:
+    """HTTP session wrapper that gives every request a timeout."""
+
+    def __init__(self, session: Any, timeout: float):
+        self._session = session
+        self._timeout = timeout
+
+    def request(self, *args: Any, **kwargs: Any) -> Any:
+        kwargs.setdefault("timeout", self._timeout)
+        return self._session.request(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._session, name)
+
+
+def _set_timeout(req: Any, seconds: float) -> None:
+    """Bound the next `req.execute()` to `seconds`.
+
+    postgrest builders send through their own `session` attribute, and each
+    builder belongs to one request, so swapping it is thread-safe. Requests
+    without a session (e.g. the in-memory backend) are left alone.
+    """
+    session = getattr(req, "session", None)
+    if session is None or not hasattr(session, "request"):
+        return
+    base = session._session if isinstance(session, _TimeoutSession) else session
+    try:
+        req.session = _TimeoutSession(base, max(0.1, seconds))
+    except AttributeError:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------------------------------
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown_seconds: float = BREAKER_COOLDOWN_SECONDS):
+        self.threshold = int(threshold)
+        self.cooldown_seconds = float(cooldown_seconds)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                return "half-open"
+            return "open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.cooldown_seconds or self._trial_in_flight:
+                raise BackendUnavailable("Database temporarily unavailable (circuit open); retry shortly.")
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def record_neutral(self) -> None:
+        """A non-transient error: the backend answered, so it's up."""
+        self.record_success()
+
+
+breaker = CircuitBreaker()
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+@dataclass
+class OpMetrics:
+    calls: int = 0
+    errors: int = 0
+    retries: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+
+    def observe(self, ms: float) -> None:
+        self.calls += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile_ms(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding quantile q (None if unbounded / empty)."""
+        if not self.calls:
+            return None
+        target = q * self.calls
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return float(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+
+_metrics_lock = threading.Lock()
+_metrics: Dict[Tuple[str, str], OpMetrics] = {}
+
+
+def _metric(table: str, op: str) -> OpMetrics:
+    key = (table, op)
+    m = _metrics.get(key)
+    if m is None:
+        m = _metrics[key] = OpMetrics()
+    return m
+
+
+def metrics_snapshot() -> List[Dict[str, Any]]:
+    """One row per (table, op), slowest total time first."""
+    with _metrics_lock:
+        rows = [
+            {
+                "table": table,
+                "op": op,
+                "calls": m.calls,
+                "errors": m.errors,
+                "retries": m.retries,
+                "avg_ms": round(m.total_ms / m.calls, 1) if m.calls else 0.0,
+                "p50_ms": m.quantile_ms(0.5),
+                "p95_ms": m.quantile_ms(0.95),
+                "max_ms": round(m.max_ms, 1),
+                "total_ms": round(m.total_ms, 1),
+            }
+            for (table, op), m in _metrics.items()
+        ]
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+
+def reset_metrics() -> None:
+    with _metrics_lock:
+        _metrics.clear()
+
+
+# ---------------------------------------------------------------------------
+# Executor
+# ---------------------------------------------------------------------------
+
+def execute(
+    req: Any,
+    *,
+    table: str = "?",
+    op: Optional[str] = None,
+    deadline_seconds: float = DEFAULT_DEADLINE_SECONDS,
+    tries: int = DEFAULT_TRIES,
+) -> Any:
+    """Run `req.execute()` with retries, deadline, circuit breaker and metrics.
+
+    Requests that already go through the executor (the proxies returned by
+    `get_supabase()`) are executed as-is, so wrapping them again doesn't
+    multiply retries.
+    """
+    if getattr(req, "EXECUTOR_MANAGED", False):
+        return req.execute()
+    if op is None:
+        # Raw postgrest builders: selects are SyncSelectRequestBuilder (and
+        # subclasses); anything else is treated as a write.
+        op = "select" if "Select" in type(req).__name__ else "write"
+
+    start = time.monotonic()
+    attempt = 0
+    while True:
+        breaker.before_call()
+        _set_timeout(req, deadline_seconds - (time.monotonic() - start))
+        t0 = time.monotonic()
+        try:
+            response = req.execute()
+        except Exception as e:
+            elapsed_ms = (time.monotonic() - t0) * 1000
+            with _metrics_lock:
+                m = _metric(table, op)
+                m.observe(elapsed_ms)
+                m.errors += 1
+            if not is_transient(e):
+                breaker.record_neutral()
+                raise
+            breaker.record_failure()
+
+            attempt += 1
+            sleep = random.uniform(0, min(MAX_SLEEP_SECONDS, BASE_SLEEP_SECONDS * (2 ** (attempt - 1))))
+            out_of_time = (time.monotonic() - start) + sleep > deadline_seconds
+            if attempt >= tries or out_of_time or not _retry_safe(e, op):
+                raise
+            with _metrics_lock:
+                _metric(table, op).retries += 1
+            time.sleep(sleep)
+            continue
+
+        with _metrics_lock:
+            _metric(table, op).observe((time.monotonic() - t0) * 1000)
+        breaker.record_success()
+        return response
@@ -0,0 +1,246 @@
+"""Generated campaign data for the in-memory backend (`utils.memory_backend`).
+
+`generate_fixtures(seed, scale)` returns {table: rows} for a campaign a few
+weeks in: factions and reputation history, unit catalogs and rosters, squads
+with members, infrastructure, legislation, missions, ledger entries and the
+week bookkeeping. The same seed always gives the same rows (ids included),
+so benchmark runs are comparable; `scale` multiplies the row counts.
+"""
+
+from __future__ import annotations
+
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+WEEKS = 6
+STARTING_GOLD = 50_000
+BASE_POPULATION = 450_000
+
+UNIT_TYPES = ("guardian", "archer", "mage", "cleric")
+FACTION_TYPES = ("region", "house", "international")
+MISSION_TARGETS = ("Ashen Reach", "House Valen", "Tidewatch", "The Gilded Court", "Northmarch")
+
+Rows = List[Dict[str, Any]]
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _ts(start: datetime, week: int, rng: random.Random) -> str:
+    at = start + timedelta(days=7 * (week - 1), seconds=rng.randint(0, 6 * 86_400), microseconds=rng.randint(0, 999_999))
+    return at.isoformat(timespec="microseconds")
+
+
+def _units(rng: random.Random, prefix: str, count: int, *, military: bool = False) -> Rows:
+    rows = []
+    for i in range(count):
+        tier = 1 + i % 4
+        row: Dict[str, Any] = {
+            "id": _uuid(rng),
+            "name": f"{prefix} {i + 1}",
+            "upkeep": 5 * tier + rng.randint(0, 5),
+            "description": f"Tier {tier} {prefix.lower()}",
+        }
+        if military:
+            row.update(unit_type=UNIT_TYPES[i % len(UNIT_TYPES)], power=tier + rng.randint(0, 2), cost=40 * tier)
+        else:
+            row.update(tier=tier, purchase_cost=60 * tier)
+        rows.append(row)
+    return rows
+
+
+def _roster(rng: random.Random, units: Rows) -> Rows:
+    return [{"id": _uuid(rng), "unit_id": u["id"], "quantity": rng.randint(0, 40)} for u in units]
+
+
+def _missions(rng: random.Random, units: Rows, start: datetime, per_week: int) -> Rows:
+    rows = []
+    for week in range(1, WEEKS + 1):
+        for _ in range(per_week):
+            base = rng.choice((40, 50, 60, 70))
+            bonus = rng.choice((0, 5, 10))
+            resolved = week < WEEKS - 1
+            success = resolved and rng.random() < (base + bonus) / 100
+            rows.append(
+                {
+                    "id": _uuid(rng),
+                    "created_at": _ts(start, week, rng),
+                    "week": week,
+                    "unit_id": rng.choice(units)["id"],
+                    "quantity": rng.randint(1, 5),
+                    "target": rng.choice(MISSION_TARGETS),
+                    "objective": rng.choice(("Gather intel", "Negotiate", "Sabotage", "Escort")),
+                    "status": "resolved" if resolved else "active",
+                    "eta_week": week + rng.randint(1, 2),
+                    "base_success": base,
+                    "bonus_success": bonus,
+                    "total_success": base + bonus,
+                    "roll": rng.randint(1, 100) if resolved else None,
+                    "success": success if resolved else None,
+                }
+            )
+    return rows
+
+
+def generate_fixtures(*, seed: int = 0, scale: int = 1) -> Dict[str, Rows]:
+    """{table: rows}, parents before children."""
+    rng = random.Random(seed)
+    scale = max(1, int(scale))
+    start = datetime(2025, 1, 6, tzinfo=timezone.utc)
+
+    weeks = [
+        {
+            "week": w,
+            "status": "closed" if w < WEEKS else "open",
+            "opened_at": _ts(start, w, rng),
+            "closed_at": _ts(start, w + 1, rng) if w < WEEKS else None,
+        }
+        for w in range(1, WEEKS + 1)
+    ]
+
+    factions = [
+        {"id": _uuid(rng), "name": f"{FACTION_TYPES[i % 3].title()} {i + 1}", "type": FACTION_TYPES[i % 3]}
+        for i in range(12 * scale)
+    ]
+    reputation = []
+    for f in factions:
+        score = rng.randint(-3, 3)
+        for w in range(1, WEEKS + 1):
+            score = max(-10, min(10, score + rng.randint(-1, 1)))
+            reputation.append({"id": _uuid(rng), "week": w, "faction_id": f["id"], "score": score, "note": ""})
+
+    moonblade_units = _units(rng, "Moonblade", 8 * scale, military=True)
+    diplomacy_units = _units(rng, "Envoy", 4 * scale)
+    dawnbreakers_units = _units(rng, "Agent", 4 * scale)
+    for u in dawnbreakers_units:
+        u["success"] = rng.choice((5, 10, 15))
+
+    squads = [
+        {"id": _uuid(rng), "name": f"Squad {i + 1}", "region": rng.choice(MISSION_TARGETS)}
+        for i in range(4 * scale)
+    ]
+    squad_members = [
+        {
+            "id": _uuid(rng),
+            "squad_id": s["id"],
+            "unit_id": u["id"],
+            "unit_type": u["unit_type"],
+            "quantity": rng.randint(1, 20),
+        }
+        for s in squads
+        for u in rng.sample(moonblade_units, k=min(4, len(moonblade_units)))
+    ]
+
+    infrastructure = [
+        {
+            "id": _uuid(rng),
+            "name": f"{kind} {i + 1}",
+            "category": kind.lower(),
+            "cost": 500 * (1 + i % 3),
+            "upkeep": 25 * (1 + i % 3),
+            "description": f"{kind} works",
+        }
+        for i, kind in enumerate(("Granary", "Well", "Forge", "Barracks", "Library", "Harbor") * scale)
+    ]
+    infrastructure_owned = [
+        {"infrastructure_id": i["id"], "owned": True, "owned_at": _ts(start, 1, rng)}
+        for i in infrastructure
+        if rng.random() < 0.5
+    ]
+
+    legislation = [
+        {
+            "id": _uuid(rng),
+            "chapter": f"{1 + i // 5}",
+            "article": f"{1 + i % 5}",
+            "title": f"Edict {i + 1}",
+            "dc": rng.choice((10, 12, 15)),
+            "description": "Generated fixture",
+            "active": rng.random() < 0.8,
+        }
+        for i in range(10 * scale)
+    ]
+
+    ledger_entries: Rows = [
+        {
+            "id": _uuid(rng),
+            "week": 1,
+            "created_at": _ts(start, 1, rng),
+            "category": "starting_gold",
+            "direction": "in",
+            "amount": STARTING_GOLD,
+            "note": "Fixture treasury",
+        }
+    ]
+    population_state: Rows = []
+    economy_week_summary: Rows = []
+    population = BASE_POPULATION
+    for w in range(1, WEEKS + 1):
+        for _ in range(3 * scale):
+            direction = rng.choice(("in", "out"))
+            ledger_entries.append(
+                {
+                    "id": _uuid(rng),
+                    "week": w,
+                    "created_at": _ts(start, w, rng),
+                    "category": "manual_income" if direction == "in" else "purchase",
+                    "direction": direction,
+                    "amount": rng.randint(50, 2_000),
+                    "note": "Fixture entry",
+                }
+            )
+        population_state.append({"week": w, "population": population})
+        if w < WEEKS:
+            survival = round(rng.uniform(0.9, 1.0), 4)
+            economy_week_summary.append(
+                {
+                    "week": w,
+                    "population": population,
+                    "survival_ratio": survival,
+                    "player_payout": rng.randint(100, 500),
+                    "tax_income": rng.randint(1_000, 5_000),
+                    "gross_value": rng.randint(5_000, 20_000),
+                    "grain_needed": population * 0.01,
+                    "grain_produced": int(population * 0.01 * survival),
+                    "water_needed": population * 0.02,
+                    "water_produced": int(population * 0.02 * survival),
+                }
+            )
+        population = int(population * rng.uniform(0.99, 1.02))
+
+    activity_log = [
+        {
+            "id": _uuid(rng),
+            "created_at": _ts(start, 1 + i % WEEKS, rng),
+            "kind": rng.choice(("craft", "gather", "purchase", "week_advance")),
+            "message": f"Fixture event {i + 1}",
+        }
+        for i in range(30 * scale)
+    ]
+
+    return {
+        "app_state": [{"id": 1, "current_week": WEEKS}],
+        "weeks": weeks,
+        "factions": factions,
+        "reputation": reputation,
+        "moonblade_units": moonblade_units,
+        "moonblade_roster": _roster(rng, moonblade_units),
+        "diplomacy_units": diplomacy_units,
+        "diplomacy_roster": _roster(rng, diplomacy_units),
+        "dawnbreakers_units": dawnbreakers_units,
+        "dawnbreakers_roster": _roster(rng, dawnbreakers_units),
+        "squads": squads,
+        "squad_members": squad_members,
+        "infrastructure": infrastructure,
+        "infrastructure_owned": infrastructure_owned,
+        "legislation": legislation,
+        "diplomacy_missions": _missions(rng, diplomacy_units, start, 3 * scale),
+        "intelligence_missions": _missions(rng, dawnbreakers_units, start, 3 * scale),
+        "ledger_entries": ledger_entries,
+        "population_state": population_state,
+        "economy_week_summary": economy_week_summary,
+        "activity_log": activity_log,
+    }
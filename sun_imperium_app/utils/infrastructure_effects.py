@@ -1,6 +1,10 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Iterable, Mapping
+
+import streamlit as st
 from supabase import Client
 
 
@@ -106,55 +110,128 @@ def get_owned_infrastructure_names(sb: Client) -> set[str]:
     return {r["name"] for r in infra if r["id"] in owned_ids}
 
 
-def power_bonus_for_unit_type(sb: Client, unit_type: str) -> float:
-    """Total power bonus from owned infrastructure for a unit_type."""
-    unit_type = (unit_type or "").strip().lower()
-    owned_names = get_owned_infrastructure_names(sb)
-    bonus = 0.0
-    for name in owned_names:
-        eff = effect_for_infrastructure(name)
-        if eff and eff.kind == "power_bonus" and eff.target == unit_type:
-            bonus += float(eff.value)
-    return bonus
+@dataclass(frozen=True)
+class EffectsSnapshot:
+    """Every owned-infrastructure aggregate, computed once.
+
+    Built by `get_effects_snapshot` from a single query and cached until an
+    infrastructure purchase/undo, a rollover or a snapshot restore calls
+    `clear_effects_snapshot()` (or the TTL runs out). Consumers that need the
+    owned set (shop page, upkeep, power index) read it from here instead of
+    re-downloading `infrastructure_owned`.
+    """
 
+    owned_names: frozenset[str]
+    power_bonus_by_unit_type: Mapping[str, float]
+    success_bonus_pct_by_category: Mapping[str, float]
+    production_multiplier: float
+    social_points: int
+    owned_ids: frozenset = frozenset()
 
-def success_bonus_pct_for_category(sb: Client, category: str) -> float:
-    """Total success bonus % from owned infrastructure (diplomacy/intelligence)."""
-    category = (category or "").strip().lower()
-    owned_names = get_owned_infrastructure_names(sb)
-    bonus = 0.0
-    for name in owned_names:
-        eff = effect_for_infrastructure(name)
-        if eff and eff.kind == "success_bonus_pct" and eff.target == category:
-            bonus += float(eff.value)
-    return bonus
-def production_multiplier_owned(sb: Client) -> float:
-    """Product of all owned 'production' multipliers. Defaults to 1.0."""
-    owned_names = get_owned_infrastructure_names(sb)
+    def power_bonus(self, unit_type: str) -> float:
+        return float(self.power_bonus_by_unit_type.get((unit_type or "").strip().lower(), 0.0))
+
+    def success_bonus_pct(self, category: str) -> float:
+        return float(self.success_bonus_pct_by_category.get((category or "").strip().lower(), 0.0))
+
+
+def build_effects_snapshot(owned_names: Iterable[str], owned_ids: Iterable = ()) -> EffectsSnapshot:
+    """Aggregate all effects of the given owned infrastructure in one pass."""
+    names = frozenset((n or "").strip() for n in owned_names or [] if n)
+    power: dict[str, float] = {}
+    success: dict[str, float] = {}
     mult = 1.0
-    for name in owned_names:
+    pts = 0
+    for name in names:
         eff = effect_for_infrastructure(name)
-        if eff and eff.kind == "multiplier" and eff.target == "production":
+        if not eff:
+            continue
+        if eff.kind == "power_bonus":
+            power[eff.target] = power.get(eff.target, 0.0) + float(eff.value)
+        elif eff.kind == "success_bonus_pct":
+            success[eff.target] = success.get(eff.target, 0.0) + float(eff.value)
+        elif eff.kind == "multiplier" and eff.target == "production":
             try:
                 mult *= float(eff.value)
             except Exception:
                 continue
-    # Clamp to avoid runaway values
-    return max(0.1, min(10.0, float(mult)))
-
-
-def social_points_owned(sb: Client) -> int:
-    """Sum of social points from owned social infrastructure."""
-    owned_names = get_owned_infrastructure_names(sb)
-    pts = 0
-    for name in owned_names:
-        eff = effect_for_infrastructure(name)
-        if eff and eff.kind == "social_bonus" and eff.target == "social":
+        elif eff.kind == "social_bonus" and eff.target == "social":
             try:
                 pts += int(eff.value)
             except Exception:
                 continue
-    return max(0, pts)
+    return EffectsSnapshot(
+        owned_names=names,
+        power_bonus_by_unit_type=MappingProxyType(power),
+        success_bonus_pct_by_category=MappingProxyType(success),
+        # Clamp to avoid runaway values
+        production_multiplier=max(0.1, min(10.0, float(mult))),
+        social_points=max(0, pts),
+        owned_ids=frozenset(owned_ids or ()),
+    )
+
+
+def _fetch_owned_single_query(sb: Client) -> tuple[set, set[str]]:
+    """(owned ids, owned names) via one embedded select (FK infrastructure_id)."""
+    try:
+        rows = (
+            sb.table("infrastructure_owned")
+            .select("infrastructure_id,owned,infrastructure(name)")
+            .eq("owned", True)
+            .execute()
+            .data
+            or []
+        )
+        return (
+            {r["infrastructure_id"] for r in rows},
+            {
+                (r.get("infrastructure") or {}).get("name")
+                for r in rows
+                if (r.get("infrastructure") or {}).get("name")
+            },
+        )
+    except Exception:
+        # No FK relationship exposed to PostgREST: fall back to two selects.
+        infra = sb.table("infrastructure").select("id,name").execute().data or []
+        owned = sb.table("infrastructure_owned").select("infrastructure_id,owned").execute().data or []
+        owned_ids = {r["infrastructure_id"] for r in owned if bool(r.get("owned"))}
+        return owned_ids, {r["name"] for r in infra if r["id"] in owned_ids}
+
+
+@st.cache_resource(show_spinner=False, ttl=300)
+def _load_effects_snapshot(_sb: Client) -> EffectsSnapshot:
+    owned_ids, owned_names = _fetch_owned_single_query(_sb)
+    return build_effects_snapshot(owned_names, owned_ids)
+
+
+def get_effects_snapshot(sb: Client) -> EffectsSnapshot:
+    """Cached snapshot of owned infrastructure effects."""
+    return _load_effects_snapshot(sb)
+
+
+def clear_effects_snapshot() -> None:
+    """Invalidate the snapshot (infrastructure purchase/undo, rollover, restore)."""
+    _load_effects_snapshot.clear()
+
+
+def power_bonus_for_unit_type(sb: Client, unit_type: str, snapshot: EffectsSnapshot | None = None) -> float:
+    """Total power bonus from owned infrastructure for a unit_type."""
+    return (snapshot or get_effects_snapshot(sb)).power_bonus(unit_type)
+
+
+def success_bonus_pct_for_category(sb: Client, category: str, snapshot: EffectsSnapshot | None = None) -> float:
+    """Total success bonus % from owned infrastructure (diplomacy/intelligence)."""
+    return (snapshot or get_effects_snapshot(sb)).success_bonus_pct(category)
+
+
+def production_multiplier_owned(sb: Client, snapshot: EffectsSnapshot | None = None) -> float:
+    """Product of all owned 'production' multipliers. Defaults to 1.0."""
+    return (snapshot or get_effects_snapshot(sb)).production_multiplier
+
+
+def social_points_owned(sb: Client, snapshot: EffectsSnapshot | None = None) -> int:
+    """Sum of social points from owned social infrastructure."""
+    return (snapshot or get_effects_snapshot(sb)).social_points
 
 
 def describe_infrastructure_effect(name: str) -> str:
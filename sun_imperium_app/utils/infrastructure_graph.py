@@ -0,0 +1,189 @@
+"""Infrastructure prerequisite graph + chain purchase planner.
+
+Prerequisites come from two places that don't always agree:
+- the shop's `infrastructure.prereq` column
+- the canon chains in `infrastructure_effects._PREREQS`
+
+Both are treated as requirements (an item needs every listed prereq; canon
+chains only count when the shop sells the prereq). The
+graph is built once per catalog (cached), with a topological order and the
+full ancestor set of every item, so the shop can check locks and plan
+"buy up to X" chains without per-row lookups.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+import streamlit as st
+
+from utils.infrastructure_effects import prereq_name_for_infrastructure
+from utils.ledger import add_ledger_entries
+from utils.undo import log_action
+
+
+@dataclass(frozen=True)
+class PrereqGraph:
+    items: Mapping[str, Dict[str, Any]]  # name -> catalog row
+    parents: Mapping[str, tuple[str, ...]]  # name -> direct prereqs
+    ancestors: Mapping[str, frozenset[str]]  # name -> every transitive prereq
+    order: tuple[str, ...]  # topological order (prereqs first)
+    blocked: frozenset[str]  # unresolvable prereq or cycle, never buyable
+
+    def prereqs_met(self, name: str, owned_names: Iterable[str]) -> bool:
+        name = (name or "").strip()
+        if name in self.blocked:
+            return False
+        owned = set(owned_names)
+        return all(p in owned for p in self.parents.get(name, ()))
+
+
+@dataclass(frozen=True)
+class PurchasePlan:
+    target: str
+    steps: tuple[Dict[str, Any], ...]  # catalog rows in purchase order
+    total_cost: float
+    blocked_reason: Optional[str] = None
+
+
+def build_prereq_graph(infra_rows: List[Dict[str, Any]]) -> PrereqGraph:
+    """Pure builder: catalog rows -> PrereqGraph (Kahn's algorithm)."""
+    items = {(r.get("name") or "").strip(): r for r in infra_rows or [] if (r.get("name") or "").strip()}
+
+    parents: Dict[str, tuple[str, ...]] = {}
+    blocked: set[str] = set()
+    for name, row in items.items():
+        ps = []
+        shop_prereq = (row.get("prereq") or "").strip()
+        if shop_prereq:
+            ps.append(shop_prereq)
+            # If the shop's prereq name doesn't resolve, fail closed so tier chains stay safe.
+            if shop_prereq not in items:
+                blocked.add(name)
+        canon = prereq_name_for_infrastructure(name)
+        # Canon chains only apply when the shop actually sells the prereq.
+        if canon and canon in items and canon not in ps:
+            ps.append(canon)
+        parents[name] = tuple(ps)
+
+    children: Dict[str, List[str]] = {n: [] for n in items}
+    indeg = {n: 0 for n in items}
+    for n, ps in parents.items():
+        for p in ps:
+            if p in items:
+                children[p].append(n)
+                indeg[n] += 1
+
+    ready = sorted(n for n, d in indeg.items() if d == 0)
+    order: List[str] = []
+    while ready:
+        n = ready.pop(0)
+        order.append(n)
+        for c in children[n]:
+            indeg[c] -= 1
+            if indeg[c] == 0:
+                ready.append(c)
+    # Anything left is on (or behind) a cycle.
+    blocked.update(n for n in items if n not in set(order))
+
+    ancestors: Dict[str, frozenset[str]] = {}
+    for n in order:
+        acc: set[str] = set()
+        for p in parents[n]:
+            acc.add(p)
+            acc.update(ancestors.get(p, ()))
+        ancestors[n] = frozenset(acc)
+    for n in items:
+        ancestors.setdefault(n, frozenset(parents[n]))
+    # Blocked-ness propagates to dependents.
+    for n in order:
+        if any(a in blocked for a in ancestors[n]):
+            blocked.add(n)
+
+    return PrereqGraph(
+        items=MappingProxyType(items),
+        parents=MappingProxyType(parents),
+        ancestors=MappingProxyType(ancestors),
+        order=tuple(order),
+        blocked=frozenset(blocked),
+    )
+
+
+@st.cache_resource(show_spinner=False, ttl=600)
+def _load_prereq_graph(_sb) -> PrereqGraph:
+    try:
+        rows = _sb.table("infrastructure").select("id,name,cost,prereq").execute().data or []
+    except Exception:
+        # Older schema may not have prereq
+        rows = _sb.table("infrastructure").select("id,name,cost").execute().data or []
+    return build_prereq_graph(rows)
+
+
+def get_prereq_graph(sb) -> PrereqGraph:
+    """Cached prerequisite graph for the infrastructure catalog."""
+    return _load_prereq_graph(sb)
+
+
+def clear_prereq_graph() -> None:
+    _load_prereq_graph.clear()
+
+
+def plan_chain(graph: PrereqGraph, target: str, owned_names: Iterable[str]) -> PurchasePlan:
+    """Everything still needed to own `target`, in purchase order, with total cost.
+
+    Every prereq is mandatory, so the unowned ancestors plus the target are
+    the cheapest chain that unlocks it.
+    """
+    target = (target or "").strip()
+    owned = set(owned_names)
+    if target not in graph.items:
+        return PurchasePlan(target=target, steps=(), total_cost=0.0, blocked_reason="Unknown infrastructure")
+    if target in graph.blocked:
+        return PurchasePlan(
+            target=target,
+            steps=(),
+            total_cost=0.0,
+            blocked_reason="Prerequisite chain can't be resolved in the shop catalog",
+        )
+    needed = (graph.ancestors[target] | {target}) - owned
+    steps = tuple(graph.items[n] for n in graph.order if n in needed)
+    total = sum(float(r.get("cost") or 0) for r in steps)
+    return PurchasePlan(target=target, steps=steps, total_cost=total)
+
+
+def apply_plan(sb, plan: PurchasePlan, *, week: int, undo_category: str) -> None:
+    """Buy every step of a plan: one ownership upsert, one ledger insert, one undo entry."""
+    if plan.blocked_reason or not plan.steps:
+        return
+    sb.table("infrastructure_owned").upsert(
+        [{"infrastructure_id": r["id"], "owned": True} for r in plan.steps]
+    ).execute()
+    add_ledger_entries(
+        sb,
+        [
+            {
+                "week": week,
+                "direction": "out",
+                "amount": float(r.get("cost") or 0),
+                "category": "infrastructure_purchase",
+                "note": f"Purchased {r['name']}",
+                "metadata": {"infrastructure_id": r["id"], "chain_target": plan.target},
+            }
+            for r in plan.steps
+        ],
+    )
+    log_action(
+        sb,
+        category=undo_category,
+        action="purchase_infrastructure_chain",
+        payload={
+            "name": f"{plan.target} (chain of {len(plan.steps)})",
+            "cost": plan.total_cost,
+            "items": [
+                {"infrastructure_id": r["id"], "cost": float(r.get("cost") or 0), "name": r["name"]}
+                for r in plan.steps
+            ],
+        },
+    )
@@ -1,8 +1,10 @@
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from supabase import Client
 
+from utils import schema, state
+
 
 @dataclass
 class Totals:
@@ -13,12 +15,13 @@ class Totals:
 
 
 def get_current_week(sb: Client) -> int:
-    row = sb.table("app_state").select("current_week").eq("id", 1).execute().data[0]
-    return int(row["current_week"])
+    """Current week (cached; see utils.state.get_current_week)."""
+    return state.get_current_week(sb)
 
 
 def set_current_week(sb: Client, week: int) -> None:
     sb.table("app_state").update({"current_week": week}).eq("id", 1).execute()
+    state.remember_current_week(week)
 
 
 def get_ledger_totals(sb: Client, week: Optional[int] = None) -> Totals:
@@ -53,52 +56,67 @@ def add_ledger_entry(
     category: str,
     note: str = "",
     metadata: Optional[Dict[str, Any]] = None,
+    idempotency_key: Optional[str] = None,
 ) -> None:
     """Insert a ledger entry in a schema-tolerant way.
 
     Some deployments have legacy column `meta` only, others have `metadata` only,
-    and some have both. We try the safest payload first, then fall back.
+    and some have both. The schema registry says which, so this is one insert.
+    With `idempotency_key` (and the column present) posting twice is a no-op.
     """
-    md: Dict[str, Any] = metadata or {}
-
-    payload_both = {
-        "week": week,
-        "direction": direction,
-        "amount": amount,
-        "category": category,
-        "note": note,
-        "metadata": md,
-        "meta": md,
-    }
-    try:
-        sb.table("ledger_entries").insert(payload_both).execute()
-        return
-    except Exception:
-        pass
-
-    payload_metadata = {
-        "week": week,
-        "direction": direction,
-        "amount": amount,
-        "category": category,
-        "note": note,
-        "metadata": md,
-    }
-    try:
-        sb.table("ledger_entries").insert(payload_metadata).execute()
+    add_ledger_entries(
+        sb,
+        [
+            {
+                "week": week,
+                "direction": direction,
+                "amount": amount,
+                "category": category,
+                "note": note,
+                "metadata": metadata,
+                "idempotency_key": idempotency_key,
+            }
+        ],
+    )
+
+
+def supports_idempotency_keys(sb: Client) -> bool:
+    return schema.get_schema(sb).has("ledger_entries", "idempotency_key")
+
+
+def add_ledger_entries(sb: Client, entries: List[Dict[str, Any]]) -> None:
+    """Insert many ledger entries in one request (same column handling as add_ledger_entry).
+
+    Each entry: {week, direction, amount, category, note?, metadata?, idempotency_key?}
+
+    Entries with an idempotency key are written with an upsert that ignores
+    keys already posted (unique index on ledger_entries.idempotency_key), so
+    a retried or concurrent caller can't post them twice.
+    """
+    if not entries:
         return
-    except Exception:
-        pass
-
-    payload_meta = {
-        "week": week,
-        "direction": direction,
-        "amount": amount,
-        "category": category,
-        "note": note,
-        "meta": md,
-    }
-    sb.table("ledger_entries").insert(payload_meta).execute()
+
+    reg = schema.get_schema(sb)
+    rows = [
+        reg.pick(
+            "ledger_entries",
+            {
+                "week": e["week"],
+                "direction": e["direction"],
+                "amount": e["amount"],
+                "category": e["category"],
+                "note": e.get("note") or "",
+                "metadata": e.get("metadata") or {},
+                "meta": e.get("metadata") or {},
+                "idempotency_key": e.get("idempotency_key"),
+            },
+        )
+        for e in entries
+    ]
+    if any(r.get("idempotency_key") for r in rows):
+        sb.table("ledger_entries").upsert(rows, on_conflict="idempotency_key", ignore_duplicates=True).execute()
+    else:
+        sb.table("ledger_entries").insert(rows).execute()
 
 
 # Backwards-friendly alias
@@ -0,0 +1,84 @@
+"""Run a page's independent queries concurrently.
+
+Pages declare what they need as named zero-argument callables and get every
+result back at once; latency is that of the slowest query instead of the sum.
+
+    data = load_parallel({
+        "units": lambda: sb.table("diplomacy_units").select("*").execute().data or [],
+        "roster": lambda: sb.table("diplomacy_roster").select("*").execute().data or [],
+    })
+
+Worker threads are attached to the current Streamlit script run, so
+`st.cache_data` helpers and the per-run read memo in `utils.query_cache`
+behave as they would on the main thread.
+"""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Mapping, Optional
+
+MAX_WORKERS = 8
+
+_MISSING = object()
+
+
+def _current_ctx() -> Any:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        return get_script_run_ctx()
+    except Exception:
+        return None
+
+
+def _attach_ctx(ctx: Any) -> None:
+    if ctx is None:
+        return
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx
+
+        add_script_run_ctx(threading.current_thread(), ctx)
+    except Exception:
+        pass
+
+
+def load_parallel(
+    queries: Mapping[str, Callable[[], Any]],
+    *,
+    defaults: Optional[Mapping[str, Any]] = None,
+    max_workers: int = MAX_WORKERS,
+) -> Dict[str, Any]:
+    """Run every callable at once; return {name: result}.
+
+    A query that raises gets its value from `defaults` when one is given
+    (the page's old try/except fallback); otherwise the first such error is
+    re-raised after all queries have finished.
+    """
+    if not queries:
+        return {}
+    defaults = defaults or {}
+    ctx = _current_ctx()
+
+    def run(fn: Callable[[], Any]) -> Any:
+        _attach_ctx(ctx)
+        return fn()
+
+    results: Dict[str, Any] = {}
+    first_error: Optional[BaseException] = None
+    workers = max(1, min(int(max_workers), len(queries)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="page-load") as pool:
+        futures = {name: pool.submit(run, fn) for name, fn in queries.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                fallback = defaults.get(name, _MISSING)
+                if fallback is _MISSING:
+                    first_error = first_error or e
+                else:
+                    results[name] = fallback
+    if first_error is not None:
+        raise first_error
+    return results
@@ -0,0 +1,1075 @@
+"""In-memory stand-in for the Supabase client.
+
+`MemoryClient` implements the part of the supabase-py / postgrest-py builder
+API this app uses, against Python dicts, so every util and page can run (and
+be benchmarked) without a network:
+
+    sb.table("squads").select("id,name").eq("is_enemy", False).order("name").execute().data
+
+- Tables, column types, defaults, primary keys, unique constraints and
+  foreign keys come from `sql/schema_v1.sql`. Declared tables are strict like
+  PostgREST (unknown columns, duplicate keys and ON CONFLICT targets without
+  a unique constraint raise `APIError`), so the app's schema-tolerant
+  fallbacks take the same paths they would against a database that only ran
+  schema_v1. Tables the schema doesn't declare are created on first use and
+  accept any column (`id` and `created_at` are filled in like Supabase's
+  default table template).
+- Builders: select (with `*`, aliases, embedded `rel(cols)` and
+  `count="exact"`), insert, update, upsert(on_conflict, ignore_duplicates),
+  delete; filters eq/neq/gt/gte/lt/lte/like/ilike/is_/in_/match/filter,
+  `not_`, `or_` (PostgREST logic-tree syntax); order, limit, offset, range,
+  single.
+- UPDATE/DELETE without a filter are rejected, as Supabase's pg_safeupdate does.
+- The SQL functions in schema_v1 (`apply_war_result`,
+  `mission_success_rates`, `carry_forward_reputation`) are available via
+  `rpc`; other functions raise, so callers use their fallbacks.
+- `latency_ms` adds a fixed delay per request to model the network round
+  trip when benchmarking coalescing / concurrency.
+
+Use `create_memory_client()` (seeded from `utils.fixtures`); `get_supabase()`
+returns one when `SUPABASE_BACKEND = "memory"`.
+"""
+
+from __future__ import annotations
+
+import copy
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+SCHEMA_PATH = Path(__file__).resolve().parent.parent / "sql" / "schema_v1.sql"
+
+# Columns Supabase's default table template adds (undeclared tables only).
+_UNDECLARED_DEFAULTS = {"id": "gen_random_uuid()", "created_at": "now()"}
+
+
+class APIError(Exception):
+    """Error shaped like postgrest's APIError (code / message / details / hint)."""
+
+    def __init__(self, code: str, message: str, details: Optional[str] = None, hint: Optional[str] = None):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+        self.details = details
+        self.hint = hint
+
+
+@dataclass
+class APIResponse:
+    data: Any
+    count: Optional[int] = None
+
+
+# ---------------------------------------------------------------------------
+# Schema
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    type: str  # int | numeric | bool | text | uuid | timestamptz | jsonb
+    default: Optional[str] = None
+    references: Optional[Tuple[str, str]] = None
+    on_delete: Optional[str] = None  # cascade | set null
+
+
+@dataclass
+class TableDef:
+    name: str
+    columns: Dict[str, Column] = field(default_factory=dict)
+    primary_key: Tuple[str, ...] = ()
+    uniques: List[Tuple[str, ...]] = field(default_factory=list)
+    # Unique keys declared NULLS NOT DISTINCT (NULL matches NULL).
+    nulls_not_distinct: List[Tuple[str, ...]] = field(default_factory=list)
+    declared: bool = True
+
+
+_TYPE_PREFIXES = (
+    ("timestamp", "timestamptz"),
+    ("date", "timestamptz"),
+    ("jsonb", "jsonb"),
+    ("json", "jsonb"),
+    ("uuid", "uuid"),
+    ("bool", "bool"),
+    ("numeric", "numeric"),
+    ("decimal", "numeric"),
+    ("real", "numeric"),
+    ("double", "numeric"),
+    ("float", "numeric"),
+    ("bigint", "int"),
+    ("smallint", "int"),
+    ("int", "int"),
+    ("serial", "int"),
+)
+
+_CREATE_TABLE_RE = re.compile(r"create\s+table\s+(?:if\s+not\s+exists\s+)?(\w+)\s*\(", re.I)
+_UNIQUE_INDEX_RE = re.compile(
+    r"create\s+unique\s+index\s+(?:if\s+not\s+exists\s+)?\w+\s+on\s+(\w+)\s*\(([^)]*)\)(\s+nulls\s+not\s+distinct)?",
+    re.I,
+)
+_ADD_COLUMN_RE = re.compile(
+    r"alter\s+table\s+(?:if\s+exists\s+)?(\w+)\s+add\s+column\s+(?:if\s+not\s+exists\s+)?(.+?);", re.I | re.S
+)
+_DEFAULT_RE = re.compile(
+    r"\bdefault\s+(.+?)(?=\s+(?:not\s+null|null|primary\s+key|unique|references|check|constraint)\b|$)", re.I | re.S
+)
+_REFERENCES_RE = re.compile(r"\breferences\s+(\w+)\s*\((\w+)\)(?:\s+on\s+delete\s+(cascade|set\s+null))?", re.I)
+
+
+def _split_top(text: str, sep: str = ",") -> List[str]:
+    """Split on `sep` outside parentheses and quotes."""
+    parts: List[str] = []
+    depth = 0
+    quote: Optional[str] = None
+    buf: List[str] = []
+    for ch in text:
+        if quote:
+            buf.append(ch)
+            if ch == quote:
+                quote = None
+            continue
+        if ch in ("'", '"'):
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append("".join(buf).strip())
+            buf = []
+            continue
+        buf.append(ch)
+    if "".join(buf).strip():
+        parts.append("".join(buf).strip())
+    return parts
+
+
+def _column_type(sql_type: str) -> str:
+    t = sql_type.lower()
+    for prefix, name in _TYPE_PREFIXES:
+        if t.startswith(prefix):
+            return name
+    return "text"
+
+
+def _parse_column(spec: str) -> Tuple[Column, bool, bool]:
+    """(column, is_primary_key, is_unique) from `name type [constraints]`."""
+    name, rest = spec.split(None, 1)
+    low = rest.lower()
+    default = _DEFAULT_RE.search(rest)
+    ref = _REFERENCES_RE.search(rest)
+    column = Column(
+        name=name,
+        type=_column_type(rest.split()[0]),
+        default=default.group(1).strip() if default else None,
+        references=(ref.group(1), ref.group(2)) if ref else None,
+        on_delete=" ".join(ref.group(3).lower().split()) if ref and ref.group(3) else None,
+    )
+    return column, "primary key" in low, bool(re.search(r"\bunique\b", low))
+
+
+def _strip_sql(sql: str) -> str:
+    sql = re.sub(r"\$\$.*?\$\$", "", sql, flags=re.S)  # function bodies
+    return re.sub(r"--[^\n]*", "", sql)
+
+
+def parse_schema(sql: str) -> Dict[str, TableDef]:
+    """Tables declared by `create table` / `create unique index` / `alter table add column`."""
+    sql = _strip_sql(sql)
+    tables: Dict[str, TableDef] = {}
+
+    for m in _CREATE_TABLE_RE.finditer(sql):
+        start = m.end()
+        depth = 1
+        i = start
+        while depth and i < len(sql):
+            depth += {"(": 1, ")": -1}.get(sql[i], 0)
+            i += 1
+        table = TableDef(name=m.group(1))
+        for item in _split_top(sql[start : i - 1]):
+            low = item.lower()
+            if low.startswith(("unique", "primary key")):
+                cols = tuple(c.strip() for c in item[item.index("(") + 1 : item.rindex(")")].split(","))
+                if low.startswith("unique"):
+                    table.uniques.append(cols)
+                else:
+                    table.primary_key = cols
+                continue
+            if low.startswith(("constraint", "check", "foreign key", "exclude")):
+                continue
+            column, pk, unique = _parse_column(item)
+            table.columns[column.name] = column
+            if pk:
+                table.primary_key = (column.name,)
+            elif unique:
+                table.uniques.append((column.name,))
+        tables[table.name] = table
+
+    for m in _UNIQUE_INDEX_RE.finditer(sql):
+        table = tables.get(m.group(1))
+        if table is not None:
+            cols = tuple(c.strip().split()[0] for c in m.group(2).split(","))
+            if cols not in table.uniques:
+                table.uniques.append(cols)
+            if m.group(3) and cols not in table.nulls_not_distinct:
+                table.nulls_not_distinct.append(cols)
+
+    for m in _ADD_COLUMN_RE.finditer(sql):
+        table = tables.get(m.group(1))
+        if table is not None:
+            column, _, unique = _parse_column(m.group(2).strip())
+            table.columns[column.name] = column
+            if unique:
+                table.uniques.append((column.name,))
+    return tables
+
+
+def load_schema(path: Optional[Path] = None) -> Dict[str, TableDef]:
+    return parse_schema(Path(path or SCHEMA_PATH).read_text(encoding="utf-8"))
+
+
+# ---------------------------------------------------------------------------
+# Values
+# ---------------------------------------------------------------------------
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _eval_default(expr: str) -> Any:
+    e = expr.strip()
+    low = e.lower()
+    if low.startswith("gen_random_uuid") or low.startswith("uuid_generate"):
+        return str(uuid.uuid4())
+    if low in ("now()", "current_timestamp") or low.startswith("timezone("):
+        return _now_iso()
+    if low == "null":
+        return None
+    if low in ("true", "false"):
+        return low == "true"
+    m = re.match(r"^'(.*)'(?:::(\w+))?$", e, re.S)
+    if m:
+        text = m.group(1).replace("''", "'")
+        if (m.group(2) or "").lower() in ("jsonb", "json"):
+            import json
+
+            return json.loads(text)
+        return text
+    try:
+        return int(e)
+    except ValueError:
+        pass
+    try:
+        return float(e)
+    except ValueError:
+        return e
+
+
+def _to_number(value: Any) -> Any:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value
+    text = str(value).strip()
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _coerce(column: Optional[Column], value: Any) -> Any:
+    """Value as PostgREST would return it for this column."""
+    if value is None or column is None:
+        return copy.deepcopy(value)
+    try:
+        if column.type == "int":
+            return int(_to_number(value))
+        if column.type == "numeric":
+            return _to_number(value)
+        if column.type == "bool":
+            if isinstance(value, str):
+                return value.strip().lower() in ("true", "t", "1", "yes")
+            return bool(value)
+        if column.type == "jsonb":
+            return copy.deepcopy(value)
+        if column.type == "timestamptz" and isinstance(value, datetime):
+            return value.isoformat(timespec="microseconds")
+    except (TypeError, ValueError):
+        raise APIError("22P02", f'invalid input syntax for type {column.type} (column "{column.name}"): "{value}"')
+    if column.type in ("text", "uuid", "timestamptz") and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def _operand(sample: Any, value: Any) -> Any:
+    """Coerce a filter operand (often a string from a URL-style filter) to the row value's type."""
+    if value is None or sample is None or isinstance(value, type(sample)):
+        return value
+    try:
+        if isinstance(sample, bool):
+            return str(value).strip().lower() in ("true", "t", "1") if isinstance(value, str) else bool(value)
+        if isinstance(sample, (int, float)):
+            return _to_number(value)
+    except (TypeError, ValueError):
+        return value
+    if isinstance(sample, str):
+        return str(value).lower() if isinstance(value, bool) else str(value)
+    return value
+
+
+def _like_regex(pattern: str, case_insensitive: bool) -> "re.Pattern[str]":
+    out = []
+    for ch in pattern:
+        if ch in ("%", "*"):
+            out.append(".*")
+        elif ch == "_":
+            out.append(".")
+        else:
+            out.append(re.escape(ch))
+    return re.compile("^" + "".join(out) + "$", re.S | (re.I if case_insensitive else 0))
+
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+
+def _compare(op: str, column: str, value: Any) -> Predicate:
+    if op in ("like", "ilike"):
+        rx = _like_regex(str(value), op == "ilike")
+        return lambda r: r.get(column) is not None and bool(rx.match(str(r.get(column))))
+    if op == "is":
+        target = value
+        if isinstance(value, str):
+            target = {"null": None, "true": True, "false": False}.get(value.lower(), value)
+        return lambda r: r.get(column) is target if target is None else r.get(column) == target
+    if op == "in":
+        values = list(value)
+
+        def _in(r: Dict[str, Any]) -> bool:
+            v = r.get(column)
+            return v is not None and any(v == _operand(v, x) for x in values)
+
+        return _in
+    if op == "cs":
+        return lambda r: isinstance(r.get(column), (dict, list)) and _contains(r.get(column), value)
+
+    def _cmp(r: Dict[str, Any]) -> bool:
+        v = r.get(column)
+        if v is None:
+            return False
+        x = _operand(v, value)
+        try:
+            if op == "eq":
+                return v == x
+            if op == "neq":
+                return v != x
+            if op == "gt":
+                return v > x
+            if op == "gte":
+                return v >= x
+            if op == "lt":
+                return v < x
+            if op == "lte":
+                return v <= x
+        except TypeError:
+            return False
+        raise APIError("PGRST100", f'unknown operator "{op}"')
+
+    return _cmp
+
+
+def _contains(container: Any, value: Any) -> bool:
+    if isinstance(container, dict) and isinstance(value, dict):
+        return all(k in container and _contains(container[k], v) for k, v in value.items())
+    if isinstance(container, list):
+        items = value if isinstance(value, list) else [value]
+        return all(any(_contains(c, v) for c in container) for v in items)
+    return container == value
+
+
+def _unquote(text: str) -> str:
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        return text[1:-1].replace('\\"', '"')
+    return text
+
+
+def _parse_condition(text: str, columns: List[str]) -> Predicate:
+    """One PostgREST filter (`col.op.value`, `not.and(...)`, `or(...)`) to a predicate."""
+    text = text.strip()
+    if text.startswith("not."):
+        inner = _parse_condition(text[4:], columns)
+        return lambda r: not inner(r)
+    m = re.match(r"^(and|or)\((.*)\)$", text, re.S)
+    if m:
+        parts = [_parse_condition(p, columns) for p in _split_top(m.group(2))]
+        if m.group(1) == "and":
+            return lambda r: all(p(r) for p in parts)
+        return lambda r: any(p(r) for p in parts)
+    try:
+        column, op, raw = text.split(".", 2)
+    except ValueError:
+        raise APIError("PGRST100", f'failed to parse filter "{text}"')
+    negate = False
+    if op == "not":
+        negate = True
+        op, raw = raw.split(".", 1)
+    columns.append(column)
+    if op == "in":
+        value: Any = [_unquote(v) for v in _split_top(raw.strip()[1:-1])]
+    else:
+        value = _unquote(raw)
+    pred = _compare(op, column, value)
+    return (lambda r: not pred(r)) if negate else pred
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+
+class MemoryStore:
+    """Tables of row dicts, guarded by one lock (requests are atomic)."""
+
+    def __init__(self, tables: Optional[Mapping[str, TableDef]] = None):
+        self.lock = threading.RLock()
+        self.defs: Dict[str, TableDef] = dict(tables or {})
+        self.rows: Dict[str, List[Dict[str, Any]]] = {name: [] for name in self.defs}
+
+    # -- tables -------------------------------------------------------------
+
+    def table_def(self, name: str) -> TableDef:
+        table = self.defs.get(name)
+        if table is None:
+            table = self.defs[name] = TableDef(name=name, declared=False)
+            self.rows[name] = []
+        return table
+
+    def check_columns(self, table: TableDef, columns: Iterable[str]) -> None:
+        if not table.declared:
+            return
+        for c in columns:
+            if c not in table.columns:
+                raise APIError("42703", f"column {table.name}.{c} does not exist")
+
+    def column(self, table: TableDef, name: str) -> Optional[Column]:
+        return table.columns.get(name)
+
+    def unique_keys(self, table: TableDef) -> List[Tuple[str, ...]]:
+        keys = [table.primary_key] if table.primary_key else []
+        if not table.declared and not keys:
+            keys = [("id",)]
+        return keys + [u for u in table.uniques if u not in keys]
+
+    # -- rows ---------------------------------------------------------------
+
+    def new_row(self, table: TableDef, payload: Mapping[str, Any]) -> Dict[str, Any]:
+        if table.declared:
+            unknown = [k for k in payload if k not in table.columns]
+            if unknown:
+                raise APIError("PGRST204", f"Could not find the '{unknown[0]}' column of '{table.name}' in the schema cache")
+            row = {}
+            for name, col in table.columns.items():
+                if name in payload:
+                    row[name] = _coerce(col, payload[name])
+                else:
+                    row[name] = _eval_default(col.default) if col.default is not None else None
+            return row
+        row = {k: copy.deepcopy(v) for k, v in payload.items()}
+        for name, expr in _UNDECLARED_DEFAULTS.items():
+            if name not in row:
+                row[name] = _eval_default(expr)
+        return row
+
+    def patch(self, table: TableDef, row: Dict[str, Any], payload: Mapping[str, Any]) -> Dict[str, Any]:
+        if table.declared:
+            unknown = [k for k in payload if k not in table.columns]
+            if unknown:
+                raise APIError("PGRST204", f"Could not find the '{unknown[0]}' column of '{table.name}' in the schema cache")
+        out = dict(row)
+        for k, v in payload.items():
+            out[k] = _coerce(table.columns.get(k), v)
+        return out
+
+    def nulls_not_distinct(self, table: TableDef, key: Sequence[str]) -> bool:
+        return any(set(key) == set(u) for u in table.nulls_not_distinct)
+
+    def check_unique(self, table: TableDef, rows: Sequence[Dict[str, Any]], *, replacing: Sequence[int] = ()) -> None:
+        """Raise 23505 if `rows` collide with each other or with stored rows (ignoring ids in `replacing`)."""
+        skip = set(replacing)
+        for key in self.unique_keys(table):
+            nulls_match = self.nulls_not_distinct(table, key)
+            seen = {}
+            for i, r in enumerate(self.rows[table.name]):
+                if id(r) in skip:
+                    continue
+                k = tuple(r.get(c) for c in key)
+                if nulls_match or None not in k:
+                    seen[k] = i
+            for r in rows:
+                k = tuple(r.get(c) for c in key)
+                if None in k and not nulls_match:
+                    continue
+                if k in seen:
+                    raise APIError(
+                        "23505",
+                        f'duplicate key value violates unique constraint "{table.name}_{"_".join(key)}_key"',
+                        details=f"Key ({', '.join(key)})=({', '.join(map(str, k))}) already exists.",
+                    )
+                seen[k] = -1
+
+    def delete_rows(self, table: TableDef, doomed: List[Dict[str, Any]]) -> None:
+        ids = {id(r) for r in doomed}
+        self.rows[table.name] = [r for r in self.rows[table.name] if id(r) not in ids]
+        # Foreign keys declared in the schema: cascade / set null.
+        for child in self.defs.values():
+            for col in child.columns.values():
+                if not col.references or col.references[0] != table.name or not col.on_delete:
+                    continue
+                parent_keys = {r.get(col.references[1]) for r in doomed}
+                hits = [r for r in self.rows[child.name] if r.get(col.name) in parent_keys]
+                if not hits:
+                    continue
+                if col.on_delete == "cascade":
+                    self.delete_rows(child, hits)
+                else:
+                    for r in hits:
+                        r[col.name] = None
+
+
+# ---------------------------------------------------------------------------
+# Query builder
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class _Field:
+    name: str
+    alias: str
+    embed: Optional[str] = None  # inner select for embedded resources
+    hint: Optional[str] = None
+
+
+def _parse_select(text: str) -> List[_Field]:
+    fields: List[_Field] = []
+    for item in _split_top(re.sub(r"\s+", "", text or "*")):
+        alias = None
+        if ":" in item.split("(", 1)[0]:
+            alias, item = item.split(":", 1)
+        if "(" in item:
+            head, inner = item.split("(", 1)
+            name, _, hint = head.partition("!")
+            fields.append(_Field(name=name, alias=alias or name, embed=inner[:-1] or "*", hint=hint or None))
+        else:
+            name = item.split("::", 1)[0]
+            fields.append(_Field(name=name, alias=alias or name))
+    return fields
+
+
+def _singular(name: str) -> str:
+    return name[:-1] if name.endswith("s") else name
+
+
+class MemoryQuery:
+    """One request; filter / modifier methods mutate and return self, as in postgrest-py."""
+
+    def __init__(self, client: "MemoryClient", table: str, method: str, **options: Any):
+        self._client = client
+        self._store = client.store
+        self._table = table
+        self._method = method
+        self._options = options
+        self._filters: List[Predicate] = []
+        self._filter_columns: List[str] = []
+        self._order: List[Tuple[str, bool, Optional[bool]]] = []
+        self._offset = 0
+        self._limit: Optional[int] = None
+        self._single = False
+        self._negate_next = False
+
+    # -- filters ------------------------------------------------------------
+
+    def _add(self, column: str, op: str, value: Any) -> "MemoryQuery":
+        pred = _compare(op, column, value)
+        if self._negate_next:
+            self._negate_next = False
+            inner = pred
+            pred = lambda r: not inner(r)  # noqa: E731
+        self._filter_columns.append(column)
+        self._filters.append(pred)
+        return self
+
+    @property
+    def not_(self) -> "MemoryQuery":
+        self._negate_next = True
+        return self
+
+    def eq(self, column: str, value: Any) -> "MemoryQuery":
+        return self._add(column, "eq", value)
+
+    def neq(self, column: str, value: Any) -> "MemoryQuery":
+        return self._add(column, "neq", value)
+
+    def gt(self, column: str, value: Any) -> "MemoryQuery":
+        return self._add(column, "gt", value)
+
+    def gte(self, column: str, value: Any) -> "MemoryQuery":
+        return self._add(column, "gte", value)
+
+    def lt(self, column: str, value: Any) -> "MemoryQuery":
+        return self._add(column, "lt", value)
+
+    def lte(self, column: str, value: Any) -> "MemoryQuery":
+        return self._add(column, "lte", value)
+
+    def like(self, column: str, pattern: str) -> "MemoryQuery":
+        return self._add(column, "like", pattern)
+
+    def ilike(self, column: str, pattern: str) -> "MemoryQuery":
+        return self._add(column, "ilike", pattern)
+
+    def is_(self, column: str, value: Any) -> "MemoryQuery":
+        return self._add(column, "is", value)
+
+    def in_(self, column: str, values: Iterable[Any]) -> "MemoryQuery":
+        return self._add(column, "in", list(values))
+
+    def contains(self, column: str, value: Any) -> "MemoryQuery":
+        return self._add(column, "cs", value)
+
+    def match(self, query: Mapping[str, Any]) -> "MemoryQuery":
+        for column, value in query.items():
+            self.eq(column, value)
+        return self
+
+    def filter(self, column: str, operator: str, criteria: str) -> "MemoryQuery":
+        pred = _parse_condition(f"{column}.{operator}.{criteria}", self._filter_columns)
+        self._filters.append(pred)
+        return self
+
+    def or_(self, filters: str, reference_table: Optional[str] = None) -> "MemoryQuery":
+        pred = _parse_condition(f"or({filters})", self._filter_columns)
+        self._filters.append(pred)
+        return self
+
+    # -- modifiers ----------------------------------------------------------
+
+    def order(
+        self,
+        column: str,
+        *,
+        desc: bool = False,
+        nullsfirst: Optional[bool] = None,
+        foreign_table: Optional[str] = None,
+        reference_table: Optional[str] = None,
+    ) -> "MemoryQuery":
+        self._order.append((column, desc, nullsfirst))
+        return self
+
+    def limit(self, size: int, *, foreign_table: Optional[str] = None, reference_table: Optional[str] = None) -> "MemoryQuery":
+        self._limit = int(size)
+        return self
+
+    def offset(self, size: int) -> "MemoryQuery":
+        self._offset = int(size)
+        return self
+
+    def range(self, start: int, end: int, foreign_table: Optional[str] = None) -> "MemoryQuery":
+        self._offset = int(start)
+        self._limit = max(0, int(end) - int(start) + 1)
+        return self
+
+    def single(self) -> "MemoryQuery":
+        self._single = True
+        return self
+
+    # -- execution ----------------------------------------------------------
+
+    def execute(self) -> APIResponse:
+        self._client.delay()
+        with self._store.lock:
+            table = self._store.table_def(self._table)
+            self._store.check_columns(table, self._filter_columns)
+            response = getattr(self, f"_exec_{self._method}")(table)
+        if self._single:
+            data = response.data or []
+            if len(data) != 1:
+                raise APIError(
+                    "PGRST116",
+                    "JSON object requested, multiple (or no) rows returned",
+                    details=f"The result contains {len(data)} rows",
+                )
+            response.data = data[0]
+        return response
+
+    def _matching(self, table: TableDef) -> List[Dict[str, Any]]:
+        return [r for r in self._store.rows[table.name] if all(f(r) for f in self._filters)]
+
+    def _sorted(self, table: TableDef, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        self._store.check_columns(table, [c for c, _, _ in self._order])
+        out = list(rows)
+        for column, desc, nullsfirst in reversed(self._order):
+            nulls_first = desc if nullsfirst is None else nullsfirst
+            present = [r for r in out if r.get(column) is not None]
+            missing = [r for r in out if r.get(column) is None]
+            try:
+                present.sort(key=lambda r: r.get(column), reverse=desc)
+            except TypeError:
+                present.sort(key=lambda r: str(r.get(column)), reverse=desc)
+            out = missing + present if nulls_first else present + missing
+        return out
+
+    def _project(self, table: TableDef, row: Dict[str, Any], fields: List[_Field]) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for f in fields:
+            if f.embed is not None:
+                out[f.alias] = self._embed(table, row, f)
+            elif f.name == "*":
+                names = list(table.columns) if table.declared else list(row)
+                for name in names:
+                    out[name] = copy.deepcopy(row.get(name))
+            else:
+                out[f.alias] = copy.deepcopy(row.get(f.name))
+        return out
+
+    def _check_fields(self, table: TableDef, fields: List[_Field]) -> None:
+        self._store.check_columns(table, [f.name for f in fields if f.embed is None and f.name != "*"])
+
+    def _embed(self, table: TableDef, row: Dict[str, Any], f: _Field) -> Any:
+        target = self._store.table_def(f.name)
+        inner = _parse_select(f.embed or "*")
+        self._check_fields(target, inner)
+        rows = self._store.rows[target.name]
+
+        # Many-to-one: a column here references the target.
+        for col in table.columns.values():
+            if col.references and col.references[0] == target.name and (f.hint in (None, col.name)):
+                match = next((r for r in rows if r.get(col.references[1]) == row.get(col.name)), None)
+                return self._project(target, match, inner) if match is not None else None
+        # One-to-many: a target column references this table.
+        for col in target.columns.values():
+            if col.references and col.references[0] == table.name and (f.hint in (None, col.name)):
+                key = row.get(col.references[1])
+                return [self._project(target, r, inner) for r in rows if r.get(col.name) == key]
+        # Undeclared tables: conventional `<target>_id` / `<table>_id` columns.
+        for fk in (f"{_singular(target.name)}_id", f"{target.name}_id"):
+            if fk in row:
+                match = next((r for r in rows if r.get("id") == row.get(fk)), None)
+                return self._project(target, match, inner) if match is not None else None
+        back = f"{_singular(table.name)}_id"
+        if any(back in r for r in rows):
+            return [self._project(target, r, inner) for r in rows if r.get(back) == row.get("id")]
+        raise APIError(
+            "PGRST200",
+            f"Could not find a relationship between '{table.name}' and '{target.name}' in the schema cache",
+        )
+
+    def _exec_select(self, table: TableDef) -> APIResponse:
+        fields = _parse_select(self._options.get("columns") or "*")
+        self._check_fields(table, fields)
+        rows = self._sorted(table, self._matching(table))
+        count = len(rows) if self._options.get("count") else None
+        end = None if self._limit is None else self._offset + self._limit
+        rows = rows[self._offset : end]
+        if self._options.get("head"):
+            return APIResponse(data=[], count=count)
+        return APIResponse(data=[self._project(table, r, fields) for r in rows], count=count)
+
+    def _returning(self, rows: List[Dict[str, Any]]) -> APIResponse:
+        count = len(rows) if self._options.get("count") else None
+        if self._options.get("returning") == "minimal":
+            return APIResponse(data=[], count=count)
+        data = [copy.deepcopy(r) for r in self._sorted(self._store.table_def(self._table), rows)]
+        if self._limit is not None:
+            data = data[self._offset : self._offset + self._limit]
+        return APIResponse(data=data, count=count)
+
+    def _payload_rows(self) -> List[Mapping[str, Any]]:
+        payload = self._options.get("json")
+        return list(payload) if isinstance(payload, (list, tuple)) else [payload or {}]
+
+    def _exec_insert(self, table: TableDef) -> APIResponse:
+        rows = [self._store.new_row(table, p) for p in self._payload_rows()]
+        self._store.check_unique(table, rows)
+        self._store.rows[table.name].extend(rows)
+        return self._returning(rows)
+
+    def _conflict_key(self, table: TableDef, sample: Mapping[str, Any]) -> Tuple[str, ...]:
+        spec = self._options.get("on_conflict") or ""
+        if spec:
+            key = tuple(c.strip() for c in spec.split(",") if c.strip())
+        elif table.primary_key:
+            key = table.primary_key
+        else:
+            key = ("id",)
+        if table.declared:
+            self._store.check_columns(table, key)
+            if not any(set(key) == set(u) for u in self._store.unique_keys(table)):
+                raise APIError("42P10", "there is no unique or exclusion constraint matching the ON CONFLICT specification")
+        elif key not in table.uniques and key != ("id",):
+            # First upsert on an undeclared table defines its unique key.
+            table.uniques.append(key)
+        return key
+
+    def _exec_upsert(self, table: TableDef) -> APIResponse:
+        payloads = self._payload_rows()
+        key = self._conflict_key(table, payloads[0] if payloads else {})
+        stored = self._store.rows[table.name]
+        index = {tuple(r.get(c) for c in key): r for r in stored}
+        nulls_match = self._store.nulls_not_distinct(table, key)
+
+        inserted: List[Dict[str, Any]] = []
+        updated: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        for p in payloads:
+            probe = self._store.new_row(table, p) if table.declared else p
+            k = tuple(probe.get(c) for c in key)
+            existing = index.get(k) if nulls_match or None not in k else None
+            if existing is None:
+                row = probe if table.declared else self._store.new_row(table, p)
+                inserted.append(row)
+                index[k] = row
+            elif not self._options.get("ignore_duplicates"):
+                updated.append((existing, self._store.patch(table, existing, p)))
+
+        new_rows = [new for _, new in updated] + inserted
+        self._store.check_unique(table, new_rows, replacing=[id(old) for old, _ in updated])
+        for old, new in updated:
+            old.clear()
+            old.update(new)
+        stored.extend(inserted)
+        return self._returning([old for old, _ in updated] + inserted)
+
+    def _require_filter(self, verb: str) -> None:
+        if not self._filters:
+            raise APIError("21000", f"{verb} requires a WHERE clause")
+
+    def _exec_update(self, table: TableDef) -> APIResponse:
+        self._require_filter("UPDATE")
+        payload = self._options.get("json") or {}
+        targets = self._matching(table)
+        patched = [self._store.patch(table, r, payload) for r in targets]
+        self._store.check_unique(table, patched, replacing=[id(r) for r in targets])
+        for old, new in zip(targets, patched):
+            old.clear()
+            old.update(new)
+        return self._returning(targets)
+
+    def _exec_delete(self, table: TableDef) -> APIResponse:
+        self._require_filter("DELETE")
+        doomed = self._matching(table)
+        response = self._returning(doomed)
+        self._store.delete_rows(table, doomed)
+        return response
+
+
+class MemoryTable:
+    """`sb.table(name)`: pick the request method."""
+
+    def __init__(self, client: "MemoryClient", name: str):
+        self._client = client
+        self._name = name
+
+    def select(self, *columns: str, count: Optional[str] = None, head: Optional[bool] = None) -> MemoryQuery:
+        return MemoryQuery(self._client, self._name, "select", columns=",".join(columns) or "*", count=count, head=head)
+
+    def insert(self, json: Any, *, count: Optional[str] = None, returning: str = "representation", upsert: bool = False, **_: Any) -> MemoryQuery:
+        method = "upsert" if upsert else "insert"
+        return MemoryQuery(self._client, self._name, method, json=json, count=count, returning=returning)
+
+    def upsert(
+        self,
+        json: Any,
+        *,
+        count: Optional[str] = None,
+        returning: str = "representation",
+        ignore_duplicates: bool = False,
+        on_conflict: str = "",
+        **_: Any,
+    ) -> MemoryQuery:
+        return MemoryQuery(
+            self._client,
+            self._name,
+            "upsert",
+            json=json,
+            count=count,
+            returning=returning,
+            ignore_duplicates=ignore_duplicates,
+            on_conflict=on_conflict,
+        )
+
+    def update(self, json: Mapping[str, Any], *, count: Optional[str] = None, returning: str = "representation") -> MemoryQuery:
+        return MemoryQuery(self._client, self._name, "update", json=json, count=count, returning=returning)
+
+    def delete(self, *, count: Optional[str] = None, returning: str = "representation") -> MemoryQuery:
+        return MemoryQuery(self._client, self._name, "delete", count=count, returning=returning)
+
+
+# ---------------------------------------------------------------------------
+# RPC (Python versions of the SQL functions in schema_v1)
+# ---------------------------------------------------------------------------
+
+def _rpc_apply_war_result(client: "MemoryClient", params: Mapping[str, Any]) -> Any:
+    store = client.store
+    members = store.table_def("squad_members")
+    for x in params.get("p_members") or []:
+        for r in store.rows[members.name]:
+            if r.get("squad_id") != x.get("squad_id"):
+                continue
+            if x.get("unit_id") is not None and r.get("unit_id") != x.get("unit_id"):
+                continue
+            if x.get("unit_id") is None and r.get("unit_type") != x.get("unit_type"):
+                continue
+            r["quantity"] = max(0, int(x.get("quantity") or 0))
+
+    war_id = None
+    war = params.get("p_war")
+    if war is not None:
+        wars = store.table_def("wars")
+        row = store.new_row(
+            wars,
+            {
+                "week": war.get("week"),
+                "squad_id": war.get("squad_id"),
+                "enemy": war.get("enemy") or {},
+                "result": war.get("result") or {},
+            },
+        )
+        store.rows[wars.name].append(row)
+        war_id = row["id"]
+
+    undo = params.get("p_undo")
+    if undo is not None:
+        logs = store.table_def("action_logs")
+        store.rows[logs.name].append(
+            store.new_row(
+                logs,
+                {"category": undo.get("category"), "action": undo.get("action"), "payload": undo.get("payload") or {}},
+            )
+        )
+    return war_id
+
+
+def _rpc_mission_success_rates(client: "MemoryClient", params: Mapping[str, Any]) -> Any:
+    table = params.get("p_table")
+    group = params.get("p_group") or "unit_id"
+    if table not in ("diplomacy_missions", "intelligence_missions"):
+        raise APIError("P0001", f"unknown mission table {table}")
+    if group not in ("unit_id", "target"):
+        raise APIError("P0001", f"unknown mission grouping {group}")
+    groups: Dict[Any, List[Dict[str, Any]]] = {}
+    for r in client.store.rows[client.store.table_def(table).name]:
+        groups.setdefault(r.get(group), []).append(r)
+    out = []
+    for key, rows in groups.items():
+        chances = [float(r["total_success"]) for r in rows if r.get("total_success") is not None]
+        out.append(
+            {
+                "group_key": None if key is None else str(key),
+                "missions": len(rows),
+                "resolved": sum(1 for r in rows if r.get("status") == "resolved"),
+                "successes": sum(1 for r in rows if r.get("success")),
+                "avg_chance": sum(chances) / len(chances) if chances else None,
+            }
+        )
+    return out
+
+
+def _rpc_carry_forward_reputation(client: "MemoryClient", params: Mapping[str, Any]) -> Any:
+    src = int(params["p_from"])
+    dst = int(params["p_to"])
+    rows = [
+        {
+            "week": dst,
+            "faction_id": r["faction_id"],
+            "score": r.get("score"),
+            "dc": r.get("dc"),
+            "bonus": r.get("bonus"),
+            "note": r.get("note") or "carried",
+            "updated_at": _now_iso(),
+        }
+        for r in client.store.rows[client.store.table_def("reputation").name]
+        if r.get("week") == src
+    ]
+    if rows:
+        client.table("reputation").upsert(rows, on_conflict="week,faction_id")._exec_upsert(
+            client.store.table_def("reputation")
+        )
+    return len(rows)
+
+
+RPC_FUNCTIONS: Dict[str, Callable[["MemoryClient", Mapping[str, Any]], Any]] = {
+    "apply_war_result": _rpc_apply_war_result,
+    "mission_success_rates": _rpc_mission_success_rates,
+    "carry_forward_reputation": _rpc_carry_forward_reputation,
+}
+
+
+class MemoryRpc:
+    def __init__(self, client: "MemoryClient", fn: str, params: Mapping[str, Any]):
+        self._client = client
+        self._fn = fn
+        self._params = dict(params or {})
+
+    def execute(self) -> APIResponse:
+        impl = RPC_FUNCTIONS.get(self._fn)
+        if impl is None:
+            raise APIError("PGRST202", f"Could not find the function public.{self._fn} in the schema cache")
+        self._client.delay()
+        with self._client.store.lock:
+            return APIResponse(data=copy.deepcopy(impl(self._client, self._params)))
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+class MemoryClient:
+    """Supabase-client lookalike backed by a `MemoryStore`."""
+
+    def __init__(self, store: MemoryStore, *, latency_ms: float = 0.0):
+        self.store = store
+        self.latency_seconds = max(0.0, float(latency_ms)) / 1000.0
+        self.requests = 0
+        self._count_lock = threading.Lock()
+
+    def delay(self) -> None:
+        with self._count_lock:
+            self.requests += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def table(self, name: str) -> MemoryTable:
+        return MemoryTable(self, name)
+
+    def from_(self, name: str) -> MemoryTable:
+        return self.table(name)
+
+    def rpc(self, fn: str, params: Optional[Mapping[str, Any]] = None, *args: Any, **kwargs: Any) -> MemoryRpc:
+        return MemoryRpc(self, fn, params or {})
+
+    def seed(self, fixtures: Mapping[str, Sequence[Mapping[str, Any]]]) -> None:
+        """Insert fixture rows (defaults applied, constraints checked)."""
+        for table, rows in fixtures.items():
+            if rows:
+                self.table(table).insert(list(rows)).execute()
+
+
+def create_memory_client(
+    *,
+    schema_path: Optional[Path] = None,
+    fixtures: bool = True,
+    seed: int = 0,
+    scale: int = 1,
+    latency_ms: float = 0.0,
+) -> MemoryClient:
+    """A client over a fresh store built from schema_v1 (plus generated fixtures)."""
+    client = MemoryClient(MemoryStore(load_schema(schema_path)))
+    if fixtures:
+        from utils.fixtures import generate_fixtures
+
+        client.seed(generate_fixtures(seed=seed, scale=scale))
+    client.latency_seconds = max(0.0, float(latency_ms)) / 1000.0
+    client.requests = 0
+    return client
@@ -0,0 +1,247 @@
+"""Mission widgets shared by the Diplomacy and Intelligence pages."""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import pandas as pd
+import streamlit as st
+
+from utils.equipment import compute_equipment_bonus_pct, equipment_in_use, optimize_equipment_assignment
+from utils.missions import MAX_SUCCESS_PCT, list_mission_history, mission_success_rates
+
+OBJECTIVES = {
+    "Maximize total success": "total",
+    "Raise the weakest mission": "min",
+}
+
+
+def equipment_assignment_inputs(
+    *,
+    equip_items: List[Dict[str, Any]],
+    equip_inv: Dict[str, int],
+    active_missions: List[Dict[str, Any]],
+    base_success: float,
+    key_prefix: str = "",
+) -> Dict[str, int]:
+    """Equipment pickers for a mission about to be dispatched.
+
+    `active_missions` are every unresolved mission of the category (any
+    week): their equipment is still out, so it is neither offered by the
+    inputs nor by the "Suggest" button. Returns equipment_id -> qty.
+    """
+    assignment: Dict[str, int] = {}
+    if not equip_items:
+        return assignment
+
+    reserved = equipment_in_use(active_missions)
+    free = {e["id"]: max(0, int(equip_inv.get(e["id"], 0)) - int(reserved.get(e["id"], 0))) for e in equip_items}
+    st.markdown("**Assign equipment (optional)**")
+
+    def _suggest_equipment() -> None:
+        # Best split of the equipment not already out on active missions.
+        plan = optimize_equipment_assignment(
+            [{"base_success": base_success}],
+            equip_items,
+            equip_inv,
+            reserved=reserved,
+        )[0]
+        for e in equip_items:
+            st.session_state[f"{key_prefix}assign_{e['id']}"] = int(plan.get(e["id"], 0))
+
+    st.button(
+        "✨ Suggest equipment",
+        key=f"{key_prefix}assign_suggest",
+        on_click=_suggest_equipment,
+        help="Fills in the available equipment that adds the most success, up to the 95% cap.",
+    )
+    cols = st.columns(2)
+    for i, e in enumerate(equip_items):
+        owned = int(equip_inv.get(e["id"], 0))
+        with cols[i % 2]:
+            q = st.number_input(
+                f"{e['name']} (free: {free[e['id']]} of {owned})",
+                min_value=0,
+                max_value=free[e["id"]],
+                value=0,
+                step=1,
+                key=f"{key_prefix}assign_{e['id']}",
+            )
+            if q:
+                assignment[e["id"]] = int(q)
+    return assignment
+
+
+def render_equipment_planner(
+    *,
+    units: List[Dict[str, Any]],
+    available_by_unit: Dict[Any, int],
+    equip_items: List[Dict[str, Any]],
+    equip_inv: Dict[str, int],
+    active_missions: List[Dict[str, Any]],
+    key_prefix: str = "",
+) -> None:
+    """Week planner: split the free equipment across every mission planned.
+
+    The player enters how many missions each unit will go on this week; the
+    optimizer spreads the equipment not out on active missions across all of
+    them, maximizing total success or raising the weakest mission first.
+    Advisory only: missions are still dispatched one at a time below.
+    """
+    if not equip_items or not units:
+        return
+    with st.expander("🧮 Plan this week's equipment", expanded=False):
+        plan_df = pd.DataFrame(
+            [
+                {
+                    "Unit": u["name"],
+                    "Base success": float(u.get("success") or 0.0),
+                    "Available": int(available_by_unit.get(u["id"], 0)),
+                    "Missions": 0,
+                }
+                for u in units
+            ]
+        )
+        edited = st.data_editor(
+            plan_df,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Unit": st.column_config.TextColumn(disabled=True),
+                "Base success": st.column_config.NumberColumn(disabled=True, format="%.0f%%"),
+                "Available": st.column_config.NumberColumn(disabled=True),
+                "Missions": st.column_config.NumberColumn(min_value=0, step=1),
+            },
+            key=f"{key_prefix}plan_editor",
+        )
+        objective = OBJECTIVES[st.radio("Goal", list(OBJECTIVES), horizontal=True, key=f"{key_prefix}plan_objective")]
+
+        # One planned mission needs at least one available unit.
+        planned: List[Dict[str, Any]] = []
+        for u, (_, row) in zip(units, edited.iterrows()):
+            count = min(int(row["Missions"] or 0), int(row["Available"]))
+            planned.extend({"unit": u["name"], "base_success": float(u.get("success") or 0.0)} for _ in range(count))
+        if not planned:
+            st.caption("Enter how many missions each unit will go on.")
+            return
+
+        plan = optimize_equipment_assignment(
+            planned,
+            equip_items,
+            equip_inv,
+            objective=objective,
+            reserved=equipment_in_use(active_missions),
+        )
+        name_by_id = {e["id"]: e["name"] for e in equip_items}
+        st.dataframe(
+            pd.DataFrame(
+                [
+                    {
+                        "Mission": i + 1,
+                        "Unit": m["unit"],
+                        "Equipment": ", ".join(f"{qty}× {name_by_id.get(eid, eid)}" for eid, qty in assignment.items()) or "—",
+                        "Chance": (
+                            f"{min(MAX_SUCCESS_PCT, m['base_success'] + compute_equipment_bonus_pct(equip_items, assignment)):.0f}%"
+                        ),
+                    }
+                    for i, (m, assignment) in enumerate(zip(planned, plan))
+                ]
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+
+def render_mission_history(sb, table: str, units: List[Dict[str, Any]], *, key_prefix: str) -> None:
+    """History tab: filterable, keyset-paginated mission list plus success rates.
+
+    Loaded pages live in session_state under `<key_prefix>_hist`; "Load more"
+    fetches the next page only.
+    """
+    st.subheader("Mission History")
+    st.caption("All weeks, newest first.")
+
+    unit_name_by_id = {u["id"]: u["name"] for u in units}
+    unit_id_by_name = {u["name"]: u["id"] for u in units}
+
+    h1, h2, h3 = st.columns(3)
+    with h1:
+        h_status = st.selectbox("Status", ["All", "active", "resolved"], key=f"{key_prefix}_hist_status")
+    with h2:
+        h_unit = st.selectbox("Unit", ["All"] + list(unit_id_by_name.keys()), key=f"{key_prefix}_hist_unit")
+    with h3:
+        h_target = st.text_input("Target contains", value="", key=f"{key_prefix}_hist_target")
+
+    filters = (h_status, h_unit, h_target.strip())
+    refresh = st.button("↻ Refresh", key=f"{key_prefix}_hist_refresh")
+    hist = st.session_state.get(f"{key_prefix}_hist")
+    if refresh or not hist or hist["filters"] != filters:
+        hist = {"filters": filters, "rows": [], "cursor": None, "done": False}
+        st.session_state[f"{key_prefix}_hist"] = hist
+
+    def _load_history_page() -> None:
+        page = list_mission_history(
+            sb,
+            table,
+            status=None if h_status == "All" else h_status,
+            unit_id=unit_id_by_name.get(h_unit),
+            target=h_target.strip() or None,
+            limit=50,
+            cursor=hist["cursor"],
+        )
+        hist["rows"].extend(page.rows)
+        hist["cursor"] = page.next_cursor
+        hist["done"] = page.next_cursor is None
+
+    if not hist["rows"] and not hist["done"]:
+        _load_history_page()
+
+    if not hist["rows"]:
+        st.info("No missions match.")
+    else:
+        st.dataframe(
+            pd.DataFrame(
+                [
+                    {
+                        "Week": m.get("week"),
+                        "Status": m.get("status"),
+                        "Unit": unit_name_by_id.get(m.get("unit_id"), "Unknown"),
+                        "Qty": int(m.get("quantity") or 0),
+                        "Target": m.get("target") or "",
+                        "Chance": f"{float(m.get('total_success') or 0):.0f}%",
+                        "Roll": m.get("roll"),
+                        "Success": m.get("success"),
+                    }
+                    for m in hist["rows"]
+                ]
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
+        if not hist["done"] and st.button("Load more", key=f"{key_prefix}_hist_more"):
+            _load_history_page()
+            st.rerun()
+
+    st.markdown("#### Success rates")
+    group_label = st.radio("Group by", ["Unit", "Target"], horizontal=True, key=f"{key_prefix}_rates_group")
+    rates = mission_success_rates(sb, table, group_by="unit_id" if group_label == "Unit" else "target")
+    if not rates:
+        st.caption("No missions yet.")
+    else:
+        st.dataframe(
+            pd.DataFrame(
+                [
+                    {
+                        group_label: (unit_name_by_id.get(r["group_key"], "Unknown") if group_label == "Unit" else r["group_key"]),
+                        "Missions": int(r.get("missions") or 0),
+                        "Resolved": int(r.get("resolved") or 0),
+                        "Successes": int(r.get("successes") or 0),
+                        "Success rate": "—" if r["success_rate"] is None else f"{r['success_rate']:.0f}%",
+                        "Avg chance": f"{r['avg_chance']:.0f}%",
+                    }
+                    for r in sorted(rates, key=lambda x: -int(x.get("missions") or 0))
+                ]
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
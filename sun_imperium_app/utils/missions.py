@@ -2,7 +2,8 @@ from __future__ import annotations
 
 import hashlib
 import random
-from typing import Any, Dict, List, Optional
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
 
 
 def _stable_d100(seed_key: str) -> int:
@@ -16,15 +17,43 @@ def _stable_d100(seed_key: str) -> int:
     return rng.randint(1, 100)
 
 
+# Success chance never exceeds this, whatever the bonuses.
+MAX_SUCCESS_PCT = 95.0
+
+MISSION_TABLES = ("diplomacy_missions", "intelligence_missions")
+
+MISSION_COLUMNS = (
+    "id,week,unit_id,quantity,target,objective,status,created_at,eta_week,base_success,bonus_success,total_success,roll,success,resolution_note,equipment_assignment"
+)
+
+
+def _roll_for(mission_id: str, total_success: float, seed_key: Optional[str] = None) -> tuple[int, bool]:
+    """Deterministic (roll, success) for a mission; shared by single and batch resolve."""
+    seed = seed_key or f"{mission_id}:{total_success}"
+    roll = int(_stable_d100(seed))
+    return roll, bool(roll <= total_success)
+
+
 def list_missions(sb, table: str, week: int, status: Optional[str] = None) -> List[Dict[str, Any]]:
-    q = sb.table(table).select(
-        "id,week,unit_id,quantity,target,objective,status,created_at,eta_week,base_success,bonus_success,total_success,roll,success,resolution_note,equipment_assignment"
-    ).eq("week", week).order("created_at", desc=True)
+    q = sb.table(table).select(MISSION_COLUMNS).eq("week", week).order("created_at", desc=True)
     if status:
         q = q.eq("status", status)
     return q.execute().data or []
 
 
+def list_active_missions(sb, table: str) -> List[Dict[str, Any]]:
+    """Unresolved missions of every week (their units and equipment are still out)."""
+    return (
+        sb.table(table)
+        .select(MISSION_COLUMNS)
+        .eq("status", "active")
+        .order("created_at", desc=True)
+        .execute()
+        .data
+        or []
+    )
+
+
 def create_mission(
     sb,
     *,
@@ -39,7 +68,7 @@ def create_mission(
     eta_week: Optional[int] = None,
     equipment_assignment: Optional[Dict[str, int]] = None,
 ):
-    total_success = max(0.0, min(95.0, base_success + bonus_success))
+    total_success = max(0.0, min(MAX_SUCCESS_PCT, base_success + bonus_success))
     sb.table(table).insert(
         {
             "week": int(week),
@@ -84,9 +113,7 @@ def resolve_mission(
         return row
 
     total = float(row.get("total_success") or 0.0)
-    seed = seed_key or f"{mission_id}:{total}"
-    roll = int(_stable_d100(seed))
-    success = bool(roll <= total)
+    roll, success = _roll_for(mission_id, total, seed_key)
 
     sb.table(table).update(
         {
@@ -98,3 +125,150 @@ def resolve_mission(
     ).eq("id", mission_id).execute()
 
     return {"id": mission_id, "roll": roll, "success": success, "total_success": total}
+
+
+def list_due_missions(sb, table: str, week: int) -> List[Dict[str, Any]]:
+    """Active missions that are due by `week`.
+
+    Due = eta_week <= week, or no eta_week and dispatched on/before `week`.
+    """
+    return (
+        sb.table(table)
+        .select(MISSION_COLUMNS)
+        .eq("status", "active")
+        .or_(f"eta_week.lte.{int(week)},and(eta_week.is.null,week.lte.{int(week)})")
+        .order("created_at")
+        .execute()
+        .data
+        or []
+    )
+
+
+def resolve_due_missions(
+    sb,
+    *,
+    week: int,
+    tables: tuple[str, ...] = MISSION_TABLES,
+    dm_note: str = "",
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Resolve every due active mission in one pass per table.
+
+    Rolls are the same deterministic d100 as resolve_mission, computed in
+    memory; results are written back with a single upsert per table
+    (full rows, keyed on id). Returns {table: [{id, roll, success, total_success}]}.
+    """
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for table in tables:
+        rows = list_due_missions(sb, table, week)
+        results: List[Dict[str, Any]] = []
+        updated: List[Dict[str, Any]] = []
+        for row in rows:
+            total = float(row.get("total_success") or 0.0)
+            roll, success = _roll_for(row["id"], total)
+            updated.append(
+                {
+                    **row,
+                    "status": "resolved",
+                    "roll": roll,
+                    "success": success,
+                    "resolution_note": dm_note or row.get("resolution_note") or "",
+                }
+            )
+            results.append({"id": row["id"], "roll": roll, "success": success, "total_success": total})
+
+        if updated:
+            try:
+                sb.table(table).upsert(updated, on_conflict="id").execute()
+            except Exception:
+                # Fallback: per-row updates (e.g. RLS without insert permission)
+                for u in updated:
+                    sb.table(table).update(
+                        {
+                            "status": u["status"],
+                            "roll": u["roll"],
+                            "success": u["success"],
+                            "resolution_note": u["resolution_note"],
+                        }
+                    ).eq("id", u["id"]).execute()
+        out[table] = results
+    return out
+
+
+# ---------------------------
+# History (cross-week)
+# ---------------------------
+
+# Narrower column list for the history view (no equipment payload).
+HISTORY_COLUMNS = "id,week,unit_id,quantity,target,status,created_at,eta_week,total_success,roll,success"
+
+
+@dataclass(frozen=True)
+class MissionPage:
+    rows: List[Dict[str, Any]]
+    # (created_at, id) of the last row; pass back as `cursor` for the next page.
+    next_cursor: Optional[Tuple[str, str]]
+
+
+def list_mission_history(
+    sb,
+    table: str,
+    *,
+    status: Optional[str] = None,
+    unit_id: Optional[str] = None,
+    target: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[Tuple[str, str]] = None,
+) -> MissionPage:
+    """Missions across all weeks, newest first, keyset-paginated.
+
+    Ordered by (created_at desc, id desc) so pages stay stable while new
+    missions are dispatched; backed by idx_*_missions_keyset.
+    """
+    limit = max(1, int(limit))
+    q = sb.table(table).select(HISTORY_COLUMNS)
+    if status:
+        q = q.eq("status", status)
+    if unit_id:
+        q = q.eq("unit_id", unit_id)
+    if target:
+        q = q.ilike("target", f"%{target}%")
+    if cursor:
+        ts, last_id = cursor
+        q = q.or_(f'created_at.lt."{ts}",and(created_at.eq."{ts}",id.lt.{last_id})')
+    rows = q.order("created_at", desc=True).order("id", desc=True).limit(limit + 1).execute().data or []
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (rows[-1]["created_at"], rows[-1]["id"]) if more and rows else None
+    return MissionPage(rows=rows, next_cursor=next_cursor)
+
+
+def mission_success_rates(sb, table: str, group_by: str = "unit_id") -> List[Dict[str, Any]]:
+    """Success rates per unit_id or target.
+
+    Uses the mission_success_rates SQL function; falls back to aggregating a
+    narrow select client-side if the function isn't installed.
+    Rows: {group_key, missions, resolved, successes, success_rate, avg_chance}
+    """
+    try:
+        rows = sb.rpc("mission_success_rates", {"p_table": table, "p_group": group_by}).execute().data or []
+    except Exception:
+        raw = sb.table(table).select(f"{group_by},status,success,total_success").execute().data or []
+        agg: Dict[str, Dict[str, Any]] = {}
+        for r in raw:
+            key = str(r.get(group_by) or "")
+            a = agg.setdefault(key, {"group_key": key, "missions": 0, "resolved": 0, "successes": 0, "_chance": 0.0})
+            a["missions"] += 1
+            a["resolved"] += 1 if str(r.get("status")) == "resolved" else 0
+            a["successes"] += 1 if r.get("success") else 0
+            a["_chance"] += float(r.get("total_success") or 0.0)
+        rows = []
+        for a in agg.values():
+            a["avg_chance"] = a.pop("_chance") / a["missions"] if a["missions"] else 0.0
+            rows.append(a)
+
+    for r in rows:
+        resolved = int(r.get("resolved") or 0)
+        r["success_rate"] = (int(r.get("successes") or 0) / resolved * 100.0) if resolved else None
+        r["avg_chance"] = float(r.get("avg_chance") or 0.0)
+    return rows
@@ -1,5 +1,9 @@
 import streamlit as st
 
+from utils import query_cache
+from utils.supabase_client import get_supabase
+from utils.visibility import get_visibility
+
 
 def hide_default_sidebar_nav() -> None:
     """Hide Streamlit's built-in multipage navigation list.
@@ -41,6 +45,8 @@ def page_config(_title: str, _icon: str = "🌙") -> None:
 def sidebar(active: str | None = None) -> None:
     """Render the custom emoji navigation everywhere."""
 
+    # Every page calls this first: it marks the start of the run's read memo.
+    query_cache.start_run()
     hide_default_sidebar_nav()
 
     st.sidebar.markdown("## 🌙 Sun Imperium")
@@ -67,7 +73,17 @@ def sidebar(active: str | None = None) -> None:
     except Exception:
         pass
 
+    # Players don't see pages the DM hid (cached; no query per render).
+    visibility = None
+    if not st.session_state.get("is_dm", False):
+        try:
+            visibility = get_visibility(get_supabase())
+        except Exception:
+            visibility = None
+
     for label, target in pages:
+        if visibility is not None and visibility.page_hidden(target):
+            continue
         prefix = "➡️ " if (active and label == active) else ""
         try:
             st.sidebar.page_link(target, label=f"{prefix}{label}")
@@ -3,6 +3,8 @@ from __future__ import annotations
 import streamlit as st
 from supabase import Client
 
+from utils.visibility import get_visibility
+
 
 # Page registry (key -> (label, page_path))
 PAGES = [
@@ -20,16 +22,7 @@ PAGES = [
 
 
 def _get_hidden_keys(sb: Client) -> set[str]:
-    try:
-        row = sb.table("app_state").select("ui_hidden_pages").eq("id", 1).limit(1).execute().data
-        if not row:
-            return set()
-        keys = row[0].get("ui_hidden_pages") or []
-        if isinstance(keys, list):
-            return {str(k) for k in keys}
-        return set()
-    except Exception:
-        return set()
+    return set(get_visibility(sb).hidden_pages)
 
 
 def inject_hide_default_sidebar_nav() -> None:
@@ -0,0 +1,148 @@
+"""Effective unit power index.
+
+One place that combines:
+- catalog power from `moonblade_units.power`
+- `power_bonus` effects from owned infrastructure (per sim bucket)
+- the sim bucket of each unit (guardian/archer/mage/cleric/others)
+
+The index is cached per set of owned infrastructure (taken from the cached
+`EffectsSnapshot`), so it is only rebuilt after a purchase/undo (or when the
+TTL picks up catalog edits), and pages don't redo the lookups on every rerun.
+
+Infrastructure only helps the player's units: enemy forces are measured with
+`PowerIndex.without_bonuses()`, the same catalog baseline minus the bonuses,
+so both sides of a battle are on one scale.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Iterable, List, Optional
+
+import streamlit as st
+
+from utils import infrastructure_effects
+from utils.war import BUCKETS, bucket_key
+
+# Fallback per-unit power when a member row doesn't resolve to a catalog unit.
+UNKNOWN_UNIT_POWER = 1.0
+
+
+@dataclass(frozen=True)
+class PowerIndex:
+    """Immutable lookup of effective power per unit."""
+
+    base_by_unit_id: Dict[Any, float] = field(default_factory=dict)
+    bucket_by_unit_id: Dict[Any, str] = field(default_factory=dict)
+    bonus_by_bucket: Dict[str, float] = field(default_factory=dict)
+    effective_by_unit_id: Dict[Any, float] = field(default_factory=dict)
+
+    def unit_power(self, unit_id: Any = None, unit_type: Optional[str] = None) -> float:
+        """Effective power of one unit (catalog power + infrastructure bonus)."""
+        if unit_id is not None and unit_id in self.effective_by_unit_id:
+            return self.effective_by_unit_id[unit_id]
+        return UNKNOWN_UNIT_POWER + self.bonus_by_bucket.get(bucket_key(unit_type or ""), 0.0)
+
+    def bucket_for(self, unit_id: Any = None, unit_type: Optional[str] = None) -> str:
+        if unit_id is not None and unit_id in self.bucket_by_unit_id:
+            return self.bucket_by_unit_id[unit_id]
+        return bucket_key(unit_type or "")
+
+    def squad_power(self, rows: Iterable[Dict[str, Any]]) -> float:
+        """Sum of effective power × quantity over squad member rows."""
+        total = 0.0
+        for r in rows or []:
+            qty = int(r.get("quantity") or 0)
+            if qty <= 0:
+                continue
+            total += self.unit_power(r.get("unit_id"), r.get("unit_type")) * qty
+        return total
+
+    def bucket_weights(self, rows: Iterable[Dict[str, Any]]) -> Dict[str, float]:
+        """Average effective power per unit for each sim bucket present in rows.
+
+        Feed this to `utils.war.simulate_battle(..., ally_weights=...)`.
+        Buckets without members are omitted so the sim keeps its base weight.
+        """
+        power: Dict[str, float] = {}
+        qty_by_bucket: Dict[str, int] = {}
+        for r in rows or []:
+            qty = int(r.get("quantity") or 0)
+            if qty <= 0:
+                continue
+            b = self.bucket_for(r.get("unit_id"), r.get("unit_type"))
+            power[b] = power.get(b, 0.0) + self.unit_power(r.get("unit_id"), r.get("unit_type")) * qty
+            qty_by_bucket[b] = qty_by_bucket.get(b, 0) + qty
+        return {b: power[b] / qty_by_bucket[b] for b in power if qty_by_bucket.get(b)}
+
+    def catalog_weights(self) -> Dict[str, float]:
+        """Average effective power per unit for each sim bucket in the catalog.
+
+        For forces given as bucket counts only (no unit ids), e.g. a manually
+        entered enemy. Buckets without catalog units are omitted.
+        """
+        power: Dict[str, float] = {}
+        count: Dict[str, int] = {}
+        for uid, p in self.effective_by_unit_id.items():
+            b = self.bucket_by_unit_id.get(uid, "others")
+            power[b] = power.get(b, 0.0) + p
+            count[b] = count.get(b, 0) + 1
+        return {b: power[b] / count[b] for b in power}
+
+    def without_bonuses(self) -> "PowerIndex":
+        """Same catalog, no infrastructure bonuses (for enemy forces)."""
+        return replace(self, bonus_by_bucket={}, effective_by_unit_id=dict(self.base_by_unit_id))
+
+
+def build_power_index(
+    units: List[Dict[str, Any]],
+    effects: infrastructure_effects.EffectsSnapshot,
+) -> PowerIndex:
+    """Pure builder (no I/O): catalog rows + infrastructure effects -> index."""
+    bonus_by_bucket: Dict[str, float] = {b: 0.0 for b in BUCKETS}
+    for target, value in effects.power_bonus_by_unit_type.items():
+        b = bucket_key(target)
+        bonus_by_bucket[b] = bonus_by_bucket.get(b, 0.0) + float(value)
+
+    base: Dict[Any, float] = {}
+    buckets: Dict[Any, str] = {}
+    effective: Dict[Any, float] = {}
+    for u in units or []:
+        uid = u.get("id")
+        if uid is None:
+            continue
+        b = bucket_key(u.get("unit_type") or "")
+        p = float(u.get("power") or 0)
+        base[uid] = p
+        buckets[uid] = b
+        effective[uid] = p + bonus_by_bucket.get(b, 0.0)
+
+    return PowerIndex(
+        base_by_unit_id=base,
+        bucket_by_unit_id=buckets,
+        bonus_by_bucket=bonus_by_bucket,
+        effective_by_unit_id=effective,
+    )
+
+
+@st.cache_data(show_spinner=False, ttl=600)
+def _load_power_index(_sb, owned_names: frozenset) -> PowerIndex:
+    try:
+        units = _sb.table("moonblade_units").select("id,unit_type,power").execute().data or []
+    except Exception:
+        units = []
+    return build_power_index(units, infrastructure_effects.build_effects_snapshot(owned_names))
+
+
+def get_power_index(sb, snapshot: Optional[infrastructure_effects.EffectsSnapshot] = None) -> PowerIndex:
+    """Cached effective power index, keyed on the owned infrastructure set."""
+    try:
+        owned_names = (snapshot or infrastructure_effects.get_effects_snapshot(sb)).owned_names
+    except Exception:
+        owned_names = frozenset()
+    return _load_power_index(sb, owned_names)
+
+
+def clear_power_index() -> None:
+    """Drop cached indexes (after re-seeding moonblade_units or a snapshot restore)."""
+    _load_power_index.clear()
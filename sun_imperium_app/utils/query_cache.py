@@ -0,0 +1,295 @@
+"""Read coalescing / memoization over the Supabase client.
+
+`CachingClient` wraps the client returned by `get_supabase()`. Query builders
+are proxied so the whole call chain (`table("x").select(...).eq(...)...`) is
+recorded; on `.execute()`:
+
+- reads (`select`) are answered from
+  1. a per-script-run memo: identical selects within one rerun hit the
+     backend once, and
+  2. a small process-wide TTL cache shared by reruns and sessions;
+- writes (`insert`/`upsert`/`update`/`delete`) go straight through and then
+  drop every cached read of that table (including selects that embed it,
+  e.g. `infrastructure_owned` with `infrastructure(name)`); a read that was
+  in flight while its tables were invalidated is returned but not stored;
+- `rpc` calls are never cached; unless listed in `READ_ONLY_RPCS` they may
+  write anything, so they clear the whole cache.
+
+A run is identified by a counter in `st.session_state` that `start_run()`
+bumps (`utils.nav.sidebar` calls it at the top of every page; fragments that
+poll call it too). Reads outside a Streamlit script run (e.g. the Advance
+Week worker thread) or before `start_run()` bypass both caches but still
+invalidate on writes. A session keeps only its latest run's memo, and memos
+of sessions idle for `RUN_MEMO_MAX_AGE` seconds are dropped.
+Cached responses are deep-copied on the way out, so callers may mutate rows.
+Every backend call goes through `utils.executor` (retries, breaker, metrics).
+"""
+
+from __future__ import annotations
+
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from utils import executor
+
+DEFAULT_TTL_SECONDS = 2.0
+MAX_ENTRIES = 512
+RUN_MEMO_MAX_AGE = 120.0
+RUN_KEY = "_query_cache_run"
+
+READ_ONLY_RPCS = frozenset({"mission_success_rates"})
+
+_WRITE_METHODS = frozenset({"insert", "upsert", "update", "delete"})
+_EMBED_RE = re.compile(r"([A-Za-z_][A-Za-z0-9_]*)(?:!\w+)?\(")
+
+CallChain = Tuple[Tuple[str, str], ...]
+
+
+def _script_ctx() -> Any:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        return get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        return None
+
+
+def start_run() -> None:
+    """Start a new read memo for this session (call once at the top of a run)."""
+    if _script_ctx() is None:
+        return
+    import streamlit as st
+
+    st.session_state[RUN_KEY] = int(st.session_state.get(RUN_KEY, 0)) + 1
+
+
+def _run_marker() -> Tuple[Optional[str], Optional[int]]:
+    """(session_id, run number) for the current script run, or (None, None)."""
+    ctx = _script_ctx()
+    if ctx is None:
+        return None, None
+    try:
+        import streamlit as st
+
+        run = st.session_state.get(RUN_KEY)
+    except Exception:
+        return None, None
+    return ctx.session_id, run
+
+
+def _tables_in(table: str, chain: CallChain) -> FrozenSet[str]:
+    tables = {table}
+    for name, args in chain:
+        if name == "select":
+            tables.update(_EMBED_RE.findall(args))
+    return frozenset(tables)
+
+
+class QueryCache:
+    """Process-wide TTL cache + per-run memo, invalidated by table."""
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_entries: int = MAX_ENTRIES):
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = int(max_entries)
+        self._lock = threading.Lock()
+        # key -> (stored_at, tables, response)
+        self._entries: "OrderedDict[Tuple[str, CallChain], Tuple[float, FrozenSet[str], Any]]" = OrderedDict()
+        # session_id -> [run number, last used, {key: (tables, response)}]
+        self._runs: Dict[str, List[Any]] = {}
+        # Bumped by every invalidate: a read is only stored if none of its
+        # tables was invalidated while it was in flight.
+        self._generations: Dict[str, int] = {}
+        self._generation_all = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _run_memo(self, create: bool) -> Optional[Dict[Tuple[str, CallChain], Tuple[FrozenSet[str], Any]]]:
+        session_id, run = _run_marker()
+        if session_id is None or run is None:
+            return None
+        now = time.monotonic()
+        current = self._runs.get(session_id)
+        if current is None or current[0] != run:
+            if not create:
+                return None
+            self._prune_runs(now)
+            current = [run, now, {}]
+            self._runs[session_id] = current
+        current[1] = now
+        return current[2]
+
+    def _prune_runs(self, now: float) -> None:
+        """Drop memos of sessions that haven't read for a while (closed tabs)."""
+        for session_id in [s for s, r in self._runs.items() if now - r[1] > RUN_MEMO_MAX_AGE]:
+            del self._runs[session_id]
+
+    def get(self, key: Tuple[str, CallChain]) -> Tuple[bool, Any]:
+        with self._lock:
+            memo = self._run_memo(create=True)
+            if memo is None:
+                return False, None
+            if key in memo:
+                self.hits += 1
+                return True, copy.deepcopy(memo[key][1])
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                memo[key] = (entry[1], entry[2])
+                self.hits += 1
+                return True, copy.deepcopy(entry[2])
+            self.misses += 1
+            return False, None
+
+    def generation(self, tables: FrozenSet[str]) -> Tuple[int, ...]:
+        """Snapshot of the invalidation counters for `tables` (take it before reading)."""
+        with self._lock:
+            return (self._generation_all,) + tuple(self._generations.get(t, 0) for t in sorted(tables))
+
+    def put(
+        self,
+        key: Tuple[str, CallChain],
+        tables: FrozenSet[str],
+        response: Any,
+        generation: Optional[Tuple[int, ...]] = None,
+    ) -> None:
+        """Store a read, unless a write invalidated its tables since `generation`."""
+        with self._lock:
+            memo = self._run_memo(create=False)
+            if memo is None:
+                return
+            current = (self._generation_all,) + tuple(self._generations.get(t, 0) for t in sorted(tables))
+            if generation is not None and generation != current:
+                return
+            stored = copy.deepcopy(response)
+            memo[key] = (tables, stored)
+            self._entries[key] = (time.monotonic(), tables, stored)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table: Optional[str] = None) -> None:
+        """Drop cached reads touching `table` (all reads if None)."""
+        with self._lock:
+            if table is None:
+                self._generation_all += 1
+                self._entries.clear()
+                self._runs.clear()
+                return
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for key in [k for k, v in self._entries.items() if table in v[1]]:
+                del self._entries[key]
+            for _, _, memo in self._runs.values():
+                for key in [k for k, v in memo.items() if table in v[0]]:
+                    del memo[key]
+
+
+class _QueryProxy:
+    """Records the builder call chain and routes `.execute()` through the cache."""
+
+    EXECUTOR_MANAGED = True
+
+    def __init__(self, cache: QueryCache, table: str, inner: Any, chain: CallChain = ()):
+        self._cache = cache
+        self._table = table
+        self._inner = inner
+        self._chain = chain
+
+    def _wrap(self, name: str, args: str, result: Any) -> Any:
+        if hasattr(result, "execute"):
+            return _QueryProxy(self._cache, self._table, result, self._chain + ((name, args),))
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._inner, name)
+        if not callable(attr):
+            # Properties such as `.not_` return a builder too.
+            return self._wrap(name, "", attr)
+
+        def call(*args: Any, **kwargs: Any) -> Any:
+            return self._wrap(name, repr((args, sorted(kwargs.items()))), attr(*args, **kwargs))
+
+        return call
+
+    def _op(self) -> str:
+        names = [n for n, _ in self._chain]
+        writes = [n for n in names if n in _WRITE_METHODS]
+        if writes:
+            return writes[0]
+        return names[0] if names else "other"
+
+    def execute(self) -> Any:
+        op = self._op()
+        if op == "select":
+            key = (self._table, self._chain)
+            hit, response = self._cache.get(key)
+            if hit:
+                return response
+            tables = _tables_in(self._table, self._chain)
+            generation = self._cache.generation(tables)
+            response = executor.execute(self._inner, table=self._table, op=op)
+            self._cache.put(key, tables, response, generation)
+            return response
+
+        response = executor.execute(self._inner, table=self._table, op=op)
+        self._cache.invalidate(self._table)
+        return response
+
+
+class _RpcProxy:
+    EXECUTOR_MANAGED = True
+
+    def __init__(self, cache: QueryCache, fn: str, inner: Any):
+        self._cache = cache
+        self._fn = fn
+        self._inner = inner
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._inner, name)
+        if not callable(attr):
+            return _RpcProxy(self._cache, self._fn, attr) if hasattr(attr, "execute") else attr
+
+        def call(*args: Any, **kwargs: Any) -> Any:
+            result = attr(*args, **kwargs)
+            return _RpcProxy(self._cache, self._fn, result) if hasattr(result, "execute") else result
+
+        return call
+
+    def execute(self) -> Any:
+        read_only = self._fn in READ_ONLY_RPCS
+        response = executor.execute(self._inner, table=f"rpc:{self._fn}", op="rpc_read" if read_only else "rpc")
+        if not read_only:
+            self._cache.invalidate()
+        return response
+
+
+class CachingClient:
+    """Drop-in wrapper for the Supabase client (table/from_/rpc are proxied)."""
+
+    def __init__(self, client: Any, cache: Optional[QueryCache] = None):
+        self._client = client
+        self.cache = cache or QueryCache()
+
+    def table(self, name: str) -> _QueryProxy:
+        return _QueryProxy(self.cache, name, self._client.table(name))
+
+    def from_(self, name: str) -> _QueryProxy:
+        return self.table(name)
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None, *args: Any, **kwargs: Any) -> _RpcProxy:
+        return _RpcProxy(self.cache, fn, self._client.rpc(fn, params or {}, *args, **kwargs))
+
+    def invalidate(self, table: Optional[str] = None) -> None:
+        self.cache.invalidate(table)
+
+    @property
+    def raw(self) -> Any:
+        """The unwrapped client (uncached)."""
+        return self._client
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
@@ -0,0 +1,144 @@
+"""Reputation storage helpers (per-week rows in `reputation`).
+
+History reads return every requested week for many factions in one query.
+Closed weeks (before the current week) rarely change, so their scores are
+kept in a process-level cache for `CLOSED_WEEK_TTL_SECONDS` and only open
+weeks are re-read. A cached week is only served while it is still before the
+current week (a snapshot restore can reopen it).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.ledger import get_current_week
+
+REPUTATION_COLUMNS = "faction_id,score,dc,bonus,note"
+
+# PostgREST caps responses (1000 rows by default); history reads page through.
+_PAGE_SIZE = 1000
+
+CLOSED_WEEK_TTL_SECONDS = 600.0
+
+# week -> (stored_at, {faction_id: score}), closed weeks only
+_closed_lock = threading.Lock()
+_closed_weeks: Dict[int, Tuple[float, Dict[Any, int]]] = {}
+
+
+def carry_forward_reputation(sb, from_week: int, to_week: int) -> int:
+    """Copy every reputation row of `from_week` into `to_week` in one round trip.
+
+    Uses the `carry_forward_reputation` SQL function when it is installed,
+    otherwise reads the week once and writes it back as a single bulk upsert.
+    Returns the number of rows copied.
+    """
+    try:
+        res = sb.rpc("carry_forward_reputation", {"p_from": int(from_week), "p_to": int(to_week)}).execute()
+        return int(res.data or 0)
+    except Exception:
+        pass
+
+    reps = sb.table("reputation").select(REPUTATION_COLUMNS).eq("week", from_week).execute().data or []
+    rows: List[Dict[str, Any]] = [
+        {
+            "week": to_week,
+            "faction_id": r["faction_id"],
+            "score": int(r.get("score") or 0),
+            "dc": r.get("dc"),
+            "bonus": r.get("bonus"),
+            "note": r.get("note") or "carried",
+        }
+        for r in reps
+    ]
+    if rows:
+        sb.table("reputation").upsert(rows, on_conflict="week,faction_id").execute()
+    return len(rows)
+
+
+def _fetch_weeks(sb, weeks: List[int]) -> Dict[int, Dict[Any, int]]:
+    out: Dict[int, Dict[Any, int]] = {w: {} for w in weeks}
+    if not weeks:
+        return out
+    start = 0
+    while True:
+        rows = (
+            sb.table("reputation")
+            .select("week,faction_id,score")
+            .in_("week", weeks)
+            .order("week")
+            .order("faction_id")
+            .range(start, start + _PAGE_SIZE - 1)
+            .execute()
+            .data
+            or []
+        )
+        for r in rows:
+            out.setdefault(int(r["week"]), {})[r["faction_id"]] = int(r.get("score") or 0)
+        if len(rows) < _PAGE_SIZE:
+            return out
+        start += _PAGE_SIZE
+
+
+def _scores_by_week(sb, weeks: Iterable[int], current_week: int) -> Dict[int, Dict[Any, int]]:
+    weeks = sorted(set(int(w) for w in weeks))
+    now = time.monotonic()
+    cached: Dict[int, Dict[Any, int]] = {}
+    with _closed_lock:
+        for w in weeks:
+            entry = _closed_weeks.get(w)
+            if entry is not None and w < current_week and now - entry[0] <= CLOSED_WEEK_TTL_SECONDS:
+                cached[w] = entry[1]
+    missing = [w for w in weeks if w not in cached]
+
+    fetched = _fetch_weeks(sb, missing)
+    with _closed_lock:
+        for w, scores in fetched.items():
+            if w < current_week:
+                _closed_weeks[w] = (now, scores)
+    cached.update(fetched)
+    return cached
+
+
+def get_week_scores(sb, week: int, *, current_week: Optional[int] = None) -> Dict[Any, int]:
+    """{faction_id: score} for one week (cached once the week is closed)."""
+    if current_week is None:
+        current_week = get_current_week(sb)
+    return _scores_by_week(sb, [week], current_week).get(int(week), {})
+
+
+def get_reputation_history(
+    sb,
+    faction_ids: Optional[Iterable[Any]] = None,
+    *,
+    from_week: int = 1,
+    to_week: Optional[int] = None,
+    current_week: Optional[int] = None,
+) -> Dict[Any, List[Tuple[int, int]]]:
+    """Score history per faction: {faction_id: [(week, score), ...]} in week order.
+
+    `faction_ids=None` returns every faction with a row in the range.
+    `to_week` defaults to the current week. Weeks without a row for a faction
+    are skipped (no carry-forward is implied).
+    """
+    if current_week is None:
+        current_week = get_current_week(sb)
+    if to_week is None:
+        to_week = current_week
+    wanted = None if faction_ids is None else set(faction_ids)
+
+    by_week = _scores_by_week(sb, range(int(from_week), int(to_week) + 1), current_week)
+    history: Dict[Any, List[Tuple[int, int]]] = {}
+    for w in sorted(by_week):
+        for fid, score in by_week[w].items():
+            if wanted is not None and fid not in wanted:
+                continue
+            history.setdefault(fid, []).append((w, score))
+    return history
+
+
+def clear_reputation_history() -> None:
+    """Forget cached closed weeks (e.g. after editing a past week by hand)."""
+    with _closed_lock:
+        _closed_weeks.clear()
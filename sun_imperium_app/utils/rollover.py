@@ -0,0 +1,550 @@
+"""Advance Week as a resumable pipeline of named stages.
+
+Each stage is safe to run twice (upserts, existence checks, and ledger
+entries keyed by `idempotency_key`), and the run is recorded in
+`week_rollovers` (one row per week being closed) with per-stage status and
+timings. Calling `run_rollover` again for the same week skips finished
+stages and continues from where an interrupted run stopped.
+
+Only one run per week may work at a time. A run first claims the week's
+row with a single conditional write (insert a new row, or flip a pending /
+failed / stale row to running with its own `claim_token`); whoever loses
+the claim does nothing. Every later save is conditional on the token, so a
+run that lost its claim (e.g. taken over as stale) stops instead of
+overwriting the new owner's progress.
+
+PostgREST can't hold a transaction across requests, so ordering does that
+job instead: `set_current_week` runs last, after every other stage has
+succeeded. Until then the campaign still reads as "week N" and a retry
+resumes the same run.
+
+Stages whose dependencies are met run concurrently (one thread each).
+`start_rollover_in_background` runs the whole pipeline on a worker thread;
+the `week_rollovers` row doubles as its job record, so any page (or another
+process) can poll progress with `load_rollover`.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils import economy, missions, reputation, snapshots, upkeep
+from utils.executor import error_code
+from utils.infrastructure_effects import clear_effects_snapshot
+from utils.ledger import add_ledger_entry, set_current_week, supports_idempotency_keys
+from utils.schema import get_schema
+
+ROLLOVER_TABLE = "week_rollovers"
+
+# A "running" record not updated for this long is treated as abandoned
+# (e.g. the server restarted mid-run) and may be resumed.
+STALE_AFTER = timedelta(minutes=10)
+
+# Stage status values
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@dataclass
+class RolloverRun:
+    """State of one rollover (week -> week + 1)."""
+
+    week: int
+    status: str = PENDING
+    stages: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    context: Dict[str, Any] = field(default_factory=dict)
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    updated_at: Optional[str] = None
+    claim_token: Optional[str] = None
+
+    @property
+    def next_week(self) -> int:
+        return self.week + 1
+
+    def stage_status(self, name: str) -> str:
+        return str((self.stages.get(name) or {}).get("status") or PENDING)
+
+    def is_complete(self) -> bool:
+        return self.status == DONE
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    label: str
+    deps: Tuple[str, ...]
+    # (sb, run) -> context updates (or None); must not mutate `run`
+    run: Callable[[Any, RolloverRun], Optional[Dict[str, Any]]]
+
+
+# ---------------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------------
+
+def _stage_snapshot(sb, run: RolloverRun) -> Optional[Dict[str, Any]]:
+    # Runs before anything else writes, so re-running it captures the same state.
+    return {"snapshot_bytes": snapshots.save_week_snapshot(sb, run.week)}
+
+
+def _stage_missions(sb, run: RolloverRun) -> Optional[Dict[str, Any]]:
+    if not run.context.get("resolve_missions", True):
+        raise _Skip()
+    resolved = missions.resolve_due_missions(sb, week=run.week)
+    return {"missions_resolved": sum(len(v) for v in resolved.values())}
+
+
+def _already_posted(sb, week: int, category_pattern: str) -> bool:
+    """Legacy guard for ledgers without `idempotency_key` (the week claim keeps
+    runs from racing; this only covers resuming a run that posted then failed)."""
+    if supports_idempotency_keys(sb):
+        return False
+    rows = (
+        sb.table("ledger_entries")
+        .select("id")
+        .eq("week", week)
+        .like("category", category_pattern)
+        .limit(1)
+        .execute()
+        .data
+    )
+    return bool(rows)
+
+
+def _stage_upkeep(sb, run: RolloverRun) -> Optional[Dict[str, Any]]:
+    # Charge for what is owned now, not a cached view of it.
+    clear_effects_snapshot()
+    breakdown = upkeep.compute_upkeep(sb)
+    if not _already_posted(sb, run.week, "upkeep_%"):
+        upkeep.post_upkeep(sb, run.week, breakdown)
+    return {
+        "upkeep": {
+            "by_category": breakdown.by_category,
+            "total": breakdown.total,
+            "unpriced": breakdown.unpriced,
+        }
+    }
+
+
+def _stage_economy(sb, run: RolloverRun) -> Optional[Dict[str, Any]]:
+    summary, per_item = economy.compute_week_economy(sb, run.week)
+    upkeep_total = float((run.context.get("upkeep") or {}).get("total") or 0.0)
+    summary = replace(summary, upkeep_total=upkeep_total)
+    economy.write_week_economy(sb, summary, per_item)
+    return {"summary": asdict(summary)}
+
+
+def _stage_payout(sb, run: RolloverRun) -> Optional[Dict[str, Any]]:
+    summary = run.context.get("summary") or {}
+    manual = float(run.context.get("manual_income") or 0)
+    payout = float(summary.get("player_payout") or 0) + manual
+    if not payout or _already_posted(sb, run.week, "player_payout"):
+        return None
+    add_ledger_entry(
+        sb,
+        week=run.week,
+        direction="in",
+        amount=payout,
+        category="player_payout",
+        note="Player share of taxes",
+        metadata={
+            "gross_value": summary.get("gross_value"),
+            "tax_income": summary.get("tax_income"),
+            "player_payout": summary.get("player_payout"),
+            "manual_adjustment": manual,
+        },
+        idempotency_key=f"payout:{run.week}",
+    )
+    return {"payout": payout}
+
+
+def _stage_close_week(sb, run: RolloverRun) -> Optional[Dict[str, Any]]:
+    sb.table("weeks").update({"closed_at": _now()}).eq("week", run.week).execute()
+    return None
+
+
+def _stage_open_next_week(sb, run: RolloverRun) -> Optional[Dict[str, Any]]:
+    wk = sb.table("weeks").select("week").eq("week", run.next_week).execute().data
+    if not wk:
+        sb.table("weeks").insert({"week": run.next_week, "opened_at": _now()}).execute()
+    return None
+
+
+def _stage_population(sb, run: RolloverRun) -> Optional[Dict[str, Any]]:
+    summary = run.context.get("summary") or {}
+    pop_now = int(summary.get("population") or 450_000)
+    surv = float(summary.get("survival_ratio") or 1.0)
+    pop_next = max(0, int(round(pop_now * surv)))
+    sb.table("population_state").upsert({"week": run.next_week, "population": pop_next}, on_conflict="week").execute()
+    return {"population_next": pop_next}
+
+
+def _stage_reputation(sb, run: RolloverRun) -> Optional[Dict[str, Any]]:
+    return {"reputation_carried": reputation.carry_forward_reputation(sb, run.week, run.next_week)}
+
+
+def _stage_set_current_week(sb, run: RolloverRun) -> Optional[Dict[str, Any]]:
+    set_current_week(sb, run.next_week)
+    return None
+
+
+_WEEK_N = ("missions", "upkeep", "economy", "payout")
+
+STAGES: Tuple[Stage, ...] = (
+    Stage("snapshot", "Snapshot week", (), _stage_snapshot),
+    Stage("missions", "Resolve due missions", ("snapshot",), _stage_missions),
+    Stage("upkeep", "Post upkeep", ("snapshot",), _stage_upkeep),
+    Stage("economy", "Compute economy", ("upkeep",), _stage_economy),
+    Stage("payout", "Post player payout", ("economy",), _stage_payout),
+    Stage("close_week", "Close week", _WEEK_N, _stage_close_week),
+    Stage("open_next_week", "Open next week", ("snapshot",), _stage_open_next_week),
+    Stage("population", "Carry population", ("economy", "open_next_week"), _stage_population),
+    Stage("reputation", "Carry reputation", ("open_next_week",), _stage_reputation),
+    Stage(
+        "set_current_week",
+        "Set current week",
+        ("close_week", "open_next_week", "population", "reputation"),
+        _stage_set_current_week,
+    ),
+)
+STAGE_BY_NAME = {s.name: s for s in STAGES}
+
+
+class _Skip(Exception):
+    """Raised by a stage that has nothing to do for this run."""
+
+
+# ---------------------------------------------------------------------------
+# Run records
+# ---------------------------------------------------------------------------
+
+def _row_to_run(row: Dict[str, Any]) -> RolloverRun:
+    return RolloverRun(
+        week=int(row["week"]),
+        status=str(row.get("status") or PENDING),
+        stages=dict(row.get("stages") or {}),
+        context=dict(row.get("context") or {}),
+        started_at=row.get("started_at"),
+        finished_at=row.get("finished_at"),
+        updated_at=row.get("updated_at"),
+        claim_token=row.get("claim_token"),
+    )
+
+
+def load_rollover(sb, week: int) -> Optional[RolloverRun]:
+    """The recorded rollover for `week`, or None (also when the table is missing)."""
+    try:
+        rows = sb.table(ROLLOVER_TABLE).select("*").eq("week", week).limit(1).execute().data or []
+    except Exception:
+        return None
+    return _row_to_run(rows[0]) if rows else None
+
+
+def _record_payload(run: RolloverRun) -> Dict[str, Any]:
+    return {
+        "status": run.status,
+        "stages": run.stages,
+        "context": run.context,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+        "updated_at": run.updated_at,
+    }
+
+
+def save_rollover(sb, run: RolloverRun) -> bool:
+    """Persist `run`. Returns False if another run has claimed the week since.
+
+    A claimed run only writes while the row still carries its token.
+    """
+    run.updated_at = _now()
+    try:
+        if run.claim_token:
+            rows = (
+                sb.table(ROLLOVER_TABLE)
+                .update(_record_payload(run))
+                .eq("week", run.week)
+                .eq("claim_token", run.claim_token)
+                .execute()
+                .data
+            )
+            return bool(rows)
+        sb.table(ROLLOVER_TABLE).upsert({"week": run.week, **_record_payload(run)}, on_conflict="week").execute()
+    except Exception:
+        # Without the table the rollover still runs; it just can't be resumed.
+        pass
+    return True
+
+
+# Per-process guard; the database claim below covers other processes.
+_claims_lock = threading.Lock()
+_claimed_weeks: Dict[int, str] = {}
+
+
+def _claim_in_db(sb, week: int, token: Optional[str], context: Dict[str, Any]) -> Optional[RolloverRun]:
+    now = _now()
+    fresh = RolloverRun(week=week, status=RUNNING, context=context, started_at=now, updated_at=now, claim_token=token)
+    tokens = {"claim_token": token} if token else {}
+    try:
+        sb.table(ROLLOVER_TABLE).insert({"week": week, **_record_payload(fresh), **tokens}).execute()
+        return fresh
+    except Exception as e:
+        if error_code(e) != "23505":
+            raise
+
+    # The row exists: take it over only if nobody is working on it. Each
+    # update is one statement, so exactly one concurrent claimer wins.
+    claim = {"status": RUNNING, "finished_at": None, "updated_at": now, **tokens}
+    rows = (
+        sb.table(ROLLOVER_TABLE)
+        .update(claim)
+        .eq("week", week)
+        .in_("status", [PENDING, FAILED])
+        .execute()
+        .data
+    )
+    if not rows:
+        stale_before = (datetime.now(timezone.utc) - STALE_AFTER).isoformat()
+        rows = (
+            sb.table(ROLLOVER_TABLE)
+            .update(claim)
+            .eq("week", week)
+            .eq("status", RUNNING)
+            .lt("updated_at", stale_before)
+            .execute()
+            .data
+        )
+    return _row_to_run(rows[0]) if rows else None
+
+
+def claim_rollover(sb, week: int, *, context: Optional[Dict[str, Any]] = None) -> Optional[RolloverRun]:
+    """Atomically take ownership of `week`'s rollover.
+
+    Returns the claimed run (status RUNNING, with its `claim_token`), or None
+    if the week is done or another run holds it. `context` (the options) only
+    applies when no record exists yet. Without the `week_rollovers` table the
+    claim is per-process only; without its `claim_token` column the claim is
+    still atomic but later saves are not fenced.
+    """
+    token = uuid.uuid4().hex if get_schema(sb).has(ROLLOVER_TABLE, "claim_token") else None
+    with _claims_lock:
+        if week in _claimed_weeks:
+            return None
+        try:
+            run = _claim_in_db(sb, week, token, dict(context or {}))
+        except Exception:
+            existing = load_rollover(sb, week)
+            if existing is not None:
+                raise
+            # No rollover table: run unrecorded.
+            run = RolloverRun(week=week, status=RUNNING, context=dict(context or {}), started_at=_now())
+        if run is None:
+            return None
+        _claimed_weeks[week] = token or ""
+        return run
+
+
+def release_rollover(week: int) -> None:
+    """Forget this process's claim on `week` (the DB row keeps its final status)."""
+    with _claims_lock:
+        _claimed_weeks.pop(week, None)
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def run_rollover(
+    sb,
+    week: int,
+    *,
+    manual_income: float = 0.0,
+    resolve_missions: bool = True,
+    max_workers: int = 4,
+    on_progress: Optional[Callable[[RolloverRun], None]] = None,
+    claimed: Optional[RolloverRun] = None,
+) -> RolloverRun:
+    """Advance `week` to `week + 1`, resuming a previous partial run if any.
+
+    Options only apply to a fresh run; a resumed run keeps the options it
+    was started with so half-posted weeks stay consistent.
+    Stage failures are recorded (status "failed" + error) instead of raised.
+    If the week is already done or another run holds it, nothing runs and
+    the current record is returned. `claimed` is a run already obtained from
+    `claim_rollover` (used by the background worker).
+    """
+    run = claimed
+    if run is None:
+        run = claim_rollover(
+            sb,
+            week,
+            context={"manual_income": float(manual_income or 0), "resolve_missions": bool(resolve_missions)},
+        )
+        if run is None:
+            return load_rollover(sb, week) or RolloverRun(week=week, status=RUNNING)
+    try:
+        return _run_claimed(sb, run, max_workers=max_workers, on_progress=on_progress)
+    finally:
+        release_rollover(week)
+
+
+def _run_claimed(
+    sb,
+    run: RolloverRun,
+    *,
+    max_workers: int,
+    on_progress: Optional[Callable[[RolloverRun], None]],
+) -> RolloverRun:
+    run.status = RUNNING
+    run.started_at = run.started_at or _now()
+    run.finished_at = None
+
+    lock = threading.Lock()
+    lost = threading.Event()
+
+    def record(name: str, context: Optional[Dict[str, Any]] = None, **values: Any) -> None:
+        with lock:
+            run.stages[name] = {**(run.stages.get(name) or {}), **values}
+            if context:
+                run.context = {**run.context, **context}
+            if not save_rollover(sb, run):
+                lost.set()
+            if on_progress is not None:
+                on_progress(run)
+
+    def execute(stage: Stage) -> bool:
+        if lost.is_set():
+            return False
+        record(stage.name, status=RUNNING, started_at=_now(), error=None)
+        if lost.is_set():
+            return False
+        t0 = time.perf_counter()
+        updates = None
+        try:
+            updates = stage.run(sb, run)
+            status, error = DONE, None
+        except _Skip:
+            status, error = SKIPPED, None
+        except Exception as e:
+            status, error = FAILED, str(e)
+        record(stage.name, updates, status=status, error=error, duration_ms=round((time.perf_counter() - t0) * 1000, 1))
+        return status != FAILED
+
+    finished = {s.name for s in STAGES if run.stage_status(s.name) in (DONE, SKIPPED)}
+    failed = False
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+        while not failed:
+            ready = [s for s in STAGES if s.name not in finished and all(d in finished for d in s.deps)]
+            if not ready:
+                break
+            results = list(pool.map(execute, ready))
+            for stage, ok in zip(ready, results):
+                if ok:
+                    finished.add(stage.name)
+                else:
+                    failed = True
+
+    if lost.is_set():
+        # Another run owns the week now; leave its record alone.
+        return load_rollover(sb, run.week) or run
+    run.status = FAILED if failed else DONE
+    run.finished_at = _now()
+    with lock:
+        save_rollover(sb, run)
+    clear_effects_snapshot()
+    if on_progress is not None:
+        on_progress(run)
+    return run
+
+
+# ---------------------------------------------------------------------------
+# Background worker
+# ---------------------------------------------------------------------------
+
+# Worker threads started by this process: week -> thread
+_workers_lock = threading.Lock()
+_workers: Dict[int, threading.Thread] = {}
+
+
+def is_stale(run: RolloverRun) -> bool:
+    """True if a running record has stopped reporting progress."""
+    if run.status != RUNNING or not run.updated_at:
+        return False
+    try:
+        updated = datetime.fromisoformat(str(run.updated_at).replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    return datetime.now(timezone.utc) - updated > STALE_AFTER
+
+
+def is_active(run: Optional[RolloverRun]) -> bool:
+    """True while a rollover is being worked on (here or in another process)."""
+    if run is None or run.status != RUNNING:
+        return False
+    with _workers_lock:
+        worker = _workers.get(run.week)
+    return (worker is not None and worker.is_alive()) or not is_stale(run)
+
+
+def _worker(sb, run: RolloverRun) -> None:
+    week = run.week
+    try:
+        run_rollover(sb, week, claimed=run)
+    except Exception as e:
+        failed = load_rollover(sb, week) or RolloverRun(week=week)
+        failed.claim_token = run.claim_token
+        failed.status = FAILED
+        failed.finished_at = _now()
+        failed.context = {**failed.context, "error": str(e)}
+        save_rollover(sb, failed)
+    finally:
+        with _workers_lock:
+            _workers.pop(week, None)
+
+
+def start_rollover_in_background(
+    sb,
+    week: int,
+    *,
+    manual_income: float = 0.0,
+    resolve_missions: bool = True,
+) -> bool:
+    """Start (or resume) the rollover of `week` on a daemon thread.
+
+    The week is claimed (see `claim_rollover`) before the thread starts, so
+    pollers see the running record at once. Checking for a live worker,
+    claiming and starting happen under one lock. Returns False if the week
+    is already done or a rollover for it is active (here or elsewhere).
+    """
+    with _workers_lock:
+        worker = _workers.get(week)
+        if worker is not None and worker.is_alive():
+            return False
+        run = claim_rollover(
+            sb,
+            week,
+            context={"manual_income": float(manual_income or 0), "resolve_missions": bool(resolve_missions)},
+        )
+        if run is None:
+            return False
+        worker = threading.Thread(target=_worker, args=(sb, run), name=f"rollover-week-{week}", daemon=True)
+        _workers[week] = worker
+        try:
+            worker.start()
+        except Exception:
+            _workers.pop(week, None)
+            release_rollover(week)
+            raise
+    return True
@@ -0,0 +1,165 @@
+"""Schema capability registry.
+
+Deployments of this app run different migrations, so several helpers used to
+discover optional columns by trying a query and catching the error, paying
+for the failed round trip on every call. This module inspects the schema
+once per process and answers "does table X have column Y?" from memory.
+
+Sources, in order:
+1. PostgREST's OpenAPI description (`GET /rest/v1/`): every table with its
+   full column list, in one request.
+2. Probing: one `select(col).limit(0)` per optional column in `OPTIONAL_COLUMNS`
+   (used when the OpenAPI endpoint is disabled). Columns that aren't tracked
+   are assumed present. Only "column / table does not exist" answers count
+   as missing; a probe that fails any other way (timeout, 5xx, open circuit
+   breaker) leaves the column assumed present and the registry is re-probed
+   after UNSETTLED_RETRY_SECONDS instead of being cached for good.
+
+Call `refresh_schema()` after running a migration on a live process.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterable, Mapping, Optional
+
+from utils.executor import error_code
+
+# Optional columns the helpers care about (probe mode only).
+OPTIONAL_COLUMNS: Dict[str, tuple] = {
+    "ledger_entries": ("metadata", "meta", "idempotency_key"),
+    "player_progress": ("known_recipes", "discovered_recipes"),
+    "crafting_jobs": (
+        "done",
+        "status",
+        "kind",
+        "recipe_name",
+        "duration_seconds",
+        "started_at",
+        "completes_at",
+        "detail",
+        "result",
+    ),
+    "factions": ("is_hidden",),
+    "week_rollovers": ("claim_token",),
+    "squads": ("is_enemy", "destination", "mission", "status", "deployed_week"),
+    "infrastructure": ("tier", "upkeep", "prereq"),
+    "app_state": ("ui_hidden_pages", "ui_hidden_factions", "ui_hidden_reputations"),
+}
+
+# Error codes meaning "this column (or its table) doesn't exist".
+MISSING_CODES = frozenset({"42703", "PGRST204", "42P01", "PGRST205"})
+
+# A registry built from inconclusive probes is re-checked after this long.
+UNSETTLED_RETRY_SECONDS = 30.0
+
+
+@dataclass(frozen=True)
+class TableInfo:
+    # Columns known to exist. When `complete`, this is the full list.
+    columns: FrozenSet[str] = frozenset()
+    complete: bool = False
+    # Columns known to be missing (probe mode).
+    missing: FrozenSet[str] = frozenset()
+
+    def has(self, column: str) -> bool:
+        if self.complete:
+            return column in self.columns
+        return column not in self.missing
+
+
+@dataclass(frozen=True)
+class SchemaRegistry:
+    tables: Mapping[str, TableInfo] = field(default_factory=dict)
+    # True when `tables` lists every table (OpenAPI); otherwise unknown tables are assumed to exist.
+    complete: bool = False
+    source: str = "probe"
+    # False when some probe failed for a reason other than a missing column.
+    settled: bool = True
+
+    def has_table(self, table: str) -> bool:
+        return table in self.tables or not self.complete
+
+    def has(self, table: str, column: str) -> bool:
+        info = self.tables.get(table)
+        if info is None:
+            return not self.complete
+        return info.has(column)
+
+    def select_list(self, table: str, columns: Iterable[str]) -> str:
+        """Comma-separated select of the given columns that exist."""
+        return ",".join(c for c in columns if self.has(table, c))
+
+    def pick(self, table: str, payload: Mapping[str, Any]) -> Dict[str, Any]:
+        """Payload without the keys the table doesn't have."""
+        return {k: v for k, v in payload.items() if self.has(table, k)}
+
+
+def _from_openapi(sb) -> Optional[SchemaRegistry]:
+    try:
+        session = sb.postgrest.session
+        res = session.get("/", headers={"Accept": "application/openapi+json"})
+        res.raise_for_status()
+        definitions = (res.json() or {}).get("definitions") or {}
+    except Exception:
+        return None
+    if not definitions:
+        return None
+    tables = {
+        name: TableInfo(columns=frozenset((spec or {}).get("properties") or {}), complete=True)
+        for name, spec in definitions.items()
+    }
+    return SchemaRegistry(tables=tables, complete=True, source="openapi")
+
+
+def _column_exists(sb, table: str, column: str) -> Optional[bool]:
+    """True / False, or None when the probe itself failed (transient error)."""
+    try:
+        sb.table(table).select(column).limit(0).execute()
+        return True
+    except Exception as e:
+        return False if error_code(e) in MISSING_CODES else None
+
+
+def _from_probes(sb) -> SchemaRegistry:
+    tables: Dict[str, TableInfo] = {}
+    settled = True
+    for table, optional in OPTIONAL_COLUMNS.items():
+        found = {c: _column_exists(sb, table, c) for c in optional}
+        settled = settled and None not in found.values()
+        # Inconclusive probes: assume present rather than disable the feature.
+        missing = frozenset(c for c, ok in found.items() if ok is False)
+        tables[table] = TableInfo(columns=frozenset(set(optional) - missing), missing=missing)
+    return SchemaRegistry(tables=tables, complete=False, source="probe", settled=settled)
+
+
+_lock = threading.Lock()
+_registry: Optional[SchemaRegistry] = None
+# monotonic time after which an unsettled registry is inspected again
+_retry_at: Optional[float] = None
+
+
+def _fresh() -> bool:
+    return _registry is not None and (_retry_at is None or time.monotonic() < _retry_at)
+
+
+def get_schema(sb) -> SchemaRegistry:
+    """The process-wide registry (inspected on first use)."""
+    global _registry, _retry_at
+    if _fresh():
+        return _registry
+    with _lock:
+        if not _fresh():
+            _registry = _from_openapi(sb) or _from_probes(sb)
+            _retry_at = None if _registry.settled else time.monotonic() + UNSETTLED_RETRY_SECONDS
+        return _registry
+
+
+def refresh_schema() -> None:
+    """Forget the registry; the next `get_schema` inspects again."""
+    global _registry, _retry_at
+    with _lock:
+        _registry = None
+        _retry_at = None
@@ -0,0 +1,282 @@
+"""Week snapshots for whole-week rollback.
+
+The first stage of every rollover (see `utils.rollover`) captures the state
+that Advance Week is about to change, as one zlib-compressed JSON blob in
+`week_snapshots`:
+
+- week-scoped rows of that week: ledger entries, economy output/summary,
+  population, reputation
+- mission rows Advance Week (or a later week) can change: active ones (the
+  rollover resolves the due ones) and those dispatched in that week or later
+- current-state tables changed by purchases whose ledger rows the restore
+  removes: rosters, squads and members, owned infrastructure, equipment
+  inventory (one row per unit/item, so they don't grow with the campaign)
+
+`restore_week_snapshot` puts the campaign back to the start of that week's
+rollover with a few bulk operations per table (delete later weeks, re-insert
+the captured rows), then moves the current-week pointer back. Undo entries
+(`action_logs`) logged after the snapshot are dropped: the actions they would
+undo are already reverted.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.infrastructure_effects import clear_effects_snapshot
+from utils.ledger import set_current_week
+from utils.power_index import clear_power_index
+from utils.reputation import clear_reputation_history
+from utils.visibility import clear_visibility
+
+SNAPSHOT_TABLE = "week_snapshots"
+SNAPSHOT_FORMAT = "json+zlib+b64/v1"
+
+# Tables keyed by week: the snapshot keeps the rows of its own week; restore
+# drops that week and everything after it, then re-inserts the kept rows.
+WEEK_TABLES = (
+    "ledger_entries",
+    "economy_week_output",
+    "economy_week_summary",
+    "population_state",
+    "reputation",
+)
+
+# Tables without a week key: captured whole, restored by primary key.
+FULL_TABLES = (
+    "moonblade_roster",
+    "diplomacy_roster",
+    "dawnbreakers_roster",
+    "squads",
+    "squad_members",
+    "infrastructure_owned",
+    "equipment_inventory",
+)
+
+# Mission history only grows: the snapshot keeps active rows and rows of its
+# week or later; restore upserts those and deletes later rows it doesn't know.
+# Missions resolved before the snapshot are never touched.
+MISSION_TABLES = ("diplomacy_missions", "intelligence_missions")
+
+# Primary key per table (default "id"); pages are ordered by it so range()
+# paging is stable.
+TABLE_KEYS = {
+    "economy_week_output": ("week", "item_name"),
+    "economy_week_summary": ("week",),
+    "population_state": ("week",),
+    "infrastructure_owned": ("infrastructure_id",),
+}
+
+_PAGE_SIZE = 1000
+_CHUNK = 200
+
+
+def _key(table: str) -> Tuple[str, ...]:
+    return TABLE_KEYS.get(table, ("id",))
+
+
+def _select_all(
+    sb,
+    table: str,
+    week: Optional[int] = None,
+    columns: str = "*",
+    *,
+    or_filter: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        q = sb.table(table).select(columns)
+        if week is not None:
+            q = q.eq("week", week)
+        if or_filter is not None:
+            q = q.or_(or_filter)
+        for column in _key(table):
+            q = q.order(column)
+        page = q.range(start, start + _PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < _PAGE_SIZE:
+            return rows
+        start += _PAGE_SIZE
+
+
+def _encode(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.b64encode(zlib.compress(raw, 9)).decode("ascii")
+
+
+def _decode(blob: str) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(base64.b64decode(blob)).decode("utf-8"))
+
+
+def capture_week_snapshot(sb, week: int) -> Dict[str, Any]:
+    """Read the tables Advance Week touches. Missing tables are left out."""
+    tables: Dict[str, List[Dict[str, Any]]] = {}
+    for table in WEEK_TABLES:
+        try:
+            tables[table] = _select_all(sb, table, week)
+        except Exception:
+            continue
+    for table in FULL_TABLES:
+        try:
+            tables[table] = _select_all(sb, table)
+        except Exception:
+            continue
+    for table in MISSION_TABLES:
+        try:
+            tables[table] = _select_all(sb, table, or_filter=f"status.eq.active,week.gte.{int(week)}")
+        except Exception:
+            continue
+    return {"week": int(week), "tables": tables, "last_action_at": _last_action_at(sb)}
+
+
+def _last_action_at(sb) -> Optional[str]:
+    """created_at of the newest undo entry (database clock), None if there is none."""
+    try:
+        rows = sb.table("action_logs").select("created_at").order("created_at", desc=True).limit(1).execute().data
+    except Exception:
+        return None
+    return rows[0]["created_at"] if rows else None
+
+
+def _drop_later_actions(sb, snap: Dict[str, Any]) -> None:
+    """Delete undo entries logged after the snapshot was taken.
+
+    Older blobs without `last_action_at` fall back to the snapshot row's
+    `created_at`.
+    """
+    cutoff = snap["last_action_at"] if "last_action_at" in snap else snap.get("created_at")
+    sb.table("action_logs").delete().gt("created_at", cutoff or "1970-01-01T00:00:00+00:00").execute()
+
+
+def save_week_snapshot(sb, week: int) -> int:
+    """Capture and store the snapshot for `week`. Returns the blob size in bytes."""
+    blob = _encode(capture_week_snapshot(sb, week))
+    sb.table(SNAPSHOT_TABLE).upsert(
+        {
+            "week": int(week),
+            "format": SNAPSHOT_FORMAT,
+            "size_bytes": len(blob),
+            "blob": blob,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        },
+        on_conflict="week",
+    ).execute()
+    return len(blob)
+
+
+def list_week_snapshots(sb) -> List[Dict[str, Any]]:
+    """Stored snapshots, newest week first (without the blob)."""
+    try:
+        return (
+            sb.table(SNAPSHOT_TABLE)
+            .select("week,format,size_bytes,created_at")
+            .order("week", desc=True)
+            .execute()
+            .data
+            or []
+        )
+    except Exception:
+        return []
+
+
+def load_week_snapshot(sb, week: int) -> Optional[Dict[str, Any]]:
+    rows = sb.table(SNAPSHOT_TABLE).select("format,blob,created_at").eq("week", week).limit(1).execute().data or []
+    if not rows:
+        return None
+    if rows[0].get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format: {rows[0].get('format')}")
+    snap = _decode(rows[0]["blob"])
+    snap.setdefault("created_at", rows[0].get("created_at"))
+    return snap
+
+
+def _insert_chunked(sb, table: str, rows: List[Dict[str, Any]], *, upsert: bool = False) -> None:
+    for i in range(0, len(rows), _CHUNK):
+        chunk = rows[i : i + _CHUNK]
+        if upsert:
+            sb.table(table).upsert(chunk, on_conflict=",".join(_key(table))).execute()
+        else:
+            sb.table(table).insert(chunk).execute()
+
+
+def _restore_full_table(sb, table: str, rows: List[Dict[str, Any]]) -> None:
+    # Full tables have single-column keys (multi-column keys are week tables).
+    (key,) = _key(table)
+    keep = {r[key] for r in rows}
+    current = [r[key] for r in _select_all(sb, table, columns=key)]
+    extra = [i for i in current if i not in keep]
+    for i in range(0, len(extra), _CHUNK):
+        sb.table(table).delete().in_(key, extra[i : i + _CHUNK]).execute()
+    _insert_chunked(sb, table, rows, upsert=True)
+
+
+def _restore_mission_table(sb, table: str, week: int, rows: List[Dict[str, Any]]) -> None:
+    keep = {r["id"] for r in rows}
+    later = [r["id"] for r in _select_all(sb, table, columns="id", or_filter=f"week.gte.{int(week)}")]
+    extra = [i for i in later if i not in keep]
+    for i in range(0, len(extra), _CHUNK):
+        sb.table(table).delete().in_("id", extra[i : i + _CHUNK]).execute()
+    _insert_chunked(sb, table, rows, upsert=True)
+
+
+def restore_week_snapshot(sb, week: int) -> Dict[str, int]:
+    """Roll the campaign back to the start of `week`'s rollover.
+
+    Later weeks, rollover records and snapshots are removed. Purchases made
+    since (ledger rows of this week and later) are undone together with what
+    they bought: owned infrastructure and equipment go back to the snapshot,
+    and their undo entries are deleted so "Undo last" can't refund them again.
+    Returns {table: rows restored}.
+    """
+    snap = load_week_snapshot(sb, week)
+    if snap is None:
+        raise ValueError(f"No snapshot stored for week {week}")
+    tables: Dict[str, List[Dict[str, Any]]] = snap.get("tables") or {}
+    restored: Dict[str, int] = {}
+
+    # Parents before children (squad_members references squads).
+    for table in FULL_TABLES:
+        if table in tables:
+            _restore_full_table(sb, table, tables[table])
+            restored[table] = len(tables[table])
+
+    for table in MISSION_TABLES:
+        if table in tables:
+            _restore_mission_table(sb, table, week, tables[table])
+            restored[table] = len(tables[table])
+
+    for table in WEEK_TABLES:
+        if table not in tables:
+            continue
+        sb.table(table).delete().gte("week", week).execute()
+        _insert_chunked(sb, table, tables[table])
+        restored[table] = len(tables[table])
+
+    sb.table("weeks").delete().gt("week", week).execute()
+    sb.table("weeks").update({"closed_at": None}).eq("week", week).execute()
+    for table in ("week_rollovers", SNAPSHOT_TABLE):
+        try:
+            sb.table(table).delete().gt("week", week).execute()
+        except Exception:
+            pass
+    try:
+        sb.table("week_rollovers").delete().eq("week", week).execute()
+    except Exception:
+        pass
+
+    _drop_later_actions(sb, snap)
+
+    set_current_week(sb, week)
+    clear_reputation_history()
+    clear_effects_snapshot()
+    clear_power_index()
+    clear_visibility()
+    invalidate = getattr(sb, "invalidate", None)
+    if invalidate is not None:
+        invalidate()
+    return restored
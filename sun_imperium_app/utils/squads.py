@@ -9,14 +9,21 @@ This app has been deployed against multiple Supabase schema variants for
 - some have no surrogate `id` column
 
 PostgREST fails hard when selecting/filtering a missing column, so these
-helpers probe capabilities and then use only safe column sets.
+helpers probe capabilities and then use only safe column sets. The probe
+result is cached per process (see `detect_member_caps`).
 """
 
 from __future__ import annotations
 
+import threading
+import time
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 
+from utils import executor
+from utils.schema import MISSING_CODES
+from utils.undo import log_action
+
 
 @dataclass(frozen=True)
 class SquadMemberCaps:
@@ -26,25 +33,88 @@ class SquadMemberCaps:
 
 def _safe_exec(q):
     """Execute a postgrest query and return data list (or raise)."""
-    return (q.execute().data or [])
+    return executor.execute(q).data or []
 
 
-def detect_member_caps(sb) -> SquadMemberCaps:
-    """Detect whether squad_members has unit_id and/or unit_type columns."""
-    # Try selecting unit_id
-    has_unit_id = True
-    try:
-        _safe_exec(sb.table("squad_members").select("unit_id").limit(1))
-    except Exception:
-        has_unit_id = False
+# "function does not exist" (PostgREST schema cache / Postgres)
+MISSING_FUNCTION_CODES = frozenset({"PGRST202", "42883"})
+
 
-    has_unit_type = True
+# Process-level cache of the probe result: (detected_at_monotonic, caps)
+CAPS_TTL_SECONDS = 15 * 60
+_caps_lock = threading.Lock()
+_caps_cache: Optional[Tuple[float, SquadMemberCaps]] = None
+
+
+def _has_member_column(sb, column: str) -> Optional[bool]:
+    """True / False, or None if the probe failed for another reason (not cached)."""
     try:
-        _safe_exec(sb.table("squad_members").select("unit_type").limit(1))
-    except Exception:
-        has_unit_type = False
+        _safe_exec(sb.table("squad_members").select(column).limit(1))
+        return True
+    except Exception as e:
+        return False if executor.error_code(e) in MISSING_CODES else None
+
 
-    return SquadMemberCaps(has_unit_id=has_unit_id, has_unit_type=has_unit_type)
+def _probe_member_caps(sb) -> Tuple[SquadMemberCaps, bool]:
+    """(caps, conclusive). Inconclusive probes assume the column exists."""
+    has_unit_id = _has_member_column(sb, "unit_id")
+    has_unit_type = _has_member_column(sb, "unit_type")
+    caps = SquadMemberCaps(has_unit_id=has_unit_id is not False, has_unit_type=has_unit_type is not False)
+    return caps, None not in (has_unit_id, has_unit_type)
+
+
+def detect_member_caps(sb, *, refresh: bool = False) -> SquadMemberCaps:
+    """Detect whether squad_members has unit_id and/or unit_type columns.
+
+    Probes once per process and reuses the result for CAPS_TTL_SECONDS.
+    Only "column does not exist" errors count as missing; if a probe fails
+    any other way (timeout, 5xx, open breaker) the result isn't cached.
+    Pass refresh=True (or call reset_member_caps) after a schema migration.
+    """
+    global _caps_cache
+    now = time.monotonic()
+    with _caps_lock:
+        if not refresh and _caps_cache is not None and (now - _caps_cache[0]) < CAPS_TTL_SECONDS:
+            return _caps_cache[1]
+
+    caps, conclusive = _probe_member_caps(sb)
+    if conclusive:
+        with _caps_lock:
+            _caps_cache = (now, caps)
+    return caps
+
+
+def reset_member_caps() -> None:
+    """Forget the cached squad_members capabilities (next call re-probes)."""
+    global _caps_cache
+    with _caps_lock:
+        _caps_cache = None
+
+
+def _member_columns(caps: SquadMemberCaps) -> Optional[str]:
+    """Safe select list for squad_members under the detected schema."""
+    if caps.has_unit_id and caps.has_unit_type:
+        return "unit_id,unit_type,quantity"
+    if caps.has_unit_id:
+        return "unit_id,quantity"
+    if caps.has_unit_type:
+        return "unit_type,quantity"
+    # extremely broken schema, but don't crash UI
+    return None
+
+
+def _normalize_members(
+    rows: List[Dict[str, Any]],
+    unit_type_by_id: Optional[Dict[Any, str]] = None,
+) -> List[Dict[str, Any]]:
+    for r in rows:
+        r["quantity"] = int(r.get("quantity") or 0)
+        if "unit_type" not in r or not r.get("unit_type"):
+            if unit_type_by_id and r.get("unit_id") in unit_type_by_id:
+                r["unit_type"] = unit_type_by_id.get(r.get("unit_id")) or "Other"
+        if r.get("unit_type") is None:
+            r["unit_type"] = "Other"
+    return rows
 
 
 def fetch_members(
@@ -59,46 +129,53 @@ def fetch_members(
     Never assumes an `id` column exists.
     """
     caps = _caps or detect_member_caps(sb)
+    cols = _member_columns(caps)
+    rows = _safe_exec(sb.table("squad_members").select(cols).eq("squad_id", squad_id)) if cols else []
+    return _normalize_members(rows, unit_type_by_id), caps
 
-    if caps.has_unit_id and caps.has_unit_type:
-        rows = _safe_exec(
-            sb.table("squad_members")
-            .select("unit_id,unit_type,quantity")
-            .eq("squad_id", squad_id)
-        )
-    elif caps.has_unit_id:
-        rows = _safe_exec(
-            sb.table("squad_members")
-            .select("unit_id,quantity")
-            .eq("squad_id", squad_id)
-        )
-    elif caps.has_unit_type:
-        rows = _safe_exec(
-            sb.table("squad_members")
-            .select("unit_type,quantity")
-            .eq("squad_id", squad_id)
-        )
+
+# Max ids per in_() filter, keeps the PostgREST URL a sane length.
+_IN_CHUNK = 200
+
+
+def fetch_members_for_squads(
+    sb,
+    squad_ids: Optional[List[Any]] = None,
+    unit_type_by_id: Optional[Dict[Any, str]] = None,
+    _caps: Optional[SquadMemberCaps] = None,
+) -> Dict[Any, List[Dict[str, Any]]]:
+    """Fetch members for many squads in one query (per 200 ids).
+
+    squad_ids=None loads every squad's members. Returns {squad_id: rows},
+    with rows normalized like fetch_members; requested squads without
+    members map to [].
+    """
+    caps = _caps or detect_member_caps(sb)
+    cols = _member_columns(caps)
+
+    out: Dict[Any, List[Dict[str, Any]]] = {sid: [] for sid in (squad_ids or [])}
+    if not cols or squad_ids == []:
+        return out
+
+    select = f"squad_id,{cols}"
+    if squad_ids is None:
+        rows = _safe_exec(sb.table("squad_members").select(select))
     else:
-        # extremely broken schema, but don't crash UI
+        ids = list(dict.fromkeys(squad_ids))
         rows = []
+        for i in range(0, len(ids), _IN_CHUNK):
+            rows.extend(_safe_exec(sb.table("squad_members").select(select).in_("squad_id", ids[i : i + _IN_CHUNK])))
 
-    # normalize
-    for r in rows:
-        r["quantity"] = int(r.get("quantity") or 0)
-        if "unit_type" not in r or not r.get("unit_type"):
-            if unit_type_by_id and r.get("unit_id") in unit_type_by_id:
-                r["unit_type"] = unit_type_by_id.get(r.get("unit_id")) or "Other"
-        if r.get("unit_type") is None:
-            r["unit_type"] = "Other"
-
-    return rows, caps
+    for r in _normalize_members(rows, unit_type_by_id):
+        out.setdefault(r.pop("squad_id", None), []).append(r)
+    return out
 
 
 def upsert_member_quantity(
     sb,
     squad_id,
     quantity: int,
-    caps: SquadMemberCaps,
+    caps: Optional[SquadMemberCaps] = None,
     *,
     unit_id: Any = None,
     unit_type: Optional[str] = None,
@@ -106,8 +183,9 @@ def upsert_member_quantity(
     """Set quantity for a single member key.
 
     Uses (squad_id, unit_id) when available, else (squad_id, unit_type).
-    Never uses id.
+    Never uses id. caps defaults to the cached detect_member_caps result.
     """
+    caps = caps or detect_member_caps(sb)
     quantity = int(quantity)
     if quantity < 0:
         quantity = 0
@@ -150,12 +228,13 @@ def add_member_quantity(
     sb,
     squad_id,
     add_qty: int,
-    caps: SquadMemberCaps,
+    caps: Optional[SquadMemberCaps] = None,
     *,
     unit_id: Any = None,
     unit_type: Optional[str] = None,
 ) -> None:
     """Increase member quantity by add_qty (creates row if missing)."""
+    caps = caps or detect_member_caps(sb)
     add_qty = int(add_qty)
     if add_qty <= 0:
         return
@@ -189,21 +268,213 @@ def bulk_add_members(
     sb,
     squad_id,
     adds: List[Dict[str, Any]],
-    caps: SquadMemberCaps,
+    caps: Optional[SquadMemberCaps] = None,
 ) -> None:
-    """Bulk add quantities.
+    """Bulk add quantities (set-based).
 
     Each item in adds: {unit_id?, unit_type?, qty}
+
+    Reads the current quantities of every affected key in one select per
+    key kind, merges the additions in memory (duplicate keys are summed) and
+    writes back through set_member_quantities (one upsert per schema variant).
     """
-    for a in adds:
+    caps = caps or detect_member_caps(sb)
+
+    # Merge additions per member key
+    by_unit_id: Dict[Any, Dict[str, Any]] = {}
+    by_unit_type: Dict[str, Dict[str, Any]] = {}
+    for a in adds or []:
         qty = int(a.get("qty") or 0)
         if qty <= 0:
             continue
-        add_member_quantity(
+        unit_id = a.get("unit_id")
+        unit_type = a.get("unit_type")
+        if caps.has_unit_id and unit_id is not None:
+            cur = by_unit_id.setdefault(unit_id, {"unit_id": unit_id, "unit_type": unit_type, "qty": 0})
+            cur["qty"] += qty
+            cur["unit_type"] = cur.get("unit_type") or unit_type
+        elif caps.has_unit_type and unit_type:
+            cur = by_unit_type.setdefault(unit_type, {"unit_type": unit_type, "qty": 0})
+            cur["qty"] += qty
+
+    if not by_unit_id and not by_unit_type:
+        return
+
+    # Current quantities for all affected keys
+    existing_by_id: Dict[Any, int] = {}
+    if by_unit_id:
+        rows = _safe_exec(
+            sb.table("squad_members")
+            .select("unit_id,quantity")
+            .eq("squad_id", squad_id)
+            .in_("unit_id", list(by_unit_id.keys()))
+        )
+        for r in rows:
+            existing_by_id.setdefault(r.get("unit_id"), int(r.get("quantity") or 0))
+
+    existing_by_type: Dict[str, int] = {}
+    if by_unit_type:
+        rows = _safe_exec(
+            sb.table("squad_members")
+            .select("unit_type,quantity")
+            .eq("squad_id", squad_id)
+            .in_("unit_type", list(by_unit_type.keys()))
+        )
+        for r in rows:
+            existing_by_type.setdefault(r.get("unit_type"), int(r.get("quantity") or 0))
+
+    updates: List[Tuple[Dict[str, Any], int]] = []
+    for unit_id, a in by_unit_id.items():
+        cur = existing_by_id.get(unit_id, 0)
+        updates.append(({"unit_id": unit_id, "unit_type": a.get("unit_type"), "quantity": cur}, cur + a["qty"]))
+    for unit_type, a in by_unit_type.items():
+        cur = existing_by_type.get(unit_type, 0)
+        updates.append(({"unit_type": unit_type, "quantity": cur}, cur + a["qty"]))
+
+    set_member_quantities(sb, squad_id, updates, caps)
+
+
+def _member_key_payload(
+    squad_id,
+    row: Dict[str, Any],
+    quantity: int,
+    caps: SquadMemberCaps,
+) -> Optional[Dict[str, Any]]:
+    """Payload for one member key (unit_id preferred, else unit_type)."""
+    quantity = max(0, int(quantity))
+    unit_id = row.get("unit_id")
+    unit_type = row.get("unit_type")
+    if caps.has_unit_id and unit_id is not None:
+        payload: Dict[str, Any] = {"squad_id": squad_id, "unit_id": unit_id, "quantity": quantity}
+        if caps.has_unit_type:
+            # Bulk upserts need identical keys on every row (and unit_type is NOT NULL in v1).
+            payload["unit_type"] = unit_type or "Other"
+        return payload
+    if caps.has_unit_type and unit_type:
+        payload = {"squad_id": squad_id, "unit_type": unit_type, "quantity": quantity}
+        if caps.has_unit_id:
+            # Conflict target idx_squad_members_squad_type (squad_id, unit_type, unit_id) NULLS NOT DISTINCT
+            payload["unit_id"] = None
+        return payload
+    return None
+
+
+def set_member_quantities(
+    sb,
+    squad_id,
+    updates: List[Tuple[Dict[str, Any], int]],
+    caps: SquadMemberCaps,
+) -> None:
+    """Set many member quantities for one squad.
+
+    updates: [(member_row, new_quantity)] as returned by
+    utils.war.redistribute_remaining. Unchanged rows are skipped.
+
+    Uses one upsert per key kind: (squad_id, unit_id) for unit rows, and
+    (squad_id, unit_type, unit_id) for unit_type-only rows (both unique
+    indexes are in sql/schema_v1.sql; schemas without a unit_id column need
+    a unique index on (squad_id, unit_type)). Falls back to per-row writes if
+    the index is missing.
+    """
+    changed = [
+        (row, int(q))
+        for row, q in updates
+        if max(0, int(q)) != int(row.get("quantity") or 0)
+    ]
+    if not changed:
+        return
+
+    payloads = [p for p in (_member_key_payload(squad_id, row, q, caps) for row, q in changed) if p]
+    by_conflict: Dict[str, List[Dict[str, Any]]] = {}
+    for p in payloads:
+        if p.get("unit_id") is not None:
+            key = "squad_id,unit_id"
+        elif "unit_id" in p:
+            key = "squad_id,unit_type,unit_id"
+        else:
+            key = "squad_id,unit_type"
+        by_conflict.setdefault(key, []).append(p)
+
+    try:
+        for on_conflict, rows in by_conflict.items():
+            sb.table("squad_members").upsert(rows, on_conflict=on_conflict).execute()
+        return
+    except Exception:
+        pass
+
+    for row, q in changed:
+        upsert_member_quantity(
             sb,
             squad_id,
-            qty,
+            q,
             caps,
-            unit_id=a.get("unit_id"),
-            unit_type=a.get("unit_type"),
+            unit_id=row.get("unit_id"),
+            unit_type=row.get("unit_type"),
         )
+
+
+def apply_battle_results(
+    sb,
+    *,
+    squad_updates: List[Tuple[Any, List[Tuple[Dict[str, Any], int]]]],
+    caps_by_squad: Dict[Any, SquadMemberCaps],
+    war_row: Dict[str, Any],
+    undo: Dict[str, Any],
+) -> None:
+    """Persist casualties, the `wars` row and the undo log together.
+
+    squad_updates: [(squad_id, [(member_row, new_quantity), ...]), ...]
+    undo: {"category", "action", "payload"} for action_logs.
+
+    Preferred path is the `apply_war_result` SQL function (sql/schema_v1.sql),
+    which writes everything in one round trip and one transaction. Only
+    databases without the function (PGRST202 / 42883) fall back to one bulk
+    upsert per squad plus the two inserts; any other RPC error is raised, since
+    the function may already have committed and the fallback would apply the
+    casualties and log the war twice.
+    """
+    members: List[Dict[str, Any]] = []
+    for squad_id, updates in squad_updates:
+        for row, q in updates:
+            if max(0, int(q)) == int(row.get("quantity") or 0):
+                continue
+            members.append(
+                {
+                    "squad_id": squad_id,
+                    "unit_id": row.get("unit_id"),
+                    "unit_type": row.get("unit_type"),
+                    "quantity": max(0, int(q)),
+                }
+            )
+
+    try:
+        sb.rpc(
+            "apply_war_result",
+            {"p_members": members, "p_war": war_row, "p_undo": undo},
+        ).execute()
+        return
+    except Exception as e:
+        if executor.error_code(e) not in MISSING_FUNCTION_CODES:
+            raise
+
+    for squad_id, updates in squad_updates:
+        set_member_quantities(sb, squad_id, updates, caps_by_squad[squad_id])
+
+    # War log (best-effort across schema variants)
+    try:
+        sb.table("wars").insert(war_row).execute()
+    except Exception:
+        # older schema used enemy_force
+        try:
+            war_row2 = dict(war_row)
+            war_row2["enemy_force"] = war_row2.pop("enemy")
+            sb.table("wars").insert(war_row2).execute()
+        except Exception:
+            pass
+
+    log_action(
+        sb,
+        category=undo.get("category"),
+        action=undo.get("action"),
+        payload=undo.get("payload") or {},
+    )
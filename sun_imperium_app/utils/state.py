@@ -1,57 +1,91 @@
 # sun_imperium_app/utils/state.py
+import threading
 import time
-import httpx
 from datetime import datetime, timezone
 
-def _execute_with_retry(req, tries: int = 4, base_sleep: float = 0.6):
-    last = None
-    for i in range(tries):
-        try:
-            return req.execute()
-        except (httpx.ReadError, httpx.ConnectError, httpx.RemoteProtocolError) as e:
-            last = e
-            time.sleep(base_sleep * (2 ** i))
-        except Exception as e:
-            msg = str(e).lower()
-            if "resource temporarily unavailable" in msg or "readerror" in msg:
-                last = e
-                time.sleep(base_sleep * (2 ** i))
-            else:
-                raise
-    raise last
+from utils import executor
+
+def _execute_with_retry(req, tries: int = 4):
+    return executor.execute(req, tries=tries)
+
+# Bootstrap runs once per process; after that pages only read the cached week.
+_bootstrap_lock = threading.Lock()
+_bootstrapped = False
+
+# Current week cache: (version, week, fetched_at_monotonic). `remember_current_week`
+# bumps the version, so a slow read that started before an Advance Week can't
+# overwrite the newer value. Other processes catch up after WEEK_TTL_SECONDS.
+WEEK_TTL_SECONDS = 30.0
+_week_lock = threading.Lock()
+_week_version = 0
+_week_cache = None
+
 
 def ensure_bootstrap(sb):
-    res = _execute_with_retry(
-        sb.table("app_state").select("current_week").eq("id", 1)
-    )
-    data = res.data or []
-    if not data:
-        _execute_with_retry(
-            sb.table("app_state").insert({"id": 1, "current_week": 1})
+    """Make sure app_state(id=1) and the current week row exist (once per process)."""
+    global _bootstrapped
+    if _bootstrapped:
+        return get_current_week(sb)
+
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return get_current_week(sb)
+
+        res = _execute_with_retry(
+            sb.table("app_state").select("current_week").eq("id", 1)
         )
-        current_week = 1
-    else:
-        current_week = int(data[0]["current_week"])
+        data = res.data or []
+        if not data:
+            _execute_with_retry(
+                sb.table("app_state").insert({"id": 1, "current_week": 1})
+            )
+            current_week = 1
+        else:
+            current_week = int(data[0]["current_week"])
 
-    w = _execute_with_retry(
-        sb.table("weeks").select("week").eq("week", current_week)
-    )
-    if not w.data:
-        _execute_with_retry(
-            sb.table("weeks").insert({
-                "week": current_week,
-                # PostgREST requires JSON-serializable values
-                "opened_at": datetime.now(timezone.utc).isoformat()
-            })
+        w = _execute_with_retry(
+            sb.table("weeks").select("week").eq("week", current_week)
         )
+        if not w.data:
+            _execute_with_retry(
+                sb.table("weeks").insert({
+                    "week": current_week,
+                    # PostgREST requires JSON-serializable values
+                    "opened_at": datetime.now(timezone.utc).isoformat()
+                })
+            )
 
-    return current_week
+        remember_current_week(current_week)
+        _bootstrapped = True
+        return current_week
+
+def remember_current_week(week: int) -> None:
+    """Record a known current week (called by set_current_week / bootstrap)."""
+    global _week_version, _week_cache
+    with _week_lock:
+        _week_version += 1
+        _week_cache = (_week_version, int(week), time.monotonic())
+
+def get_current_week(sb, *, refresh: bool = False) -> int:
+    global _week_cache
+    with _week_lock:
+        cached = _week_cache
+        version = _week_version
+    if cached and not refresh and time.monotonic() - cached[2] <= WEEK_TTL_SECONDS:
+        return cached[1]
 
-def get_current_week(sb) -> int:
     res = _execute_with_retry(
         sb.table("app_state").select("current_week").eq("id", 1)
     )
-    return int(res.data[0]["current_week"])
+    week = int(res.data[0]["current_week"])
+
+    with _week_lock:
+        if _week_version == version:
+            _week_cache = (version, week, time.monotonic())
+        else:
+            # Someone set the week while we were reading; theirs is newer.
+            week = _week_cache[1]
+    return week
 
 def advance_week_pointer(sb):
     res = _execute_with_retry(
@@ -76,5 +110,6 @@ def advance_week_pointer(sb):
     _execute_with_retry(
         sb.table("app_state").update({"current_week": nxt}).eq("id", 1)
     )
+    remember_current_week(nxt)
 
     return nxt
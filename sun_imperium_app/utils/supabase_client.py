@@ -1,13 +1,45 @@
 from __future__ import annotations
 
+import os
+
 import streamlit as st
 from supabase import create_client, Client
 
+from utils.query_cache import CachingClient
+
+
+def _setting(name: str, default=None):
+    """Streamlit secret, else environment variable."""
+    try:
+        value = st.secrets.get(name)
+    except Exception:
+        value = None
+    return value if value not in (None, "") else os.environ.get(name, default)
+
 
 @st.cache_resource
 def get_supabase() -> Client:
+    """Shared client; identical reads within a rerun (and for a few seconds
+    across reruns) are coalesced, writes invalidate the table's cached reads.
+
+    With `SUPABASE_BACKEND = "memory"` the app runs offline against an
+    in-memory store seeded from sql/schema_v1.sql and generated fixtures
+    (see utils/memory_backend.py); `MEMORY_SEED`, `MEMORY_SCALE` and
+    `MEMORY_LATENCY_MS` tune it for benchmarks.
+    """
+    if str(_setting("SUPABASE_BACKEND", "")).lower() == "memory":
+        from utils.memory_backend import create_memory_client
+
+        return CachingClient(
+            create_memory_client(
+                seed=int(_setting("MEMORY_SEED", 0)),
+                scale=int(_setting("MEMORY_SCALE", 1)),
+                latency_ms=float(_setting("MEMORY_LATENCY_MS", 0)),
+            )
+        )
+
     url = st.secrets.get("SUPABASE_URL")
     key = st.secrets.get("SUPABASE_ANON_KEY")
     if not url or not key:
         raise RuntimeError("Missing SUPABASE_URL or SUPABASE_ANON_KEY in Streamlit secrets.")
-    return create_client(url, key)
+    return CachingClient(create_client(url, key))
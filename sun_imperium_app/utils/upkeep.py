@@ -0,0 +1,148 @@
+"""Weekly upkeep engine.
+
+Totals upkeep for everything the players maintain, using a handful of bulk
+reads (no per-unit queries):
+- Moonblade units: roster + members of friendly squads (assigning a unit to a
+  squad moves it out of moonblade_roster, but it still costs upkeep)
+- Diplomacy and Dawnbreakers rosters
+- Owned infrastructure
+
+The result is posted as one ledger entry per category during Advance Week.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from utils.executor import error_code
+from utils.infrastructure_effects import EffectsSnapshot, get_effects_snapshot
+from utils.ledger import add_ledger_entries
+from utils.schema import MISSING_CODES, get_schema
+from utils.squads import fetch_members_for_squads
+
+# category -> (roster table, unit catalog table)
+ROSTERS = {
+    "moonblade": ("moonblade_roster", "moonblade_units"),
+    "diplomacy": ("diplomacy_roster", "diplomacy_units"),
+    "dawnbreakers": ("dawnbreakers_roster", "dawnbreakers_units"),
+}
+
+
+@dataclass(frozen=True)
+class UpkeepBreakdown:
+    by_category: Dict[str, float]
+    total: float
+    # Squad member quantities that match no catalog unit or unit_type, by unit_type.
+    unpriced: Dict[str, int] = field(default_factory=dict)
+
+
+def _missing(e: Exception) -> bool:
+    """Table/column absent in this schema variant (anything else must fail the stage)."""
+    return error_code(e) in MISSING_CODES
+
+
+def _unit_rows(sb, units_table: str, columns: str) -> List[Dict[str, Any]]:
+    return sb.table(units_table).select(columns).execute().data or []
+
+
+def _roster_quantities(sb, roster_table: str) -> List[Dict[str, Any]]:
+    return sb.table(roster_table).select("unit_id,quantity").execute().data or []
+
+
+def _friendly_squad_members(sb) -> List[Dict[str, Any]]:
+    if get_schema(sb).has("squads", "is_enemy"):
+        squads = sb.table("squads").select("id").eq("is_enemy", False).execute().data or []
+    else:
+        # squads table without is_enemy: every squad is friendly
+        squads = sb.table("squads").select("id").execute().data or []
+    if not squads:
+        return []
+    by_squad = fetch_members_for_squads(sb, [s["id"] for s in squads])
+    return [m for rows in by_squad.values() for m in rows]
+
+
+def _upkeep_by_type(units: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Average catalog upkeep per unit_type, for member rows stored by type only."""
+    totals: Dict[str, List[float]] = {}
+    for u in units:
+        t = (u.get("unit_type") or "").strip().lower()
+        if t:
+            totals.setdefault(t, []).append(float(u.get("upkeep") or 0))
+    return {t: sum(v) / len(v) for t, v in totals.items()}
+
+
+def _infrastructure_upkeep(sb, snapshot: Optional[EffectsSnapshot] = None) -> float:
+    infra = sb.table("infrastructure").select("id,upkeep").execute().data or []
+    owned_ids = (snapshot or get_effects_snapshot(sb)).owned_ids
+    return sum(float(r.get("upkeep") or 0) for r in infra if r["id"] in owned_ids)
+
+
+def compute_upkeep(sb, snapshot: Optional[EffectsSnapshot] = None) -> UpkeepBreakdown:
+    """Total weekly upkeep per category (moonblade/diplomacy/dawnbreakers/infrastructure).
+
+    Owned infrastructure comes from the shared effects snapshot (`snapshot`
+    if given). A category is skipped only when its tables don't exist; any
+    other error propagates so the rollover stage fails and can be resumed.
+    Squad members stored by unit_type alone are charged the average upkeep of
+    that type; those with no catalog match are listed in `unpriced`.
+    """
+    by_category: Dict[str, float] = {}
+    unpriced: Dict[str, int] = {}
+
+    for category, (roster_table, units_table) in ROSTERS.items():
+        try:
+            units = _unit_rows(sb, units_table, "id,upkeep,unit_type" if category == "moonblade" else "id,upkeep")
+            rows = _roster_quantities(sb, roster_table)
+            if category == "moonblade":
+                rows = rows + _friendly_squad_members(sb)
+        except Exception as e:
+            if not _missing(e):
+                raise
+            continue
+        by_unit = {u["id"]: float(u.get("upkeep") or 0) for u in units}
+        by_type = _upkeep_by_type(units) if category == "moonblade" else {}
+        total = 0.0
+        for r in rows:
+            qty = max(0, int(r.get("quantity") or 0))
+            if r.get("unit_id") in by_unit:
+                total += by_unit[r["unit_id"]] * qty
+                continue
+            unit_type = (r.get("unit_type") or "").strip().lower()
+            if unit_type in by_type:
+                total += by_type[unit_type] * qty
+            elif qty:
+                unpriced[unit_type or "unknown"] = unpriced.get(unit_type or "unknown", 0) + qty
+        by_category[category] = total
+
+    try:
+        by_category["infrastructure"] = _infrastructure_upkeep(sb, snapshot)
+    except Exception as e:
+        if not _missing(e):
+            raise
+
+    return UpkeepBreakdown(by_category=by_category, total=float(sum(by_category.values())), unpriced=unpriced)
+
+
+def post_upkeep(sb, week: int, upkeep: UpkeepBreakdown) -> None:
+    """Post upkeep as one ledger entry per non-zero category (single insert).
+
+    Entries are keyed `upkeep:<week>:<category>`, so posting a week twice
+    leaves one entry per category.
+    """
+    add_ledger_entries(
+        sb,
+        [
+            {
+                "week": week,
+                "direction": "out",
+                "amount": round(amount, 2),
+                "category": f"upkeep_{category}",
+                "note": f"Weekly upkeep: {category}",
+                "metadata": {"kind": "upkeep", "category": category},
+                "idempotency_key": f"upkeep:{week}:{category}",
+            }
+            for category, amount in upkeep.by_category.items()
+            if amount > 0
+        ],
+    )
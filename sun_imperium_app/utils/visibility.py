@@ -0,0 +1,74 @@
+"""DM-controlled visibility (hidden pages and hidden faction reputations).
+
+Sources:
+- `app_state.ui_hidden_pages`: page file names hidden from players
+- `factions.is_hidden`
+- `app_state.ui_hidden_factions` / `ui_hidden_reputations`: older array form
+
+Everything is read once into an immutable `Visibility` and cached per
+process; the DM Console clears it after saving, so pages never query
+`app_state` on render.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import FrozenSet
+
+import streamlit as st
+from supabase import Client
+
+
+@dataclass(frozen=True)
+class Visibility:
+    hidden_pages: FrozenSet[str] = frozenset()
+    hidden_faction_ids: FrozenSet[str] = frozenset()
+
+    def page_hidden(self, page: str) -> bool:
+        """`page` may be a file name or a path ("pages/03_...py")."""
+        return os.path.basename(page) in self.hidden_pages
+
+    def faction_hidden(self, faction_id) -> bool:
+        return str(faction_id) in self.hidden_faction_ids
+
+
+def _load_state_lists(sb: Client) -> tuple[set[str], set[str]]:
+    pages: set[str] = set()
+    factions: set[str] = set()
+    for cols in ("ui_hidden_pages,ui_hidden_factions,ui_hidden_reputations", "ui_hidden_pages"):
+        try:
+            rows = sb.table("app_state").select(cols).eq("id", 1).limit(1).execute().data or []
+        except Exception:
+            continue
+        row = rows[0] if rows else {}
+        if isinstance(row.get("ui_hidden_pages"), list):
+            pages.update(str(x) for x in row["ui_hidden_pages"] if x)
+        for key in ("ui_hidden_factions", "ui_hidden_reputations"):
+            v = row.get(key)
+            if isinstance(v, list):
+                factions.update(str(x) for x in v if x)
+        break
+    return pages, factions
+
+
+@st.cache_resource(ttl=300, show_spinner=False)
+def _load_visibility(_sb: Client) -> Visibility:
+    pages, factions = _load_state_lists(_sb)
+    try:
+        rows = _sb.table("factions").select("id").eq("is_hidden", True).execute().data or []
+        factions.update(str(r["id"]) for r in rows)
+    except Exception:
+        # factions.is_hidden not migrated yet
+        pass
+    return Visibility(hidden_pages=frozenset(pages), hidden_faction_ids=frozenset(factions))
+
+
+def get_visibility(sb: Client) -> Visibility:
+    """Cached visibility settings."""
+    return _load_visibility(sb)
+
+
+def clear_visibility() -> None:
+    """Invalidate after the DM changes visibility."""
+    _load_visibility.clear()
@@ -10,6 +10,36 @@ TYPE_ADVANTAGE = {
 }
 
 
+# Simulator buckets, in display order.
+BUCKETS = ("guardian", "archer", "mage", "cleric", "others")
+
+# Base per-unit weights used when no unit catalog power is available.
+BASE_WEIGHTS = {
+    "guardian": 3.0,
+    "archer": 2.5,
+    "mage": 3.0,
+    "others": 2.0,
+    "cleric": 1.0,
+}
+
+
+def bucket_key(unit_type_raw: str) -> str:
+    """Normalize unit_type strings into sim buckets.
+
+    Accepts pluralization/casing and common prefixes. Unknown types become "others".
+    """
+    t = (unit_type_raw or "").strip().lower()
+    if t.startswith("guard"):
+        return "guardian"
+    if t.startswith("arch"):
+        return "archer"
+    if t.startswith("mage"):
+        return "mage"
+    if t.startswith("cler"):
+        return "cleric"
+    return "others"
+
+
 def matchup_multiplier(attacker: str, defender: str) -> float:
     if attacker == defender:
         return 1.0
@@ -36,26 +66,31 @@ class BattleResult:
     enemy_power: float
 
 
-from typing import Optional
+from typing import Dict, Optional
 
 
-def compute_power(force: Force, *, vs: Optional[Force] = None) -> float:
+def compute_power(
+    force: Force,
+    *,
+    vs: Optional[Force] = None,
+    weights: Optional[Dict[str, float]] = None,
+) -> float:
     """Compute effective power.
 
     Base weights:
       guardian=3, archer=2.5, mage=3, others=2, cleric=1
 
+    `weights` overrides the per-unit weight of any bucket (e.g. the average
+    effective power from utils.power_index, which includes infrastructure).
+
     Clerics provide a buff to other units: +5% per cleric up to +30%.
 
     RPS advantage applied by assuming a matchup against enemy composition.
     """
-    base = {
-        "guardian": 3.0,
-        "archer": 2.5,
-        "mage": 3.0,
-        "others": 2.0,
-        "cleric": 1.0,
-    }
+    base = dict(BASE_WEIGHTS)
+    for k, v in (weights or {}).items():
+        if k in base:
+            base[k] = float(v)
 
     buff = min(0.30, 0.05 * max(0, force.clerics))
 
@@ -166,17 +201,23 @@ def apply_casualties(force: Force, casualty_rate: float) -> tuple[Force, Force]:
     return rem, lost
 
 
-def simulate_battle(ally: Force, enemy: Force) -> BattleResult:
+def simulate_battle(
+    ally: Force,
+    enemy: Force,
+    *,
+    ally_weights: Optional[Dict[str, float]] = None,
+    enemy_weights: Optional[Dict[str, float]] = None,
+) -> BattleResult:
     """Deterministic battle sim.
 
-    - Winner determined by effective power.
+    - Winner determined by effective power (per-bucket weights optional).
     - Casualty rates depend on power ratio.
       * Winner casualty: 5%..35%
       * Loser casualty: 35%..95%
     - Never 0 survivors.
     """
-    ally_p = compute_power(ally, vs=enemy)
-    enemy_p = compute_power(enemy, vs=ally)
+    ally_p = compute_power(ally, vs=enemy, weights=ally_weights)
+    enemy_p = compute_power(enemy, vs=ally, weights=enemy_weights)
 
     # Avoid division blowups
     ratio = (ally_p + 1e-6) / (enemy_p + 1e-6)
@@ -218,3 +259,49 @@ def simulate_battle(ally: Force, enemy: Force) -> BattleResult:
         ally_power=ally_p,
         enemy_power=enemy_p,
     )
+
+
+def redistribute_remaining(rows: list[dict], remaining_by_bucket: dict) -> list[tuple[dict, int]]:
+    """Spread bucket-level survivors back onto detailed squad member rows.
+
+    Each bucket's target is split proportionally across its underlying unit
+    rows (deterministic order for the leftover). Returns [(row, new_quantity)]
+    for every row, so the caller can persist them in one go.
+    """
+    # Group current rows by sim bucket (guardian/archer/mage/cleric/others)
+    by_bucket: dict[str, list[dict]] = {}
+    for r in rows or []:
+        b = bucket_key(r.get("unit_type") or "")
+        by_bucket.setdefault(b, []).append(r)
+
+    out: list[tuple[dict, int]] = []
+    for b, rlist in by_bucket.items():
+        cur_total = sum(int(x.get("quantity") or 0) for x in rlist)
+        target = int(remaining_by_bucket.get(b, 0))
+        if cur_total <= 0:
+            continue
+        if target < 0:
+            target = 0
+
+        # Scale quantities
+        ratio = target / cur_total
+        new_q = [int(int(x.get("quantity") or 0) * ratio) for x in rlist]
+
+        # Distribute leftover to reach exact target (deterministic order)
+        leftover = target - sum(new_q)
+        if leftover > 0:
+            # Give +1 to the first N rows
+            for i in range(min(leftover, len(new_q))):
+                new_q[i] += 1
+        elif leftover < 0:
+            # Remove 1 from rows that still have >0
+            to_remove = -leftover
+            for i in range(len(new_q)):
+                if to_remove <= 0:
+                    break
+                if new_q[i] > 0:
+                    new_q[i] -= 1
+                    to_remove -= 1
+
+        out.extend(zip(rlist, new_q))
+    return out